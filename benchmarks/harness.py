@@ -0,0 +1,470 @@
+"""
+benchmark / 負載測試共用的工具：
+
+- synthetic_state()：產生合成的 data.json 內容 (玩家、活動、任務、點數紀錄、圖片)，同一個 seed 結果相同
+- import_main()：以暫存資料目錄載入 main (不連線 Discord)；running_app() 執行 FastAPI 的 lifespan
+- FakeUser / FakeInteraction：讓 cogs 的 callback 不需 Discord 也能執行
+- StubGateway：代替 Discord API (使用者、頻道、附件 CDN)，outbox 的送出與圖片下載都在本機完成
+- Samples：記錄每次耗時，計算 p50 / p99 與吞吐量
+
+需要 main.py 的所有套件，另外需要 httpx (ASGI client)。
+"""
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import time
+import zlib
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage import credit_points, new_event, new_gamer  # noqa: E402
+
+EVENT_START = "2024-01-01"
+EVENT_END = "2099-12-31"
+
+
+###############################
+# 合成資料
+###############################
+def card_number(gamer_id: int) -> str:
+    """符合 RGPXXXXX 格式 (含英文與數字) 且不重複的卡號 (gamer_id < 260000)。"""
+    return f"RGP{chr(65 + (gamer_id // 10000) % 26)}{gamer_id % 10000:04d}"
+
+
+def event_code(index: int) -> str:
+    return f"RAE{index:03d}"
+
+
+def _timestamp(rng: random.Random) -> str:
+    return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"
+
+
+def synthetic_state(gamers: int = 1000, events: int = 20, tasks: int = 5, history: int = 20,
+                    images: int = 2, joined: int = 3, pending: float = 0.2, seed: int = 0) -> dict:
+    """
+    data.json 格式的合成資料。每位玩家參加 joined 個活動、有 history 筆活動加點紀錄與 images 張上傳圖片
+    (其中約 pending 比例待審核，其餘已通過)。
+    """
+    rng = random.Random(seed)
+    codes = [event_code(i) for i in range(events)]
+    event_objs = {}
+    for i, code in enumerate(codes):
+        event = new_event(code, f"活動{i}", "synthetic", EVENT_START, EVENT_END)
+        for t in range(tasks):
+            event.add_task(f"任務{t}", "", rng.choice((5, 10, 20)))
+        event.add_prize("獎品", 50)
+        event["max_points"] = sum(t["task_points"] for t in event["tasks"])
+        event_objs[code] = event
+
+    state = {"user_images": {}, "events": {}, "gamers": {}}
+    for gid in range(1, gamers + 1):
+        gamer = new_gamer(gid, card_number(gid))
+        my_events = rng.sample(codes, k=min(joined, len(codes)))
+        for code in my_events:
+            gamer["joined_events"].append(code)
+            gamer["joined_event_timestamps"][code] = _timestamp(rng)
+            event_objs[code]["gamer_list"].append(gid)
+        gamer["points_history"] = []
+        for _ in range(history):
+            code = rng.choice(my_events)
+            points = rng.randint(1, 20)
+            credit_points(gamer, points, code)
+            gamer["points_history"].append({
+                "type": "event",
+                "event_code": code,
+                "points": points,
+                "timestamp": _timestamp(rng)
+            })
+        state["gamers"][str(gid)] = gamer
+
+        user_images = []
+        for n in range(images):
+            code = rng.choice(my_events)
+            task = rng.choice(event_objs[code]["tasks"])
+            status = "pending" if rng.random() < pending else "approved"
+            if gid not in task["assigned_users"]:
+                task["assigned_users"].append(gid)
+            image = {
+                "image_id": f"{rng.getrandbits(128):032x}",
+                "filename": f"{gid}_{n}.png",
+                "user_id": gid,
+                "username": f"user{gid}",
+                "status": status,
+                "event_code": code,
+                "task_id": task["task_id"],
+                "upload_time": _timestamp(rng),
+                "content_hash": f"{rng.getrandbits(256):064x}",
+                "content_type": "image/png",
+                "size": rng.randint(50_000, 2_000_000),
+                "phash": f"{rng.getrandbits(64):016x}"
+            }
+            if status == "approved":
+                image["approved_time"] = image["upload_time"]
+                if gid not in task["checked_users"]:
+                    task["checked_users"].append(gid)
+            user_images.append(image)
+        if user_images:
+            state["user_images"][str(gid)] = user_images
+
+    state["events"] = {code: dict(event) for code, event in event_objs.items()}
+    return state
+
+
+def write_data_file(data_dir: str, state: dict) -> str:
+    path = os.path.join(data_dir, "data.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    return path
+
+
+###############################
+# 載入 app
+###############################
+def import_main(data_dir: str, backend: str = "json"):
+    """
+    以 data_dir 為資料目錄 import main (每個 process 只能一次)。
+    不連線 Discord (DISCORD_BOT_ENABLED=0)；cogs 由呼叫端直接建立。
+    """
+    os.environ.update({
+        "DATA_DIR": data_dir,
+        "SQLITE_PATH": os.path.join(data_dir, "data.db"),
+        "IMAGE_STORE_DIR": os.path.join(data_dir, "image_store"),
+        "AUDIT_LOG_PATH": os.path.join(data_dir, "audit.log"),
+        "STORAGE_BACKEND": backend,
+        "DISCORD_BOT_ENABLED": "0",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING")
+    })
+    os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+    os.environ.setdefault("TARGET_CHANNEL_ID", "1")
+    os.environ.setdefault("ADMIN_CHANNEL_ID", "2")
+    import main
+    return main
+
+
+@asynccontextmanager
+async def running_app(main):
+    """執行 FastAPI 的 lifespan (載入資料、啟動寫入者 / 背景存檔)，等資料載入完成後提供 ASGI client。"""
+    import httpx
+
+    async with main.app.router.lifespan_context(main.app):
+        if not await main.startup.wait_ready():
+            raise RuntimeError(f"啟動失敗: {main.startup.error}")
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            yield client
+
+
+def git_revision() -> str:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+###############################
+# 假的 Discord 物件
+###############################
+class FakeUser:
+    def __init__(self, user_id: int, name: Optional[str] = None, gateway: Optional["StubGateway"] = None):
+        self.id = user_id
+        self.name = name or f"user{user_id}"
+        self.sent: List[str] = []
+        self.gateway = gateway
+        self.dm_channel = StubChannel(gateway, user_id) if gateway else None
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        if self.gateway:
+            await self.gateway.call("dm")
+        self.sent.append(content)
+
+    async def create_dm(self):
+        return self.dm_channel
+
+
+class FakeResponse:
+    def __init__(self):
+        self.messages = []
+        self._done = False
+        # 第一次回應的時間 (time.monotonic())；Discord 要求 3 秒內回應互動
+        self.first_at: Optional[float] = None
+
+    def _ack(self):
+        if self.first_at is None:
+            self.first_at = time.monotonic()
+        self._done = True
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, content: Optional[str] = None, **kwargs):
+        self._ack()
+        self.messages.append(content)
+
+    async def send_modal(self, modal):
+        self._ack()
+        self.messages.append(modal)
+
+    async def defer(self, **kwargs):
+        self._ack()
+
+    async def edit_message(self, **kwargs):
+        self._ack()
+        self.messages.append(kwargs.get("content"))
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        self.messages.append(content)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit(self, **kwargs):
+        self.edits.append(kwargs)
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeUser):
+        self.user = user
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+        self.message = FakeMessage()
+        self.channel = None
+
+    async def edit_original_response(self, **kwargs):
+        self.message.edits.append(kwargs)
+
+
+class FakeContext:
+    """commands.Context 中 cogs 用到的部分。"""
+
+    def __init__(self, author: FakeUser):
+        self.author = author
+        self.channel = author.dm_channel
+        self.sent: List[str] = []
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        self.sent.append(content)
+
+
+class FakeAttachment:
+    def __init__(self, url: str, size: int, filename: str):
+        self.url = url
+        self.size = size
+        self.filename = filename
+
+
+def choose(select, *values: str):
+    """等同使用者在下拉選單中選取 values (設定 discord.ui.Select.values)。"""
+    select._refresh_state(None, {"values": list(values)})
+
+
+def fill(text_input, value: str):
+    """等同使用者在 Modal 的輸入框填入 value (設定 discord.ui.TextInput.value)。"""
+    text_input._value = value
+
+
+def png_bytes(seed: int, size: int = 16) -> bytes:
+    """size x size 的隨機雜訊 PNG；seed 不同內容 (與感知 hash) 就不同。"""
+    rng = random.Random(seed)
+    raw = b"".join(b"\x00" + bytes(rng.getrandbits(8) for _ in range(size * 3)) for _ in range(size))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+###############################
+# 本機的 Discord API 替身
+###############################
+class StubHTTPError(Exception):
+    """模擬 discord.HTTPException：outbox 依 status / retry_after 決定是否重試。"""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"stub HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class StubMessage:
+    def __init__(self, channel: "StubChannel", message_id: int, content: Optional[str] = None, view=None):
+        self.channel = channel
+        self.id = message_id
+        self.content = content
+        self.view = view
+        self.jump_url = f"https://discord.com/channels/@stub/{channel.id}/{message_id}"
+
+    async def edit(self, **kwargs):
+        await self.channel.gateway.call("edit")
+        self.content = kwargs.get("content", self.content)
+        self.view = kwargs.get("view", self.view)
+
+
+class StubChannel:
+    def __init__(self, gateway: "StubGateway", channel_id: int):
+        self.gateway = gateway
+        self.id = channel_id
+        self.messages: Dict[int, StubMessage] = {}
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        await self.gateway.call("send")
+        file = kwargs.get("file")
+        if file is not None:
+            file.close()
+        msg = StubMessage(self, next(self.gateway.message_ids), content, kwargs.get("view"))
+        self.messages[msg.id] = msg
+        if msg.view is not None and hasattr(msg.view, "image_id"):
+            # 審核頻道收到的審核訊息 (ReviewView)，等審核者按下
+            self.gateway.review_posts.append(msg)
+        return msg
+
+    def get_partial_message(self, message_id: int) -> StubMessage:
+        return self.messages.get(message_id) or StubMessage(self, message_id)
+
+
+class StubGateway:
+    """
+    代替 Discord API：install() 把 get_user / fetch_user / get_channel / fetch_channel 換成本機物件，
+    每次送訊息 / 編輯延遲 latency 秒 (±jitter 比例)，並以 rate_limited 的機率回 429 (outbox 依 retry_after 重試)。
+    start_cdn() 另外在本機開 HTTP 伺服器提供附件下載 (每個附件內容不同的 PNG)，上傳流程照常串流下載。
+    """
+
+    def __init__(self, latency: float = 0.08, jitter: float = 0.5, rate_limited: float = 0.0,
+                 cdn_latency: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limited = rate_limited
+        self.cdn_latency = cdn_latency
+        self.rng = random.Random(seed)
+        self.message_ids = itertools.count(10 ** 12)
+        self.review_posts: deque = deque()
+        self.calls = Counter()
+        self._users: Dict[int, FakeUser] = {}
+        self._channels: Dict[int, StubChannel] = {}
+        self._attachments = itertools.count(1)
+        self._cdn = None
+        self.cdn_url = None
+
+    def install(self, bot):
+        bot.get_user = self.user
+        bot.get_channel = self.channel
+        bot.fetch_user = self._fetch_user
+        bot.fetch_channel = self._fetch_channel
+
+    def user(self, user_id: int) -> FakeUser:
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = FakeUser(user_id, gateway=self)
+        return user
+
+    def channel(self, channel_id: int) -> StubChannel:
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self._channels[channel_id] = StubChannel(self, channel_id)
+        return channel
+
+    async def _fetch_user(self, user_id: int) -> FakeUser:
+        await self.call("fetch")
+        return self.user(user_id)
+
+    async def _fetch_channel(self, channel_id: int) -> StubChannel:
+        await self.call("fetch")
+        return self.channel(channel_id)
+
+    async def call(self, kind: str):
+        if self.latency:
+            await asyncio.sleep(self.latency * self.rng.uniform(1 - self.jitter, 1 + self.jitter))
+        if self.rate_limited and self.rng.random() < self.rate_limited:
+            self.calls["429"] += 1
+            raise StubHTTPError(429, retry_after=round(self.rng.uniform(0.5, 2.0), 2))
+        self.calls[kind] += 1
+
+    ###############################
+    # 附件 CDN
+    ###############################
+    async def start_cdn(self):
+        from aiohttp import web
+
+        async def attachment(request):
+            if self.cdn_latency:
+                await asyncio.sleep(self.cdn_latency)
+            self.calls["cdn"] += 1
+            return web.Response(body=png_bytes(int(request.match_info["n"])), content_type="image/png")
+
+        app = web.Application()
+        app.router.add_get("/attachments/{n}/{name}", attachment)
+        self._cdn = web.AppRunner(app, access_log=None)
+        await self._cdn.setup()
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        await web.SockSite(self._cdn, sock).start()
+        self.cdn_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+    async def stop_cdn(self):
+        if self._cdn is not None:
+            await self._cdn.cleanup()
+            self._cdn = None
+
+    def attachment(self) -> FakeAttachment:
+        n = next(self._attachments)
+        filename = f"upload{n}.png"
+        return FakeAttachment(f"{self.cdn_url}/attachments/{n}/{filename}", len(png_bytes(n)), filename)
+
+
+###############################
+# 統計
+###############################
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * p), len(sorted_values) - 1)]
+
+
+class Samples:
+    """一項操作的耗時紀錄 (秒)。"""
+
+    def __init__(self):
+        self.durations: List[float] = []
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def add(self, seconds: float):
+        self.durations.append(seconds)
+        self.finished = time.perf_counter()
+
+    def summary(self) -> dict:
+        values = sorted(self.durations)
+        wall = (self.finished or time.perf_counter()) - self.started
+        return {
+            "n": len(values),
+            "errors": self.errors,
+            "ops_per_s": round(len(values) / wall, 2) if wall > 0 else None,
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3) if values else 0.0
+        }
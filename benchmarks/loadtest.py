@@ -0,0 +1,548 @@
+"""
+活動日負載測試：在同一個 process 內以固定的到達速率 (open loop，不等前一個完成) 重播
+參加活動 (JoinEventModal)、上傳圖片 (TaskSelectForImage)、逐張審核 (ApproveButton)、
+批次審核 (/api/review/bulk)、開選單 (SelectionMenuSelect) 與 /dashboard 的混合流量。
+Discord 由 harness.StubGateway 代替 (送訊息有延遲、可注入 429)，附件由本機 CDN 下載。
+
+流量來源 (擇一)：
+- 腳本：--scenario (預設 benchmarks/scenarios/event_launch.json)，各階段的 duration (秒)、rate (次/秒) 與 mix (權重)
+- 錄製的 trace：--trace 每行一筆 {"phase": ..., "at": 秒, "op": ...} 的 JSONL；--save-trace 可保存本次產生的流量供重播
+- 加壓：--ramp 起始:每階增加:上限 (次/秒)，以 --ramp-mix 指定階段的 mix 每 --step-seconds 秒提高速率，
+  找出 p99 超過 --slo-ms、錯誤率超過 --max-error-rate、有請求被擋下或吞吐量跟不上的飽和點
+
+結束後等 outbox 送完，並檢查資料一致性：點數與紀錄相符、每次審核恰好加點一次、參加名單雙向一致、
+已通過的圖片都在任務的 checked_users、上傳的圖片檔都存在、稽核紀錄筆數、重新載入的存檔與記憶體中相同。
+任一檢查失敗時以 exit code 1 結束。執行：
+
+    python benchmarks/loadtest.py [--backend json|sqlite] [--gamers 2000] [--scenario path.json]
+    python benchmarks/loadtest.py --ramp 20:20:300 --step-seconds 10
+    python benchmarks/loadtest.py --trace recorded.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import (FakeContext, FakeInteraction, Samples, StubGateway, choose, fill,  # noqa: E402
+                     git_revision, import_main, running_app, synthetic_state, write_data_file)
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+DEFAULT_SCENARIO = os.path.join(BENCH_DIR, "scenarios", "event_launch.json")
+# Discord 要求互動在 3 秒內回應，否則使用者看到「此互動失敗」
+ACK_DEADLINE = 3.0
+OPS = ("join_event", "upload", "approve", "bulk_review", "menu", "dashboard")
+# 操作沒有可做的事 (例如沒有待審核的圖片)：不計入延遲
+SKIPPED = object()
+
+
+###############################
+# 流量
+###############################
+def poisson_arrivals(phase: dict, rng: random.Random) -> list:
+    """依 rate 產生 Poisson 到達時間，op 依 mix 權重抽選；回傳 [(秒, op), ...]。"""
+    ops, weights = zip(*phase["mix"].items())
+    unknown = set(ops) - set(OPS)
+    if unknown:
+        raise ValueError(f"未知的操作: {', '.join(sorted(unknown))}")
+    arrivals = []
+    at = rng.expovariate(phase["rate"])
+    while at < phase["duration"]:
+        arrivals.append((round(at, 4), rng.choices(ops, weights)[0]))
+        at += rng.expovariate(phase["rate"])
+    return arrivals
+
+
+def load_scenario(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def scenario_plan(path: str, rng: random.Random) -> list:
+    return [(phase["name"], phase["duration"], poisson_arrivals(phase, rng)) for phase in load_scenario(path)["phases"]]
+
+
+def trace_plan(path: str) -> list:
+    """錄製的 trace：依 phase 第一次出現的順序分段，每段長度為最後一筆的時間。"""
+    phases = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                phases.setdefault(entry.get("phase", "trace"), []).append((float(entry["at"]), entry["op"]))
+    # 只依時間排序 (stable)，同一時間的操作保持原順序
+    return [(name, max(at for at, _ in arrivals), sorted(arrivals, key=lambda a: a[0]))
+            for name, arrivals in phases.items()]
+
+
+def save_trace(path: str, plan: list):
+    with open(path, "w", encoding="utf-8") as f:
+        for name, _, arrivals in plan:
+            for at, op in arrivals:
+                f.write(json.dumps({"phase": name, "at": at, "op": op}) + "\n")
+
+
+###############################
+# 各項操作
+###############################
+class LoadRunner:
+    def __init__(self, main, client, gateway: StubGateway, args, rng: random.Random):
+        from cogs.card_binding import CardBindingCog
+        from cogs.image_review import ImageReviewCog
+
+        self.main = main
+        self.bot = main.bot
+        self.store = main.bot.store
+        self.client = client
+        self.gateway = gateway
+        self.args = args
+        self.rng = rng
+        self.cog = CardBindingCog(self.bot)
+        self.review_cog = ImageReviewCog(self.bot)
+        self.admin = gateway.user(10 ** 9)
+        self.event_codes = [event["event_code"] for event in self.store.iter_events()]
+        # 已參加活動的 (玩家, 活動)，上傳圖片從這裡抽；參加成功後加入
+        self.joined = [(g["gamer_id"], code) for g in self.store.iter_gamers() for code in g.get("joined_events", [])]
+        self.next_user = max((g["gamer_id"] for g in self.store.iter_gamers()), default=0) + 1
+        # 開始前已待審核的圖片 (沒有審核訊息)；上傳後的由審核頻道的訊息取得
+        self.pending = deque(image_id for image_id, _, _ in self.store.iter_pending_images())
+        self.skipped = Counter()
+        self.errors = Counter()
+        self.ack_timeouts = Counter()
+
+    async def setup(self):
+        self.gateway.install(self.bot)
+        await self.gateway.start_cdn()
+        # 與 setup_bot 相同：cogs 註冊 outbox handler 後才開始送出
+        await self.cog.cog_load()
+        await self.review_cog.cog_load()
+        self.main.outbox.start()
+
+    async def join_event(self):
+        from cogs.selection_menu import JoinEventModal
+
+        user_id = self.next_user
+        self.next_user += 1
+        code = self.rng.choice(self.event_codes)
+        modal = JoinEventModal(self.cog)
+        fill(modal.event_code, code)
+        interaction = FakeInteraction(self.gateway.user(user_id))
+        await modal.on_submit(interaction)
+        gamer = self.store.get_gamer(user_id)
+        if gamer and code in gamer.get("joined_events", []):
+            self.joined.append((user_id, code))
+        return interaction
+
+    async def upload(self):
+        from cogs.image_review import TaskSelectView
+
+        user_id, code = self.rng.choice(self.joined)
+        event = self.store.get_event(code)
+        if not event or not event.get("tasks"):
+            return SKIPPED
+        task = self.rng.choice(event["tasks"])
+        user = self.gateway.user(user_id)
+        view = TaskSelectView(self.bot, FakeContext(user), self.gateway.attachment(), code)
+        select = view.children[0]
+        choose(select, str(task["task_id"]))
+        interaction = FakeInteraction(user)
+        await select.callback(interaction)
+        return interaction
+
+    def _take_review(self):
+        """下一個待審核項目：(image_id, 審核訊息上的 ReviewView 或 None)。"""
+        if self.gateway.review_posts:
+            msg = self.gateway.review_posts.popleft()
+            return msg.view.image_id, msg.view
+        if self.pending:
+            return self.pending.popleft(), None
+        return None, None
+
+    async def approve(self):
+        from cogs.image_review import ReviewView
+
+        image_id, view = self._take_review()
+        if image_id is None:
+            return SKIPPED
+        if view is None:
+            found = self.store.find_image(image_id)
+            if not found:
+                # 已被批次審核
+                return SKIPPED
+            view = ReviewView(self.bot, image_id, found[2])
+        interaction = FakeInteraction(self.admin)
+        await view.children[0].callback(interaction)
+        return interaction
+
+    async def bulk_review(self):
+        image_ids = []
+        while len(image_ids) < self.args.bulk_size:
+            image_id, _ = self._take_review()
+            if image_id is None:
+                break
+            image_ids.append(image_id)
+        if not image_ids:
+            return SKIPPED
+        resp = await self.client.post("/api/review/bulk", json={"image_ids": image_ids, "action": "approve"})
+        if resp.status_code != 200:
+            raise RuntimeError(f"POST /api/review/bulk -> {resp.status_code}")
+        return None
+
+    async def menu(self):
+        from cogs.selection_menu import SelectionMenuSelect
+
+        user_id, _ = self.rng.choice(self.joined)
+        user = self.gateway.user(user_id)
+        select = SelectionMenuSelect(self.cog, user)
+        if not any(option.value == "query_timestamps" for option in select.options):
+            choose(select, "query_card")
+        else:
+            choose(select, "query_timestamps")
+        interaction = FakeInteraction(user)
+        await select.callback(interaction)
+        return interaction
+
+    async def dashboard(self):
+        resp = await self.client.get("/dashboard")
+        if resp.status_code != 200:
+            raise RuntimeError(f"GET /dashboard -> {resp.status_code}")
+        return None
+
+    ###############################
+    # 排程
+    ###############################
+    async def _run_op(self, op: str, scheduled: float, samples: Samples, total: Samples):
+        try:
+            interaction = await getattr(self, op)()
+        except Exception as e:
+            samples.errors += 1
+            total.errors += 1
+            key = f"{op}: {e!r}"[:200]
+            if not self.errors[key]:
+                traceback.print_exc()
+            self.errors[key] += 1
+            return
+        if interaction is SKIPPED:
+            self.skipped[op] += 1
+            return
+        # 以預定開始時間計算延遲 (包含排隊)，不因系統變慢而少算
+        elapsed = time.monotonic() - scheduled
+        samples.add(elapsed)
+        total.add(elapsed)
+        if interaction is not None:
+            first = interaction.response.first_at
+            if (first if first is not None else time.monotonic()) - scheduled > ACK_DEADLINE:
+                self.ack_timeouts[op] += 1
+
+    async def run_phase(self, name: str, duration: float, arrivals: list) -> dict:
+        samples = {op: Samples() for op in OPS}
+        total = Samples()
+        shed = Counter()
+        tasks = set()
+        started = time.monotonic()
+        for at, op in arrivals:
+            delay = started + at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(tasks) >= self.args.max_inflight:
+                # 同時進行中的請求已達上限：視為使用者放棄 (系統已飽和)
+                shed[op] += 1
+                continue
+            task = asyncio.create_task(self._run_op(op, started + at, samples[op], total))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+
+        offered = len(arrivals)
+        completed = len(total.durations)
+        summary = total.summary()
+        return {
+            "phase": name,
+            "duration": duration,
+            "offered_rate": round(offered / duration, 2) if duration else None,
+            "achieved_rate": round(completed / elapsed, 2) if elapsed else None,
+            "offered": offered,
+            "completed": completed,
+            "errors": total.errors,
+            "shed": sum(shed.values()),
+            "error_rate": round((total.errors + sum(shed.values())) / offered, 4) if offered else 0.0,
+            "p50_ms": summary["p50_ms"],
+            "p99_ms": summary["p99_ms"],
+            "max_ms": summary["max_ms"],
+            "ops": {op: dict(s.summary(), shed=shed[op])
+                    for op, s in samples.items() if s.durations or s.errors or shed[op]}
+        }
+
+
+###############################
+# 一致性檢查
+###############################
+def credit_counts(store) -> dict:
+    """每位玩家的活動加點紀錄筆數與已通過的圖片數 (審核通過一張圖片恰好加一筆)，以及所有圖片 ID。"""
+    history = {
+        g["gamer_id"]: sum(1 for h in g.get("points_history", []) if h.get("type") == "event")
+        for g in store.iter_gamers()
+    }
+    approved = {}
+    image_ids = set()
+    for user_id, images in store.iter_images():
+        approved[user_id] = sum(1 for img in images if img.get("status") == "approved")
+        image_ids.update(img.get("image_id") for img in images)
+    return {"history": history, "approved": approved, "image_ids": image_ids}
+
+
+def check_consistency(store, baseline: dict, archive, audit) -> dict:
+    """在寫入者執行緒中執行，檢查時資料不會變動。回傳 {檢查: {"ok", "failures", "examples"}}。"""
+    problems = {name: [] for name in (
+        "points_total", "points_by_event", "credits_match_approvals", "audit_credits",
+        "joined_events", "gamer_list_unique", "checked_users", "image_files"
+    )}
+    counts = credit_counts(store)
+    events = {code: store.get_event(code) for code in (e["event_code"] for e in store.iter_events())}
+    credited_total = 0
+
+    for gamer in store.iter_gamers():
+        gid = gamer["gamer_id"]
+        if gamer.get("total_points", 0) != sum(gamer.get("history_event_pts_list", [])):
+            problems["points_total"].append(gid)
+        by_event = Counter()
+        for h in gamer.get("points_history", []):
+            if h.get("type") == "event":
+                by_event[h["event_code"]] += h["points"]
+        if {k: v for k, v in gamer.get("events_points", {}).items() if v} != {k: v for k, v in by_event.items() if v}:
+            problems["points_by_event"].append(gid)
+        credited = counts["history"].get(gid, 0) - baseline["history"].get(gid, 0)
+        approved = counts["approved"].get(gid, 0) - baseline["approved"].get(gid, 0)
+        credited_total += credited
+        if credited != approved:
+            problems["credits_match_approvals"].append(f"{gid}: 加點 {credited} 次 / 通過 {approved} 張")
+        for code in gamer.get("joined_events", []):
+            if events.get(code) is None or gid not in events[code]["gamer_list"]:
+                problems["joined_events"].append(f"{gid} -> {code}")
+
+    for code, event in events.items():
+        if len(event["gamer_list"]) != len(set(event["gamer_list"])):
+            problems["gamer_list_unique"].append(code)
+        for gid in event["gamer_list"]:
+            gamer = store.get_gamer(gid)
+            if gamer is None or code not in gamer.get("joined_events", []):
+                problems["joined_events"].append(f"{code} -> {gid}")
+
+    for user_id, images in store.iter_images():
+        for img in images:
+            if img.get("status") == "approved":
+                event = events.get(img.get("event_code"))
+                task = event.task(img.get("task_id")) if event else None
+                if task is not None and user_id not in task["checked_users"]:
+                    problems["checked_users"].append(img.get("image_id"))
+            if img.get("image_id") not in baseline["image_ids"] and archive.find(img.get("content_hash", "")) is None:
+                problems["image_files"].append(img.get("image_id"))
+
+    if audit.counts["add_event_points"] != credited_total:
+        problems["audit_credits"].append(
+            f"稽核紀錄 {audit.counts['add_event_points']} 筆 / 加點 {credited_total} 次")
+
+    return {name: {"ok": not found, "failures": len(found), "examples": found[:5]} for name, found in problems.items()}
+
+
+def export_json(store) -> str:
+    return json.dumps(store.export_state(), ensure_ascii=False, sort_keys=True, default=str)
+
+
+async def drain_outbox(outbox, timeout: float) -> dict:
+    """等 outbox 送完 (最多 timeout 秒)；回傳花費時間與剩餘訊息數。"""
+    started = time.monotonic()
+    while outbox.stats()["depth"] and time.monotonic() - started < timeout:
+        await asyncio.sleep(0.2)
+    stats = outbox.stats()
+    return {
+        "drain_seconds": round(time.monotonic() - started, 2),
+        "remaining": stats["depth"],
+        "sent": stats["sent"],
+        "retried": stats["retried"],
+        "dropped": stats["dropped"],
+        "merged": stats["merged"],
+        "latency_p50": stats["latency_p50"],
+        "latency_p95": stats["latency_p95"]
+    }
+
+
+###############################
+# 執行
+###############################
+def parse_ramp(value: str) -> range:
+    start, step, stop = (int(v) for v in value.split(":"))
+    return range(start, stop + 1, step)
+
+
+def saturated(result: dict, args) -> str:
+    """此階段未達標的原因；達標時回傳空字串。"""
+    if result["shed"]:
+        return f"{result['shed']} 個請求因同時進行數達上限 ({args.max_inflight}) 被擋下"
+    if result["error_rate"] > args.max_error_rate:
+        return f"錯誤率 {result['error_rate']:.2%}"
+    if result["p99_ms"] > args.slo_ms:
+        return f"p99 {result['p99_ms']:.0f} ms 超過 {args.slo_ms:.0f} ms"
+    if result["offered_rate"] and result["achieved_rate"] < result["offered_rate"] * 0.9:
+        return f"吞吐量 {result['achieved_rate']}/s 跟不上 {result['offered_rate']}/s"
+    return ""
+
+
+async def run(main, args, plan: list, rng: random.Random) -> dict:
+    gateway = StubGateway(latency=args.discord_latency, rate_limited=args.discord_429,
+                          cdn_latency=args.cdn_latency, seed=args.seed)
+    report = {"phases": []}
+    async with running_app(main) as client:
+        runner = LoadRunner(main, client, gateway, args, rng)
+        baseline = await main.writer.run(credit_counts, main.bot.store)
+        await runner.setup()
+        try:
+            if args.ramp:
+                mix = next(p["mix"] for p in load_scenario(args.scenario)["phases"] if p["name"] == args.ramp_mix)
+                report["saturation"] = {"sustained_rate": None, "saturation_rate": None, "reason": ""}
+                for rate in parse_ramp(args.ramp):
+                    phase = {"duration": args.step_seconds, "rate": rate, "mix": mix}
+                    result = await runner.run_phase(f"ramp-{rate}", args.step_seconds, poisson_arrivals(phase, rng))
+                    report["phases"].append(result)
+                    print_phase(result)
+                    reason = saturated(result, args)
+                    if reason:
+                        report["saturation"].update(saturation_rate=rate, reason=reason)
+                        break
+                    report["saturation"]["sustained_rate"] = rate
+            else:
+                for name, duration, arrivals in plan:
+                    result = await runner.run_phase(name, duration, arrivals)
+                    report["phases"].append(result)
+                    print_phase(result)
+
+            report["outbox"] = await drain_outbox(main.outbox, args.drain_timeout)
+            # 停止送出後不再有寫入 (審核訊息 ID 等)，此時的記憶體狀態即應等於存檔
+            main.outbox.stop()
+            checks = await main.writer.run(check_consistency, main.bot.store, baseline, main.archive, main.audit)
+            checks["outbox_dropped"] = {"ok": report["outbox"]["dropped"] == 0,
+                                        "failures": report["outbox"]["dropped"], "examples": []}
+            in_memory = await main.writer.run(export_json, main.bot.store)
+        finally:
+            await gateway.stop_cdn()
+        report["skipped"] = dict(runner.skipped)
+        report["errors"] = dict(runner.errors.most_common(20))
+        report["ack_timeouts"] = dict(runner.ack_timeouts)
+        report["discord_calls"] = dict(gateway.calls)
+
+    # lifespan 結束時已存檔並關閉；重新載入後應與結束前的記憶體狀態完全相同
+    main.load_data()
+    reloaded = export_json(main.bot.store)
+    main.bot.store.close()
+    checks["persisted_state"] = {"ok": reloaded == in_memory, "failures": int(reloaded != in_memory), "examples": []}
+    report["checks"] = checks
+    return report
+
+
+###############################
+# 結果
+###############################
+def print_phase(result: dict):
+    print(f"\n[{result['phase']}] 目標 {result['offered_rate']}/s 實際 {result['achieved_rate']}/s "
+          f"完成 {result['completed']}/{result['offered']} 錯誤 {result['errors']} 擋下 {result['shed']} "
+          f"p50 {result['p50_ms']:.1f} ms p99 {result['p99_ms']:.1f} ms")
+    print(f"  {'操作':<14} {'n':>6} {'錯誤':>6} {'擋下':>6} {'p50 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for op, r in result["ops"].items():
+        print(f"  {op:<14} {r['n']:>6} {r['errors']:>6} {r['shed']:>6} {r['p50_ms']:>10.1f} "
+              f"{r['p99_ms']:>10.1f} {r['max_ms']:>10.1f}")
+
+
+def print_report(report: dict):
+    if "saturation" in report:
+        s = report["saturation"]
+        print(f"\n可承受速率：{s['sustained_rate']}/s；飽和點：{s['saturation_rate'] or '未達到'}"
+              + (f" ({s['reason']})" if s["reason"] else ""))
+    o = report["outbox"]
+    print(f"\noutbox：送出 {o['sent']} 重試 {o['retried']} 放棄 {o['dropped']} 合併 {o['merged']}，"
+          f"清空花了 {o['drain_seconds']} 秒，剩餘 {o['remaining']} 則")
+    if report["ack_timeouts"]:
+        print(f"超過 {ACK_DEADLINE:.0f} 秒才回應的互動：{report['ack_timeouts']}")
+    if report["errors"]:
+        print("錯誤：")
+        for key, n in report["errors"].items():
+            print(f"  {n:>5} x {key}")
+    print("\n一致性檢查：")
+    for name, c in report["checks"].items():
+        print(f"  {'OK  ' if c['ok'] else 'FAIL'} {name}" + (f" ({c['failures']}) {c['examples']}" if not c["ok"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--gamers", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=5)
+    parser.add_argument("--history", type=int, default=20)
+    parser.add_argument("--images", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenario", default=DEFAULT_SCENARIO)
+    parser.add_argument("--trace", help="重播錄製的 trace (JSONL)，取代 --scenario")
+    parser.add_argument("--save-trace", help="把本次的流量存成 trace (JSONL)")
+    parser.add_argument("--ramp", help="起始:每階增加:上限 (次/秒)，逐步加壓找出飽和點")
+    parser.add_argument("--ramp-mix", default="launch", help="加壓時使用 scenario 中哪個階段的 mix")
+    parser.add_argument("--step-seconds", type=float, default=10)
+    parser.add_argument("--slo-ms", type=float, default=1000, help="加壓時 p99 上限")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--max-inflight", type=int, default=500, help="同時進行中的請求上限，超過的視為放棄")
+    parser.add_argument("--bulk-size", type=int, default=20, help="每次批次審核的圖片數")
+    parser.add_argument("--discord-latency", type=float, default=0.08, help="每次 Discord API 呼叫的延遲 (秒)")
+    parser.add_argument("--discord-429", type=float, default=0.0, help="Discord API 回 429 的機率")
+    parser.add_argument("--cdn-latency", type=float, default=0.0, help="下載附件的額外延遲 (秒)")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="結束後最多等 outbox 送完幾秒")
+    parser.add_argument("--output", help="結果 JSON 路徑 (預設 benchmarks/results/<commit>-<backend>-loadtest.json)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.ramp:
+        plan = []
+    elif args.trace:
+        plan = trace_plan(args.trace)
+    else:
+        plan = scenario_plan(args.scenario, rng)
+    if args.save_trace:
+        save_trace(args.save_trace, plan)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_data_file(tmp, synthetic_state(args.gamers, args.events, args.tasks, args.history,
+                                             args.images, seed=args.seed))
+        app_main = import_main(tmp, args.backend)
+        report = asyncio.run(run(app_main, args, plan, rng))
+
+    commit = git_revision()
+    report.update({
+        "commit": commit,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": vars(args)
+    })
+    print_report(report)
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}-{args.backend}-loadtest.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n結果已寫入 {output}")
+
+    if not all(c["ok"] for c in report["checks"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+功能選單建立時間 vs 玩家紀錄數量。
+
+舊版每次建立選單都要讀出玩家資料 (SQLite 會組出完整點數紀錄)、
+必要時掃描圖片清單，並逐一讀取已參加的活動；新版只查 store.capabilities 的快取旗標。執行：
+
+    python benchmarks/menu_capabilities.py [--backend json|sqlite|both] [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import new_event, new_gamer  # noqa: E402
+from storage.json_store import JsonStore  # noqa: E402
+from storage.sqlite_store import SqliteStore  # noqa: E402
+
+SIZES = (10, 100, 1000, 10000, 50000)
+GAMER_ID = 1
+EVENTS = 20
+
+
+def legacy_flags(store, user_id: int) -> tuple:
+    """舊版 SelectionMenuSelect 的判斷方式 (has_any_timestamp / has_redeemable_event)。"""
+    user_data = store.get_gamer(user_id) or {}
+    has_timestamp = bool(user_data.get("points_history") or user_data.get("joined_event_timestamps"))
+    if not has_timestamp:
+        for img in store.get_images(user_id):
+            if img.get("upload_time") or img.get("approved_time") or img.get("rejected_time"):
+                has_timestamp = True
+                break
+    redeemable = False
+    for ev_code in user_data.get("joined_events", []):
+        event_obj = store.get_event(ev_code) or {}
+        if event_obj.get("prizes"):
+            redeemable = True
+            break
+    return bool(user_data.get("gamer_card_number")), has_timestamp, redeemable
+
+
+def capability_flags(store, user_id: int) -> tuple:
+    caps = store.capabilities.get(user_id)
+    return caps.has_card, caps.has_history, caps.has_redeemable_event
+
+
+def populate(store, history_size: int):
+    # 只有最後一個活動有獎品，舊版必須逐一讀過所有已參加的活動
+    for i in range(EVENTS):
+        event = new_event(f"RAE{i:03d}", f"活動{i}", "", "2024-01-01", "2024-12-31")
+        if i == EVENTS - 1:
+            event.add_prize("獎品", 10)
+        store.save_event(event)
+    gamer = new_gamer(GAMER_ID, "RGP00001")
+    gamer["joined_events"] = [f"RAE{i:03d}" for i in range(EVENTS)]
+    gamer["points_history"] = [
+        {"type": "api", "points": 1, "timestamp": "2024-01-01T00:00:00"} for _ in range(history_size)
+    ]
+    store.save_gamer(gamer)
+
+
+def timed(fn, store, repeat: int) -> float:
+    fn(store, GAMER_ID)  # 暖身 (capabilities 第一次查詢會建立快取)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(store, GAMER_ID)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run(backend: str, repeat: int):
+    print(f"[{backend}] 每次建立選單的平均時間 (微秒)")
+    print(f"{'紀錄數':>8} {'舊版':>12} {'capabilities':>14}")
+    for size in SIZES:
+        with tempfile.TemporaryDirectory() as tmp:
+            if backend == "json":
+                store = JsonStore(os.path.join(tmp, "data.json"))
+            else:
+                store = SqliteStore(os.path.join(tmp, "data.db"))
+            store.load()
+            populate(store, size)
+            assert legacy_flags(store, GAMER_ID) == capability_flags(store, GAMER_ID)
+            legacy = timed(legacy_flags, store, max(repeat // 10, 5) if backend == "sqlite" else repeat)
+            cached = timed(capability_flags, store, repeat)
+            store.close()
+        print(f"{size:>8} {legacy:>12.1f} {cached:>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("json", "sqlite", "both"), default="both")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    for backend in ("json", "sqlite") if args.backend == "both" else (args.backend,):
+        run(backend, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
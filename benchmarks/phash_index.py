@@ -0,0 +1,81 @@
+"""
+相似圖片查詢時間 vs 圖片數量。
+
+比較逐一計算 Hamming 距離的線性掃描與 PerceptualHashIndex (multi-index hashing)。
+圖片的感知 hash 以亂數產生，並混入一部分「同一張圖的變體」(翻轉少數位元)，兩者結果需一致。執行：
+
+    python benchmarks/phash_index.py [--distance 8] [--queries 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.image_index import PerceptualHashIndex, parse_phash  # noqa: E402
+
+SIZES = (1000, 10000, 100000, 300000)
+IMAGES_PER_USER = 20
+
+
+def random_hashes(n: int, rng: random.Random) -> list:
+    hashes = []
+    for i in range(n):
+        if hashes and rng.random() < 0.1:
+            value = parse_phash(rng.choice(hashes))
+            for b in rng.sample(range(64), rng.randint(0, 10)):
+                value ^= 1 << b
+        else:
+            value = rng.getrandbits(64)
+        hashes.append(f"{value:016x}")
+    return hashes
+
+
+def linear_scan(refs: list, phash: str, max_distance: int) -> list:
+    value = parse_phash(phash)
+    found = []
+    for user_id, seq, other in refs:
+        distance = bin(parse_phash(other) ^ value).count("1")
+        if distance <= max_distance:
+            found.append((distance, user_id, seq))
+    found.sort()
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--distance", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'images':>8} {'build ms':>9} {'scan ms/q':>10} {'index ms/q':>11} {'hits/q':>7}")
+    for n in SIZES:
+        hashes = random_hashes(n, rng)
+        refs = [(i // IMAGES_PER_USER, i % IMAGES_PER_USER, h) for i, h in enumerate(hashes)]
+        index = PerceptualHashIndex()
+        start = time.perf_counter()
+        for user_id in range(0, n // IMAGES_PER_USER + 1):
+            chunk = hashes[user_id * IMAGES_PER_USER:(user_id + 1) * IMAGES_PER_USER]
+            index.set_user(user_id, [{"phash": h} for h in chunk])
+        build = time.perf_counter() - start
+
+        queries = [rng.choice(hashes) for _ in range(args.queries)]
+        scan_queries = queries[:max(1, args.queries // 10)] if n > 10000 else queries
+        start = time.perf_counter()
+        expected = [linear_scan(refs, q, args.distance) for q in scan_queries]
+        scan = (time.perf_counter() - start) / len(scan_queries)
+
+        start = time.perf_counter()
+        results = [index.near(q, args.distance) for q in queries]
+        lookup = (time.perf_counter() - start) / len(queries)
+
+        assert results[:len(expected)] == expected, "index 與線性掃描結果不一致"
+        hits = sum(len(r) for r in results) / len(results)
+        print(f"{n:>8} {build * 1000:>9.0f} {scan * 1000:>10.2f} {lookup * 1000:>11.3f} {hits:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
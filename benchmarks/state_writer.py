@@ -0,0 +1,117 @@
+"""
+多執行緒同時修改玩家點數：直接讀改寫 vs 經由 StateWriter。
+
+模擬 FastAPI threadpool 與 Discord 同時加點：writers 個執行緒各對少數幾位玩家加點，
+同時 readers 個執行緒不斷讀取玩家資料，檢查 total_points 是否等於 points_history 的總和。
+直接讀改寫會遺失更新、讀到改到一半的資料；StateWriter 兩者皆為 0。執行：
+
+    python benchmarks/state_writer.py [--backend json|sqlite|both] [--writers 8] [--ops 100]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import StateWriter, credit_points, new_gamer  # noqa: E402
+from storage.json_store import JsonStore  # noqa: E402
+from storage.sqlite_store import SqliteStore  # noqa: E402
+
+GAMERS = 4
+
+
+def open_store(backend: str, tmp: str):
+    if backend == "json":
+        store = JsonStore(os.path.join(tmp, "data.json"), debounce_seconds=0.05)
+    else:
+        store = SqliteStore(os.path.join(tmp, "data.db"))
+    store.load()
+    for gid in range(GAMERS):
+        store.save_gamer(new_gamer(gid))
+    return store
+
+
+def add_point(store, gamer_id: int):
+    gamer = store.get_gamer(gamer_id)
+    credit_points(gamer, 1)
+    gamer.setdefault("points_history", []).append({"type": "global", "points": 1})
+    # 讓出 GIL，放大讀改寫之間的空檔 (實際環境中是 I/O 或其他運算)
+    time.sleep(0)
+    store.save_gamer(gamer)
+
+
+def run(backend: str, use_writer: bool, writers: int, readers: int, ops: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(backend, tmp)
+        writer = StateWriter() if use_writer else None
+        store.writer = writer
+        stop = threading.Event()
+        torn = [0]
+        reads = [0]
+
+        def write_loop(n: int):
+            for i in range(ops):
+                if writer is not None:
+                    writer.call(add_point, store, (n + i) % GAMERS)
+                else:
+                    add_point(store, (n + i) % GAMERS)
+
+        def read_loop():
+            while not stop.is_set():
+                for gid in range(GAMERS):
+                    gamer = store.get_gamer(gid)
+                    history = list(gamer.get("points_history", []))
+                    if sum(h["points"] for h in history) != gamer.get("total_points", 0):
+                        torn[0] += 1
+                    reads[0] += 1
+                # 稍微讓出 CPU，避免讀取執行緒獨佔 GIL
+                time.sleep(0.001)
+
+        reader_threads = [threading.Thread(target=read_loop) for _ in range(readers)]
+        writer_threads = [threading.Thread(target=write_loop, args=(n,)) for n in range(writers)]
+        for t in reader_threads:
+            t.start()
+        started = time.perf_counter()
+        for t in writer_threads:
+            t.start()
+        for t in writer_threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for t in reader_threads:
+            t.join()
+        if writer is not None:
+            writer.stop()
+
+        total = sum(store.get_gamer(gid).get("total_points", 0) for gid in range(GAMERS))
+        store.close()
+        return {
+            "ops_per_s": writers * ops / elapsed,
+            "lost": writers * ops - total,
+            "torn": torn[0],
+            "reads": reads[0]
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=("json", "sqlite", "both"), default="both")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=100)
+    args = parser.parse_args()
+
+    backends = ("json", "sqlite") if args.backend == "both" else (args.backend,)
+    print(f"{'backend':>8} {'mode':>8} {'ops/s':>9} {'lost':>6} {'torn':>6} {'reads':>8}")
+    for backend in backends:
+        for use_writer in (False, True):
+            r = run(backend, use_writer, args.writers, args.readers, args.ops)
+            mode = "writer" if use_writer else "direct"
+            print(f"{backend:>8} {mode:>8} {r['ops_per_s']:>9.0f} {r['lost']:>6} {r['torn']:>6} {r['reads']:>8}")
+
+
+if __name__ == "__main__":
+    main()
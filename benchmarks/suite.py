@@ -0,0 +1,236 @@
+"""
+整體 benchmark：以合成資料 (benchmarks/harness.py) 在同一個 process 內驅動 FastAPI (ASGI client)
+與 cogs 的 callback (假的 Interaction / User)，量測各熱點操作的吞吐量與 p50 / p99。
+
+結果存成 JSON (預設 benchmarks/results/<commit>-<backend>.json)，
+以 --compare 與先前的結果比較，p50 或 p99 變慢超過 --threshold 時以 exit code 1 結束。執行：
+
+    python benchmarks/suite.py [--backend json|sqlite] [--gamers 2000] [--history 20] [--repeat 200]
+    python benchmarks/suite.py --compare benchmarks/results/<舊commit>-json.json
+
+每次執行只能測一種 backend (main 在同一個 process 只能載入一次)。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import (FakeInteraction, FakeUser, Samples, card_number, choose, event_code,  # noqa: E402
+                     git_revision, import_main, running_app, synthetic_state, write_data_file)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+async def measure(samples: Samples, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    if asyncio.iscoroutine(result):
+        result = await result
+    samples.add(time.perf_counter() - started)
+    return result
+
+
+async def get_ok(client, url: str):
+    resp = await client.get(url)
+    if resp.status_code != 200:
+        raise RuntimeError(f"GET {url} -> {resp.status_code}")
+    return resp
+
+
+###############################
+# 各項操作
+###############################
+def bench_load(main, repeat: int) -> dict:
+    # 第一次載入 (sqlite 會匯入 data.json) 不計
+    main.load_data()
+    main.bot.store.close()
+    samples = Samples()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        main.load_data()
+        samples.add(time.perf_counter() - started)
+        main.bot.store.close()
+    return samples.summary()
+
+
+async def bench_running(main, args, rng: random.Random) -> dict:
+    from cogs.card_binding import CardBindingCog
+    from cogs.image_review import ReviewView
+    from cogs.selection_menu import SelectionMenuSelect
+
+    results = {}
+    gamer_ids = [rng.randint(1, args.gamers) for _ in range(args.repeat)]
+    cog = CardBindingCog(main.bot)
+    admin = FakeUser(10 ** 9, "admin")
+
+    async with running_app(main) as client:
+        samples = Samples()
+        for gid in gamer_ids:
+            await measure(samples, get_ok, client, f"/api/gamer/card/{card_number(gid)}")
+        results["card_lookup_api"] = samples.summary()
+
+        samples = Samples()
+        for gid in gamer_ids:
+            await measure(samples, cog.query_card, FakeUser(gid))
+        results["card_lookup_cog"] = samples.summary()
+
+        samples = Samples()
+        for _ in range(args.repeat):
+            # 清空頁面快取，每次都重新組資料並渲染
+            main.render_cache.bind(main.bot.store.versions)
+            await measure(samples, get_ok, client, "/dashboard")
+        results["dashboard_render"] = samples.summary()
+
+        samples = Samples()
+        for _ in range(args.repeat):
+            await measure(samples, get_ok, client, "/dashboard")
+        results["dashboard_cached"] = samples.summary()
+
+        samples = Samples()
+        for gid in gamer_ids:
+            await measure(samples, get_ok, client, f"/api/gamer/{gid}/timeline?limit=50")
+        results["timeline_api"] = samples.summary()
+
+        samples = Samples()
+        for gid in gamer_ids:
+            await measure(samples, get_ok, client, f"/gamer/{gid}/timestamps")
+        results["timeline_page"] = samples.summary()
+
+        samples = Samples()
+        for gid in gamer_ids:
+            await measure(samples, SelectionMenuSelect, cog, FakeUser(gid))
+        results["menu_build"] = samples.summary()
+
+        samples = Samples()
+        for gid in gamer_ids:
+            user = FakeUser(gid)
+            select = SelectionMenuSelect(cog, user)
+            choose(select, "query_timestamps")
+            await measure(samples, select.callback, FakeInteraction(user))
+        results["menu_timestamps_callback"] = samples.summary()
+
+        samples = Samples()
+        for gid in gamer_ids:
+            code = rng.choice(main.bot.store.get_gamer(gid)["joined_events"])
+            await measure(samples, asyncio.to_thread, main.add_event_points_internal, gid, code, 1)
+        results["add_event_points"] = samples.summary()
+
+        samples = Samples()
+        for _ in range(max(args.repeat // 10, 5)):
+            for gid in rng.sample(range(1, args.gamers + 1), k=min(20, args.gamers)):
+                await client.put(f"/api/gamer/{gid}/points", params={"points": 1})
+            await measure(samples, asyncio.to_thread, main.bot.store.flush)
+        results["store_flush"] = samples.summary()
+
+        samples = Samples()
+        pending = [(image_id, img) for image_id, _, img in main.bot.store.iter_pending_images()][:args.repeat]
+        for image_id, img in pending:
+            view = ReviewView(main.bot, image_id, img)
+            await measure(samples, view.children[0].callback, FakeInteraction(admin))
+        results["approve_button"] = samples.summary()
+
+        # 最後才刪除活動 (會移除資料)；時間包含背景清除所有參加者的紀錄
+        samples = Samples()
+        for i in range(min(args.delete_events, args.events)):
+            await measure(samples, delete_event, main, client, event_code(i))
+        results["delete_event"] = samples.summary()
+
+    return results
+
+
+async def delete_event(main, client, code: str):
+    resp = await client.delete(f"/api/event/{code}")
+    if resp.status_code != 200:
+        raise RuntimeError(f"DELETE {code} -> {resp.status_code}")
+    job = main.jobs.get(resp.json()["job_id"])
+    while job.status in ("pending", "running"):
+        await asyncio.sleep(0.001)
+
+
+###############################
+# 結果
+###############################
+def print_results(results: dict):
+    print(f"{'操作':<26} {'n':>6} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<26} {r['n']:>6} {r['ops_per_s'] or 0:>10.1f} {r['p50_ms']:>10.3f} "
+              f"{r['p99_ms']:>10.3f} {r['max_ms']:>10.3f}")
+
+
+def compare(old: dict, new: dict, threshold: float) -> bool:
+    """印出與舊結果的差異；有任一項 p50 / p99 變慢超過 threshold 時回傳 True。"""
+    print(f"\n與 {old.get('commit')} 比較 (變慢超過 {threshold:.0%} 標記 !)")
+    print(f"{'操作':<26} {'p50 舊':>10} {'p50 新':>10} {'p99 舊':>10} {'p99 新':>10}")
+    regressed = False
+    for name, r in new["results"].items():
+        before = old.get("results", {}).get(name)
+        if before is None:
+            print(f"{name:<26} {'-':>10} {r['p50_ms']:>10.3f} {'-':>10} {r['p99_ms']:>10.3f}")
+            continue
+        marks = ""
+        for key in ("p50_ms", "p99_ms"):
+            if before[key] > 0 and (r[key] - before[key]) / before[key] > threshold:
+                marks += "!"
+        regressed = regressed or bool(marks)
+        print(f"{name:<26} {before['p50_ms']:>10.3f} {r['p50_ms']:>10.3f} "
+              f"{before['p99_ms']:>10.3f} {r['p99_ms']:>10.3f} {marks}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--gamers", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=5)
+    parser.add_argument("--history", type=int, default=20, help="每位玩家的點數紀錄筆數")
+    parser.add_argument("--images", type=int, default=2, help="每位玩家的上傳圖片數")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--load-repeat", type=int, default=5)
+    parser.add_argument("--delete-events", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="結果 JSON 路徑 (預設 benchmarks/results/<commit>-<backend>.json)")
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_data_file(tmp, synthetic_state(args.gamers, args.events, args.tasks, args.history,
+                                             args.images, seed=args.seed))
+        app_main = import_main(tmp, args.backend)
+        results = {"load_data": bench_load(app_main, args.load_repeat)}
+        results.update(asyncio.run(bench_running(app_main, args, random.Random(args.seed))))
+
+    commit = git_revision()
+    report = {
+        "commit": commit,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": vars(args),
+        "results": results
+    }
+    print_results(results)
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}-{args.backend}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n結果已寫入 {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        if compare(old, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
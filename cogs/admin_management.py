@@ -1,17 +1,19 @@
 import discord
 from discord.ext import commands
 from discord.ui import View, Select, Modal, TextInput
+import logging
 import re
 import os
 import asyncio
-from dotenv import load_dotenv
-from main import save_data
+from storage import new_gamer, DuplicateCardError
 from typing import Optional, List
 from datetime import datetime, timedelta
 
-load_dotenv()
+# .env 已由 main.py 載入
 ADMIN_CHANNEL_ID = int(os.getenv("ADMIN_CHANNEL_ID"))
 
+log = logging.getLogger(__name__)
+
 def is_admin_channel(ctx):
     return ctx.channel.id == ADMIN_CHANNEL_ID
 
@@ -43,25 +45,24 @@ class ModifyCardModal(Modal):
             await interaction.followup.send("卡號格式錯誤，請重新輸入", ephemeral=True)
             return
 
-        if user_id_int not in self.bot.gamers:
-            self.bot.gamers[user_id_int] = {
-                "gamer_id": user_id_int,
-                "gamer_card_number": self.new_card.value,
-                "gamer_is_blocked": False,
-                "gamer_bind_gamepass": None,
-                "joined_events": [],
-                "history_event_list": [],
-                "history_event_pts_list": [],
-                "events_points": {}  
-            }
-        else:
-            self.bot.gamers[user_id_int]["gamer_card_number"] = self.new_card.value
+        def update_card() -> str:
+            owner = self.bot.store.find_gamer_by_card(self.new_card.value)
+            if owner is not None and owner["gamer_id"] != user_id_int:
+                return f"卡號 {self.new_card.value} 已被玩家 {owner['gamer_id']} 綁定"
 
-        save_data()
-        await interaction.followup.send(
-            f"玩家 {user_id_int} 的卡號已更新為 {self.new_card.value}", 
-            ephemeral=True
-        )
+            gamer = self.bot.store.get_gamer(user_id_int)
+            if gamer is None:
+                gamer = new_gamer(user_id_int, self.new_card.value)
+            else:
+                gamer["gamer_card_number"] = self.new_card.value
+
+            try:
+                self.bot.store.save_gamer(gamer)
+            except DuplicateCardError as e:
+                return str(e)
+            return f"玩家 {user_id_int} 的卡號已更新為 {self.new_card.value}"
+
+        await interaction.followup.send(await self.bot.writer.run(update_card), ephemeral=True)
 
 class QueryCardByUserModal(Modal):
     def __init__(self, bot: commands.Bot):
@@ -78,11 +79,12 @@ class QueryCardByUserModal(Modal):
             await interaction.followup.send("玩家DC ID必須是數字", ephemeral=True)
             return
         
-        if user_id_int not in self.bot.gamers:
+        gamer = self.bot.store.get_gamer(user_id_int)
+        if gamer is None:
             await interaction.followup.send("該玩家不存在或尚未綁定卡號", ephemeral=True)
             return
         
-        card = self.bot.gamers[user_id_int].get("gamer_card_number")
+        card = gamer.get("gamer_card_number")
         if card:
             await interaction.followup.send(f"玩家 {user_id_int} 的卡號為：{card}", ephemeral=True)
         else:
@@ -99,10 +101,9 @@ class QueryUserByCardModal(Modal):
         await interaction.response.defer(ephemeral=True)
         card = self.card_number.value.strip()
         found_user = None
-        for g_id, data in self.bot.gamers.items():
-            if data.get("gamer_card_number") == card:
-                found_user = g_id
-                break
+        gamer = self.bot.store.find_gamer_by_card(card)
+        if gamer is not None:
+            found_user = gamer["gamer_id"]
 
         if found_user is None:
             await interaction.followup.send("找不到此卡號的玩家", ephemeral=True)
@@ -124,11 +125,7 @@ class QueryAllGamersModal(Modal):
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         kw = self.keyword.value.strip().lower()
-        results = []
-        for g_id, data in self.bot.gamers.items():
-            text_to_check = (f"{data.get('gamer_card_number','')}").lower()
-            if kw == "" or kw in text_to_check:
-                results.append((g_id, data))
+        results = [(data["gamer_id"], data) for data in self.bot.store.search_gamers_by_card(kw)]
 
         if not results:
             await interaction.followup.send("找不到任何符合的玩家", ephemeral=True)
@@ -163,18 +160,24 @@ class BlockUnblockModal(Modal):
             return
 
         action = self.block_or_unblock.value.strip().lower()
-        if user_id_int not in self.bot.gamers:
-            await interaction.followup.send("該玩家不存在", ephemeral=True)
+        if action not in ("block", "unblock"):
+            await interaction.followup.send("請輸入 block 或 unblock", ephemeral=True)
             return
 
-        if action == "block":
-            self.bot.gamers[user_id_int]["gamer_is_blocked"] = True
-            await interaction.followup.send(f"玩家 {user_id_int} 已被封鎖", ephemeral=True)
-        elif action == "unblock":
-            self.bot.gamers[user_id_int]["gamer_is_blocked"] = False
-            await interaction.followup.send(f"玩家 {user_id_int} 已解除封鎖", ephemeral=True)
-        else:
-            await interaction.followup.send("請輸入 block 或 unblock", ephemeral=True)
+        def set_blocked() -> str:
+            gamer = self.bot.store.get_gamer(user_id_int)
+            if gamer is None:
+                return "該玩家不存在"
+            gamer["gamer_is_blocked"] = action == "block"
+            self.bot.store.save_gamer(gamer)
+            self.bot.audit.record(action, {
+                "gamer_id": user_id_int,
+                "admin_id": interaction.user.id,
+                "timestamp": (datetime.utcnow() + timedelta(hours=8)).isoformat()
+            })
+            return f"玩家 {user_id_int} 已被封鎖" if action == "block" else f"玩家 {user_id_int} 已解除封鎖"
+
+        await interaction.followup.send(await self.bot.writer.run(set_blocked), ephemeral=True)
 
 ############################################
 # 僅保留「其餘功能」的下拉選單
@@ -239,4 +242,4 @@ class AdminManagementCog(commands.Cog):
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(AdminManagementCog(bot))
-    print("AdminManagementCog 已成功加載。")
\ No newline at end of file
+    log.info("AdminManagementCog 已成功加載。")
\ No newline at end of file
@@ -1,69 +1,67 @@
 import discord
 from discord.ext import commands
+import logging
 import re
-from main import save_data
-from datetime import datetime
+from storage import new_gamer, DuplicateCardError
 from datetime import datetime, timedelta
 
+log = logging.getLogger(__name__)
+
 class CardBindingCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.card_pattern = re.compile(r'^RGP(?=.*[0-9])(?=.*[A-Za-z])[A-Za-z0-9]{5}$')
 
     async def bind_card(self, user: discord.User, card_number: str):
-        for existing_user in self.bot.gamers.values():
-            if existing_user.get("gamer_card_number") == card_number:
-                return False, f"卡號 {card_number} 已被其他使用者綁定。"
-            
-        print(f"DEBUG: bind_card user={user}, card_number={card_number}")
+        log.debug("bind_card user=%s, card_number=%s", user, card_number)
+        # 先檢查格式，格式錯誤不必排入寫入指令、查詢卡號
         if not self.card_pattern.match(card_number):
             return False, "卡號格式錯誤(需為RGPXXXXX)"
+        return await self.bot.writer.run(self._bind_card, user, card_number)
+
+    def _bind_card(self, user: discord.User, card_number: str):
+        existing_user = self.bot.store.find_gamer_by_card(card_number)
+        if existing_user is not None and existing_user["gamer_id"] != user.id:
+            return False, f"卡號 {card_number} 已被其他使用者綁定。"
 
-        if user.id not in self.bot.gamers:
-            print("DEBUG: user not in self.bot.gamers => 建立 gamer")
-            self.bot.gamers[user.id] = {
-                "gamer_id": user.id,
-                "gamer_card_number": card_number,
-                "gamer_is_blocked": False,
-                "gamer_bind_gamepass": None,
-                "joined_events": [],
-                "history_event_list": [],
-                "history_event_pts_list": []
-            }
+        gamer = self.bot.store.get_gamer(user.id)
+        if gamer is None:
+            log.debug("user not in gamers => 建立 gamer")
+            gamer = new_gamer(user.id, card_number)
         else:
-            self.bot.gamers[user.id]["gamer_card_number"] = card_number
+            gamer["gamer_card_number"] = card_number
 
-        save_data()
+        try:
+            self.bot.store.save_gamer(gamer)
+        except DuplicateCardError:
+            return False, f"卡號 {card_number} 已被其他使用者綁定。"
         return True, f"你的卡號 {card_number} 綁定成功！"
 
     async def query_card(self, user: discord.User):
-        if user.id not in self.bot.gamers:
+        gamer = self.bot.store.get_gamer(user.id)
+        if gamer is None:
             return False, "你尚未綁定卡片。"
-        card = self.bot.gamers[user.id].get("gamer_card_number")
+        card = gamer.get("gamer_card_number")
         if card:
             return True, f"你的卡號是 {card}"
         else:
             return False, "尚未綁定卡片"
 
     async def join_event(self, user: discord.User, event_code: str):
-        print(f"DEBUG: join_event => user={user.id}, event_code={event_code}")
-        if event_code not in self.bot.events:
-            print("DEBUG: 該活動編號不存在")
+        return await self.bot.writer.run(self._join_event, user, event_code)
+
+    def _join_event(self, user: discord.User, event_code: str):
+        log.debug("join_event => user=%s, event_code=%s", user.id, event_code)
+        event = self.bot.store.get_event(event_code)
+        if event is None:
+            log.debug("該活動編號不存在")
             return False, f"活動 {event_code} 不存在"
 
-        if user.id not in self.bot.gamers:
-            print("DEBUG: user不在 gamers => 建立")
-            self.bot.gamers[user.id] = {
-                "gamer_id": user.id,
-                "gamer_card_number": None,
-                "gamer_is_blocked": False,
-                "gamer_bind_gamepass": None,
-                "joined_events": [],
-                "history_event_list": [],
-                "history_event_pts_list": []
-            }
-
-        event = self.bot.events[event_code]
+        gamer = self.bot.store.get_gamer(user.id)
+        if gamer is None:
+            log.debug("user不在 gamers => 建立")
+            gamer = new_gamer(user.id)
+
         try:
             end_date = datetime.strptime(event["event_end_date"], "%Y-%m-%d").date()
         except Exception as e:
@@ -71,29 +69,39 @@ class CardBindingCog(commands.Cog):
         today = (datetime.utcnow() + timedelta(hours=8)).date()
         if today > end_date:
             event["historical"] = True
-            save_data()
+            self.bot.store.save_event(event)
+            self.bot.store.save_gamer(gamer)
             return False, f"活動 {event_code} 已過期，無法參加"
 
         if user.id in event["gamer_list"]:
             return False, f"你已參加過此活動 {event_code}"
 
         event["gamer_list"].append(user.id)
-        self.bot.gamers[user.id].setdefault("joined_events", [])
-        self.bot.gamers[user.id]["joined_events"].append(event_code)
-        self.bot.gamers[user.id].setdefault("joined_event_timestamps", {})
-        self.bot.gamers[user.id]["joined_event_timestamps"][event_code] = (datetime.utcnow() + timedelta(hours=8)).isoformat()
+        gamer.setdefault("joined_events", [])
+        gamer["joined_events"].append(event_code)
+        gamer.setdefault("joined_event_timestamps", {})
+        gamer["joined_event_timestamps"][event_code] = (datetime.utcnow() + timedelta(hours=8)).isoformat()
 
-        save_data()
+        self.bot.store.save_event(event)
+        self.bot.store.save_gamer(gamer)
         return True, f"你已成功參加活動 {event_code}"
 
-    async def update_menu(self, user: discord.User):
+    async def cog_load(self):
+        self.bot.outbox.register("menu", self.send_menu)
+
+    async def send_menu(self, payload: dict):
         from cogs.selection_menu import SelectionMenuView
+        user = self.bot.get_user(payload["user_id"]) or await self.bot.fetch_user(payload["user_id"])
         channel = user.dm_channel
         if not channel:
             channel = await user.create_dm()
         view = SelectionMenuView(self, user)
         await channel.send("請選擇功能：", view=view)
 
+    async def update_menu(self, user: discord.User):
+        # 經由 outbox 送出，不等待私訊完成；尚未送出的相同選單不重複排入
+        self.bot.outbox.put("menu", {"user_id": user.id}, route=f"dm:{user.id}", merge="dedupe")
+
 async def setup(bot: commands.Bot):
     await bot.add_cog(CardBindingCog(bot))
-    print("CardBindingCog 已成功加載。")
\ No newline at end of file
+    log.info("CardBindingCog 已成功加載。")
\ No newline at end of file
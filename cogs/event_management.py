@@ -1,17 +1,20 @@
 import discord
 from discord.ext import commands
 from discord.ui import View, Select, Modal, TextInput
+import logging
 import re
 import os
 import asyncio
-from dotenv import load_dotenv
-from main import save_data, update_event_max_points, record_api
+from main import update_event_max_points
+from storage import new_event
 from typing import Optional, List
 from datetime import datetime, timedelta
 
-load_dotenv()
+# .env 已由 main.py 載入
 ADMIN_CHANNEL_ID = int(os.getenv("ADMIN_CHANNEL_ID"))
 
+log = logging.getLogger(__name__)
+
 def is_admin_channel(ctx):
     return ctx.channel.id == ADMIN_CHANNEL_ID
 
@@ -61,12 +64,6 @@ class CreateEventModal(Modal):
             if not re.match(pattern, code):
                 await interaction.followup.send("活動編號格式錯誤！(須為 RAEXXX)", ephemeral=True)
                 return
-            if not hasattr(self.bot, "events"):
-                self.bot.events = {}
-            if code in self.bot.events:
-                await interaction.followup.send("該活動編號已存在。", ephemeral=True)
-                return
-
             try:
                 start_date = datetime.strptime(self.start_date.value.strip(), "%Y-%m-%d").date()
                 end_date = datetime.strptime(self.end_date.value.strip(), "%Y-%m-%d").date()
@@ -79,17 +76,25 @@ class CreateEventModal(Modal):
                 await interaction.followup.send("結束日期不能小於當前日期！", ephemeral=True)
                 return
 
-            self.bot.events[code] = {
-                "event_code": code,
-                "event_name": self.event_name.value.strip(),
-                "event_description": self.event_desc.value.strip(),
-                "event_start_date": self.start_date.value.strip(),
-                "event_end_date": self.end_date.value.strip(),
-                "gamer_list": [],
-                "tasks": [],
-                "max_points": 0
-            }
-            save_data()
+            def create_event() -> Optional[str]:
+                """建立成功回傳 None，否則回傳錯誤訊息。"""
+                if self.bot.store.has_event(code):
+                    return "該活動編號已存在。"
+                if self.bot.store.event_cleanup_pending(code):
+                    return "此活動編號的舊紀錄仍在清除中，請稍後再試。"
+                self.bot.store.save_event(new_event(
+                    code,
+                    self.event_name.value.strip(),
+                    self.event_desc.value.strip(),
+                    self.start_date.value.strip(),
+                    self.end_date.value.strip()
+                ))
+                return None
+
+            error = await self.bot.writer.run(create_event)
+            if error:
+                await interaction.followup.send(error, ephemeral=True)
+                return
             await interaction.followup.send(
                 f"活動 {self.event_name.value} 已建立，編號：{code}。\n請使用【新增任務】功能加入任務。",
                 ephemeral=True
@@ -99,8 +104,8 @@ class CreateEventModal(Modal):
             view = EventManagementView(self.bot)
             await interaction.followup.send("請繼續選擇活動管理功能：", view=view, ephemeral=True)
 
-        except Exception as e:
-            print("Error in CreateEventModal.on_submit:", e)
+        except Exception:
+            log.exception("Error in CreateEventModal.on_submit")
             await interaction.followup.send("建立活動時發生錯誤。", ephemeral=True)
 
 ########################################
@@ -153,24 +158,20 @@ class CreateTaskModal(Modal):
             except ValueError:
                 await interaction.followup.send("任務點數必須是數字！", ephemeral=True)
                 return
-            if event_code not in self.bot.events:
+
+            def add_task() -> bool:
+                event_obj = self.bot.store.get_event(event_code)
+                if event_obj is None:
+                    return False
+                event_obj.add_task(task_name, task_desc, task_points)
+                update_event_max_points(event_obj)
+                self.bot.store.save_event(event_obj)
+                return True
+
+            if not await self.bot.writer.run(add_task):
                 await interaction.followup.send("活動編號不存在！", ephemeral=True)
                 return
 
-            tasks = self.bot.events[event_code].get("tasks", [])
-            new_id = len(tasks) + 1
-            tasks.append({
-                "task_id": new_id,
-                "task_name": task_name,
-                "task_description": task_desc, 
-                "task_points": task_points,
-                "assigned_users": [],
-                "checked_users": []
-            })
-            self.bot.events[event_code]["tasks"] = tasks
-            update_event_max_points(self.bot.events[event_code])
-            save_data()
-
             await interaction.followup.send(
                 f"已新增任務 {task_name} 到活動 {event_code}，可給予點數：{task_points}",
                 ephemeral=True
@@ -180,8 +181,8 @@ class CreateTaskModal(Modal):
             view = EventManagementView(self.bot)
             await interaction.followup.send("請繼續選擇活動管理功能：", view=view, ephemeral=True)
 
-        except Exception as e:
-            print("Error in CreateTaskModal.on_submit:", e)
+        except Exception:
+            log.exception("Error in CreateTaskModal.on_submit")
             await interaction.followup.send("新增任務時發生錯誤。", ephemeral=True)
 
 ########################################
@@ -218,33 +219,31 @@ class CreatePrizeModal(Modal):
             p_name = self.prize_name.value.strip()
             p_cost_str = self.points_required.value.strip()
 
-            if code not in self.bot.events:
-                await interaction.followup.send(f"活動 {code} 不存在，無法新增獎品。", ephemeral=True)
-                return
-            
             try:
                 p_cost = int(p_cost_str)
             except ValueError:
                 await interaction.followup.send("所需點數必須是數字！", ephemeral=True)
                 return
 
-            # 新增獎品
-            self.bot.events[code].setdefault("prizes", [])
-            new_prize = {
-                "prize_id": len(self.bot.events[code]["prizes"]) + 1,
-                "prize_name": p_name,
-                "points_required": p_cost
-            }
-            self.bot.events[code]["prizes"].append(new_prize)
+            def add_prize() -> bool:
+                event_obj = self.bot.store.get_event(code)
+                if event_obj is None:
+                    return False
+                # 新增獎品
+                event_obj.add_prize(p_name, p_cost)
+                self.bot.store.save_event(event_obj)
+                return True
 
-            record_api("create_prize", {
+            if not await self.bot.writer.run(add_prize):
+                await interaction.followup.send(f"活動 {code} 不存在，無法新增獎品。", ephemeral=True)
+                return
+
+            self.bot.audit.record("create_prize", {
                 "event_code": code,
                 "prize_name": p_name,
                 "cost": p_cost,
                 "timestamp": (datetime.utcnow() + timedelta(hours=8)).isoformat()
             })
-
-            save_data()
             await interaction.followup.send(
                 f"已為活動 {code} 新增獎品：{p_name} (需要 {p_cost} 點)",
                 ephemeral=True
@@ -254,8 +253,8 @@ class CreatePrizeModal(Modal):
             view = EventManagementView(self.bot)
             await interaction.followup.send("請繼續選擇活動管理功能：", view=view, ephemeral=True)
 
-        except Exception as e:
-            print("Error in CreatePrizeModal.on_submit:", e)
+        except Exception:
+            log.exception("Error in CreatePrizeModal.on_submit")
             await interaction.followup.send("新增獎品時發生錯誤。", ephemeral=True)
 
 ########################################
@@ -321,4 +320,4 @@ class EventManagementCog(commands.Cog):
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(EventManagementCog(bot))
-    print("EventManagementCog 已成功加載。")
\ No newline at end of file
+    log.info("EventManagementCog 已成功加載。")
\ No newline at end of file
@@ -1,138 +1,162 @@
 import discord
+import logging
 import os
 from discord.ext import commands
 from discord.ui import View, Button
-from dotenv import load_dotenv
 from datetime import datetime, timedelta
+from metrics import CALLBACK_SECONDS, timed
+from storage.image_index import new_image_id
+from uploads import UploadRejected
 
-load_dotenv()
+# .env 已由 main.py 載入
 TARGET_CHANNEL_ID = int(os.getenv("TARGET_CHANNEL_ID"))
+# 感知 hash (64 位元) 相差幾個位元以內視為相似圖片
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "8"))
+
+log = logging.getLogger(__name__)
+
+def describe_image(user_id: int, image: dict) -> str:
+    """審核訊息中提示重複 / 相似圖片用的一行說明。"""
+    link = f" [審核訊息]({image['review_jump_url']})" if image.get("review_jump_url") else ""
+    return (f"<@{user_id}> `{image.get('filename')}` ({image.get('event_code')} 任務ID={image.get('task_id')}, "
+            f"{image.get('status')}){link}")
+
+def review_names(bot: commands.Bot, image: dict):
+    """回傳 (活動物件, 活動名稱, 任務名稱)，通過與拒絕共用。"""
+    task_id = image.get("task_id")
+    event_name = "N/A"
+    task_name = f"任務ID={task_id}"
+    event_obj = bot.store.get_event(image.get("event_code"))
+    if event_obj:
+        event_name = event_obj.get("event_name", "N/A")
+        t = event_obj.task(task_id)
+        if t:
+            task_name = f"{t.get('task_name','無任務名稱')} (ID={task_id})"
+    return event_obj, event_name, task_name
 
 class ApproveButton(discord.ui.Button):
-    def __init__(self, bot: commands.Bot, user_id: int, filename: str, event_code: str, task_id: int, task_points: int):
-        super().__init__(style=discord.ButtonStyle.success, label=f"通過 (+{task_points}點)")
+    def __init__(self, bot: commands.Bot, image_id: str, task_points: int):
+        # custom_id 帶 image_id，重啟後 bot.add_view 重新註冊即可繼續處理舊訊息
+        super().__init__(style=discord.ButtonStyle.success, label=f"通過 (+{task_points}點)",
+                         custom_id=f"review:approve:{image_id}")
         self.bot = bot
-        self.user_id = user_id
-        self.filename = filename
-        self.event_code = event_code
-        self.task_id = task_id
-        self.task_points = task_points
+        self.image_id = image_id
+
+    def approve(self):
+        """在寫入者執行緒中執行：圖片狀態、任務與玩家點數一起更新；已審核過則回傳 None。"""
+        found = self.bot.store.find_image(self.image_id)
+        if not found:
+            return None
+        user_id, seq, img = found
+        event_code = img.get("event_code")
+        task_id = img.get("task_id")
+
+        task_points = 0
+        event_obj, event_name, task_name = review_names(self.bot, img)
+        if event_obj:
+            t = event_obj.task(task_id)
+            if t:
+                task_points = t.get("task_points", 0)
+                if user_id not in t["checked_users"]:
+                    t["checked_users"].append(user_id)
+            self.bot.store.save_event(event_obj)
+
+        img["status"] = "approved"
+        img["approved_time"] = (datetime.utcnow() + timedelta(hours=8)).isoformat()
+        self.bot.store.update_image(user_id, seq, img)
 
+        try:
+            result_msg = self.bot.add_event_points_internal(user_id, event_code, task_points)
+        except AttributeError:
+            result_msg = "bot 未定義 add_event_points_internal"
+        return user_id, img["filename"], event_name, task_name, task_points, result_msg
+
+    @timed(CALLBACK_SECONDS, callback="approve_button")
     async def callback(self, interaction: discord.Interaction):
-        data = self.bot.user_images.get(self.user_id, [])
-        for img in data:
-            if (
-                img["filename"] == self.filename
-                and img.get("task_id") == self.task_id
-                and img["status"] == "pending"
-            ):
-                user = self.bot.get_user(self.user_id) or await self.bot.fetch_user(self.user_id)
-                if not user:
-                    return
-
-                event_name = "N/A"
-                task_name = f"任務ID={self.task_id}"
-                event_obj = self.bot.events.get(self.event_code)
-                if event_obj:
-                    event_name = event_obj.get("event_name", "N/A")
-                    for t in event_obj.get("tasks", []):
-                        if t["task_id"] == self.task_id:
-                            task_name = f"{t.get('task_name','無任務名稱')} (ID={self.task_id})"
-                            if self.user_id not in t["checked_users"]:
-                                t["checked_users"].append(self.user_id)
-                            break
-
-                img["status"] = "approved"
-                img["approved_time"] = (datetime.utcnow() + timedelta(hours=8)).isoformat()
-
-                try:
-                    result_msg = self.bot.add_event_points_internal(self.user_id, self.event_code, self.task_points)
-                except AttributeError:
-                    result_msg = "bot 未定義 add_event_points_internal"
-
-                await user.send(
-                    f"圖片 `{self.filename}` \n活動：{event_name} 任務：{task_name} \n審核已通過 +{self.task_points}點。"
-                )
-
-                await interaction.response.send_message(
-                    f"審核通過 `{self.filename}` (+{self.task_points}點)。\n({result_msg})", ephemeral=True
-                )
-
-                view: ReviewView = self.view  
-                await view.disable_review(interaction, f"{task_name} 審核：已通過(+{self.task_points}點)")
-                return
+        # 兩位審核者同時按下時，第二位會看到已審核過，不會重複加點
+        result = await self.bot.writer.run(self.approve)
+        if result is None:
+            await interaction.response.send_message("此圖片已審核過或不存在。", ephemeral=True)
+            return
+        user_id, filename, event_name, task_name, task_points, result_msg = result
+
+        self.bot.notify_user(
+            user_id,
+            f"圖片 `{filename}` \n活動：{event_name} 任務：{task_name} \n審核已通過 +{task_points}點。"
+        )
+
+        await interaction.response.send_message(
+            f"審核通過 `{filename}` (+{task_points}點)。\n({result_msg})", ephemeral=True
+        )
+
+        view: ReviewView = self.view
+        await view.disable_review(interaction, filename, f"{task_name} 審核：已通過(+{task_points}點)")
 
 class RejectButton(discord.ui.Button):
-    def __init__(self, bot: commands.Bot, user_id: int, filename: str, event_code: str, task_id: int):
-        super().__init__(style=discord.ButtonStyle.danger, label="拒絕")
+    def __init__(self, bot: commands.Bot, image_id: str):
+        super().__init__(style=discord.ButtonStyle.danger, label="拒絕", custom_id=f"review:reject:{image_id}")
         self.bot = bot
-        self.user_id = user_id
-        self.filename = filename
-        self.event_code = event_code
-        self.task_id = task_id
-
+        self.image_id = image_id
+
+    def reject(self):
+        """在寫入者執行緒中執行；已審核過則回傳 None。"""
+        found = self.bot.store.find_image(self.image_id)
+        if not found:
+            return None
+        user_id, seq, img = found
+        _, event_name, task_name = review_names(self.bot, img)
+        img["status"] = "rejected"
+        img["rejected_time"] = (datetime.utcnow() + timedelta(hours=8)).isoformat()
+        self.bot.store.update_image(user_id, seq, img)
+        return user_id, img["filename"], event_name, task_name
+
+    @timed(CALLBACK_SECONDS, callback="reject_button")
     async def callback(self, interaction: discord.Interaction):
-        data = self.bot.user_images.get(self.user_id, [])
-        for img in data:
-            if (
-                img["filename"] == self.filename
-                and img.get("task_id") == self.task_id
-                and img["status"] == "pending"
-            ):
-                user = self.bot.get_user(self.user_id) or await self.bot.fetch_user(self.user_id)
-                if not user:
-                    return
-
-                event_name = "N/A"
-                task_name = f"任務ID={self.task_id}"
-                event_obj = self.bot.events.get(self.event_code)
-                if event_obj:
-                    event_name = event_obj.get("event_name", "N/A")
-                    for t in event_obj.get("tasks", []):
-                        if t["task_id"] == self.task_id:
-                            task_name = f"{t.get('task_name','無任務名稱')} (ID={self.task_id})"
-                            break
-                img["status"] = "rejected"
-                img["rejected_time"] = (datetime.utcnow() + timedelta(hours=8)).isoformat()
-
-                await user.send(
-                    f"你的圖片 `{self.filename}`審核未通過，請重新上傳。\n活動：{event_name} 任務：{task_name}"
-                )
-
-                await interaction.response.send_message(
-                    f"已拒絕 `{self.filename}` (任務名稱：{task_name})", ephemeral=True
-                )
-
-                view: ReviewView = self.view  
-                await view.disable_review(interaction, f"{task_name} 審核：已拒絕")
-                return
+        result = await self.bot.writer.run(self.reject)
+        if result is None:
+            await interaction.response.send_message("此圖片已審核過或不存在。", ephemeral=True)
+            return
+        user_id, filename, event_name, task_name = result
+
+        self.bot.notify_user(
+            user_id,
+            f"你的圖片 `{filename}`審核未通過，請重新上傳。\n活動：{event_name} 任務：{task_name}"
+        )
+
+        await interaction.response.send_message(
+            f"已拒絕 `{filename}` (任務名稱：{task_name})", ephemeral=True
+        )
+
+        view: ReviewView = self.view
+        await view.disable_review(interaction, filename, f"{task_name} 審核：已拒絕")
 
 class ReviewView(View):
-    def __init__(self, bot: commands.Bot, user_id: int, filename: str, event_code: str, task_id: int):
+    """
+    單張圖片的審核按鈕。timeout=None 且每個按鈕都有 custom_id，
+    啟動時 ImageReviewCog.cog_load 會為所有待審核圖片重新 bot.add_view。
+    """
+    def __init__(self, bot: commands.Bot, image_id: str, image: dict):
         super().__init__(timeout=None)
         self.bot = bot
-        self.user_id = user_id
-        self.filename = filename
-        self.event_code = event_code
-        self.task_id = task_id
+        self.image_id = image_id
         task_points = 0
-        event_obj = self.bot.events.get(event_code)
-        if event_obj:
-            for t in event_obj.get("tasks", []):
-                if t["task_id"] == task_id:
-                    task_points = t.get("task_points", 0)
-                    break
+        event_obj = self.bot.store.get_event(image.get("event_code"))
+        the_task = event_obj.task(image.get("task_id")) if event_obj else None
+        if the_task:
+            task_points = the_task.get("task_points", 0)
 
-        self.add_item(ApproveButton(bot, user_id, filename, event_code, task_id, task_points))
-        self.add_item(RejectButton(bot, user_id, filename, event_code, task_id))
+        self.add_item(ApproveButton(bot, image_id, task_points))
+        self.add_item(RejectButton(bot, image_id))
 
-    async def disable_review(self, interaction: discord.Interaction, status: str):
+    async def disable_review(self, interaction: discord.Interaction, filename: str, status: str):
         for c in self.children:
             c.disabled = True
         await interaction.message.edit(
-            content=f"圖片 `{self.filename}` 審核狀態：{status}", 
+            content=f"圖片 `{filename}` 審核狀態：{status}", 
             view=self
         )
+        # 已審核完畢，不再接收這則訊息的互動
+        self.stop()
 
 class TaskSelectForImage(discord.ui.Select):
     def __init__(self, bot: commands.Bot, ctx: commands.Context, attachment: discord.Attachment, event_code: str):
@@ -140,7 +164,7 @@ class TaskSelectForImage(discord.ui.Select):
         self.ctx = ctx
         self.attachment = attachment
         self.event_code = event_code
-        event_obj = self.bot.events.get(self.event_code)
+        event_obj = self.bot.store.get_event(self.event_code)
         options = []
         if event_obj and "tasks" in event_obj:
             for t in event_obj["tasks"]:
@@ -157,6 +181,12 @@ class TaskSelectForImage(discord.ui.Select):
         )
         self.error_message = None
 
+    def is_own_resubmit(self, user_id: int, image: dict, task_id: int) -> bool:
+        """自己在同一任務已上傳過 (待審 / 已通過) 的相同圖片。"""
+        return (user_id == self.ctx.author.id and image.get("event_code") == self.event_code
+                and image.get("task_id") == task_id and image.get("status") in ("pending", "approved"))
+
+    @timed(CALLBACK_SECONDS, callback="task_select_for_image")
     async def callback(self, interaction: discord.Interaction):
         if self.error_message:
             await interaction.response.send_message(self.error_message, ephemeral=True)
@@ -170,61 +200,98 @@ class TaskSelectForImage(discord.ui.Select):
             await interaction.followup.send("找不到審核頻道，請通知管理員。", ephemeral=True)
             return
 
-        event_obj = self.bot.events.get(self.event_code)
+        event_obj = self.bot.store.get_event(self.event_code)
         if not event_obj:
             await interaction.followup.send("活動不存在，請通知管理員。", ephemeral=True)
             return
 
         task_name = "未知任務"
-        for t in event_obj["tasks"]:
-            if t["task_id"] == chosen_task_id:
-                if self.ctx.author.id in t["checked_users"]:
-                    await interaction.followup.send("你已通過此任務，無法重複上傳。", ephemeral=True)
-                    return
-                if self.ctx.author.id not in t["assigned_users"]:
-                    t["assigned_users"].append(self.ctx.author.id)
-                task_name = t.get("task_name", "無任務名稱")
-                break
+        t = event_obj.task(chosen_task_id)
+        if t:
+            if self.ctx.author.id in t["checked_users"]:
+                await interaction.followup.send("你已通過此任務，無法重複上傳。", ephemeral=True)
+                return
+            task_name = t.get("task_name", "無任務名稱")
 
         event_name = event_obj.get("event_name", "未知活動")
+        # 串流下載並檢查格式 / 大小，依內容 hash 保存 (同時下載數有上限，需要時會排隊)
+        try:
+            stored = await self.bot.uploads.ingest(self.attachment.url, self.attachment.size)
+        except UploadRejected as e:
+            await interaction.followup.send(str(e), ephemeral=True)
+            return
+
+        # 相同內容的圖片：提示審核者 (自己在同一任務已上傳過的，於 submit() 中拒絕)
+        duplicate_notes = []
+        for dup_user_id, dup in self.bot.store.images_with_hash(stored.content_hash):
+            if not self.is_own_resubmit(dup_user_id, dup, chosen_task_id):
+                duplicate_notes.append(f"{describe_image(dup_user_id, dup)} (內容完全相同)")
+
+        # 感知 hash 相近的圖片 (重新截圖 / 壓縮 / 縮放過的同一張圖)，跨玩家與活動提示審核者
+        if stored.phash:
+            for distance, sim_user_id, sim in self.bot.store.similar_images(stored.phash, PHASH_MAX_DISTANCE):
+                if sim.get("content_hash") != stored.content_hash:
+                    duplicate_notes.append(f"{describe_image(sim_user_id, sim)} (相似度 {64 - distance}/64)")
+
+        image_id = new_image_id()
         image_data = {
+            "image_id": image_id,
             "filename": self.attachment.filename,
             "user_id": self.ctx.author.id,
             "username": self.ctx.author.name,
             "status": "pending",
             "event_code": self.event_code,
             "task_id": chosen_task_id,
-            "upload_time": (datetime.utcnow() + timedelta(hours=8)).isoformat()
+            "upload_time": (datetime.utcnow() + timedelta(hours=8)).isoformat(),
+            "content_hash": stored.content_hash,
+            "content_type": stored.content_type,
+            "size": stored.size
         }
-        self.bot.user_images.setdefault(self.ctx.author.id, []).append(image_data)
-
-        try:
-            file = await self.attachment.to_file()
-            view = ReviewView(
-                self.bot,
-                self.ctx.author.id,
-                self.attachment.filename,
-                self.event_code,
-                chosen_task_id
-            )
-            await channel.send(
-                content=(
-                    f"使用者 <@{self.ctx.author.id}> 上傳圖片：`{self.attachment.filename}`\n"
-                    f"活動：{event_name} (編號={self.event_code})\n"
-                    f"任務：{task_name} (ID={chosen_task_id}) 等待審核..."
-                ),
-                file=file,
-                view=view
-            )
-            await interaction.followup.send(
-                f"圖片 `{self.attachment.filename}` 已送出審核！(提交的任務：{task_name})", 
-                ephemeral=True
-            )
-        except Exception as e:
-            print(f"Error in TaskSelectForImage.callback: {e}")
-            await interaction.followup.send("上傳至審核頻道失敗，請通知管理員排除。", ephemeral=True)
+        if stored.phash:
+            image_data["phash"] = stored.phash
+
+        def submit():
+            # 下載期間資料可能已變動，在寫入者中重新讀取活動與圖片清單再寫入
+            for dup_user_id, dup in self.bot.store.images_with_hash(stored.content_hash):
+                if self.is_own_resubmit(dup_user_id, dup, chosen_task_id):
+                    return "你已在此任務上傳過相同的圖片。"
+            event_obj = self.bot.store.get_event(self.event_code)
+            if not event_obj:
+                return "活動不存在，請通知管理員。"
+            t = event_obj.task(chosen_task_id)
+            if t and self.ctx.author.id not in t["assigned_users"]:
+                t["assigned_users"].append(self.ctx.author.id)
+                self.bot.store.save_event(event_obj)
+            user_images = self.bot.store.get_images(self.ctx.author.id)
+            user_images.append(image_data)
+            self.bot.store.save_images(self.ctx.author.id, user_images)
+            return None
+
+        error = await self.bot.writer.run(submit)
+        if error:
+            await interaction.followup.send(error, ephemeral=True)
             return
 
+        content = (
+            f"使用者 <@{self.ctx.author.id}> 上傳圖片：`{self.attachment.filename}`\n"
+            f"活動：{event_name} (編號={self.event_code})\n"
+            f"任務：{task_name} (ID={chosen_task_id}) 等待審核..."
+        )
+        if duplicate_notes:
+            content += "\n注意：與先前上傳的圖片相同或相似：\n" + "\n".join(duplicate_notes[:5])
+            if len(duplicate_notes) > 5:
+                content += f"\n...等共 {len(duplicate_notes)} 張"
+        self.bot.outbox.put("review_post", {
+            "image_id": image_id,
+            "image_path": stored.path,
+            "upload_name": os.path.splitext(self.attachment.filename)[0] + stored.ext,
+            "content": content[:2000]
+        }, route=f"channel:{TARGET_CHANNEL_ID}")
+        await interaction.followup.send(
+            f"圖片 `{self.attachment.filename}` 已送出審核！(提交的任務：{task_name})", 
+            ephemeral=True
+        )
+
         for c in self.view.children:
             c.disabled = True
         await interaction.edit_original_response(view=self.view)
@@ -238,6 +305,40 @@ class ImageReviewCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
+    async def cog_load(self):
+        self.bot.outbox.register("review_post", self.post_review)
+        # 重新註冊所有待審核圖片的按鈕，重啟前送出的審核訊息仍可操作
+        count = 0
+        for image_id, _, image in self.bot.store.iter_pending_images():
+            self.bot.add_view(ReviewView(self.bot, image_id, image))
+            count += 1
+        log.info("已重新註冊 %d 個待審核圖片的審核按鈕", count)
+
+    async def post_review(self, payload: dict):
+        """outbox handler：把保存的圖片連同審核按鈕送到審核頻道。"""
+        found = self.bot.store.find_image(payload["image_id"])
+        if not found:
+            # 送出前已在後台審核完畢
+            return
+        channel = self.bot.get_channel(TARGET_CHANNEL_ID) or await self.bot.fetch_channel(TARGET_CHANNEL_ID)
+        _, _, image = found
+        kwargs = {"content": payload["content"], "view": ReviewView(self.bot, payload["image_id"], image)}
+        if os.path.exists(payload["image_path"]):
+            kwargs["file"] = discord.File(payload["image_path"], filename=payload["upload_name"])
+        else:
+            kwargs["content"] += "\n(圖片檔已遺失，請聯絡使用者重新上傳)"
+        review_msg = await channel.send(**kwargs)
+        # 記下審核訊息，批次審核時可更新這則訊息並附上連結
+        def record_message():
+            found = self.bot.store.find_image(payload["image_id"])
+            if found:
+                user_id, seq, img = found
+                img["review_message_id"] = review_msg.id
+                img["review_jump_url"] = review_msg.jump_url
+                self.bot.store.update_image(user_id, seq, img)
+
+        await self.bot.writer.run(record_message)
+
     @commands.command(name="上傳圖片")
     async def upload_image(self, ctx: commands.Context, event_code: str = None):
         if not isinstance(ctx.channel, discord.DMChannel):
@@ -248,7 +349,7 @@ class ImageReviewCog(commands.Cog):
             await ctx.send("請輸入活動編號，如: RA 上傳圖片 RAE001")
             return
 
-        user_data = self.bot.gamers.get(ctx.author.id)
+        user_data = self.bot.store.get_gamer(ctx.author.id)
         if not user_data:
             await ctx.send("你尚未綁定卡片或參加活動。")
             return
@@ -258,12 +359,13 @@ class ImageReviewCog(commands.Cog):
             await ctx.send(f"你尚未參加活動 {event_code}，無法上傳圖片。")
             return
 
-        if event_code not in self.bot.events:
+        event_obj = self.bot.store.get_event(event_code)
+        if event_obj is None:
             await ctx.send(f"活動 {event_code} 不存在。")
             return
 
         try:
-            end_date = datetime.strptime(self.bot.events[event_code]["event_end_date"], "%Y-%m-%d").date()
+            end_date = datetime.strptime(event_obj["event_end_date"], "%Y-%m-%d").date()
             today_date = (datetime.utcnow() + timedelta(hours=8)).date()
             if today_date > end_date:
                 await ctx.send(f"活動 {event_code} 已過期，無法上傳圖片。")
@@ -277,11 +379,13 @@ class ImageReviewCog(commands.Cog):
             return
 
         attachment = ctx.message.attachments[0]
-        if not attachment.filename.lower().endswith((".png", ".jpg", ".jpeg", ".gif")):
-            await ctx.send("限圖片檔 (.png/.jpg/.jpeg/.gif)")
+        # 實際格式在下載時依檔案內容判斷 (見 uploads.UploadPipeline)，這裡先擋掉過大的檔案
+        try:
+            self.bot.uploads.check_size(attachment.size)
+        except UploadRejected as e:
+            await ctx.send(str(e))
             return
 
-        event_obj = self.bot.events[event_code]
         if not event_obj.get("tasks"):
             await ctx.send("該活動尚未有任務配置或任務為空。")
             return
@@ -293,4 +397,4 @@ class ImageReviewCog(commands.Cog):
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(ImageReviewCog(bot))
-    print("ImageReviewCog 已成功加載。")
\ No newline at end of file
+    log.info("ImageReviewCog 已成功加載。")
\ No newline at end of file
@@ -1,10 +1,16 @@
 import discord
+import logging
 from discord.ext import commands
 from discord.ui import Select, View, Modal, TextInput
 from cogs.card_binding import CardBindingCog
-from main import not_blocked, save_data, record_api
+from main import not_blocked, record_api
+from metrics import CALLBACK_SECONDS, timed
+from storage import new_gamer
+from storage.timeline import describe
 from datetime import datetime, timedelta
 
+log = logging.getLogger(__name__)
+
 class CardBindModal(Modal):
     def __init__(self, cog: CardBindingCog):
         super().__init__(title="綁定卡號")
@@ -46,7 +52,7 @@ class JoinedEventsSelect(discord.ui.Select):
 
         options = []
         for ev_code in joined_events:
-            event_obj = bot.events.get(ev_code, {})
+            event_obj = bot.store.get_event(ev_code) or {}
             event_name = event_obj.get("event_name", "未命名活動")
             options.append(
                 discord.SelectOption(
@@ -64,14 +70,14 @@ class JoinedEventsSelect(discord.ui.Select):
 
     async def callback(self, interaction: discord.Interaction):
         ev_code = self.values[0]
-        event_obj = self.bot.events.get(ev_code, {})
+        event_obj = self.bot.store.get_event(ev_code) or {}
         event_name = event_obj.get("event_name", "未命名活動")
         event_desc = event_obj.get("event_description", "無描述")
         event_tasks = event_obj.get("tasks", [])
         max_points = event_obj.get("max_points", 0)
         event_start_date = event_obj.get("event_start_date", "未知開始日期")
         event_end_date = event_obj.get("event_end_date", "未知結束日期")
-        user_data = self.bot.gamers.get(self.user_id, {})
+        user_data = self.bot.store.get_gamer(self.user_id) or {}
         user_points = user_data.get("events_points", {}).get(ev_code, 0)
 
         tasks_info = ""
@@ -107,11 +113,11 @@ class ViewPrizeEventSelect(discord.ui.Select):
         self.bot = bot
         self.user = user
 
-        user_data = bot.gamers.get(user.id, {})
+        user_data = bot.store.get_gamer(user.id) or {}
         joined_events = user_data.get("joined_events", [])
         options = []
         for ev_code in joined_events:
-            event_obj = bot.events.get(ev_code, {})
+            event_obj = bot.store.get_event(ev_code) or {}
             # 僅顯示有prizes的活動 (如果沒有prizes就不列出)
             if "prizes" in event_obj and event_obj["prizes"]:
                 event_name = event_obj.get("event_name", "未命名活動")
@@ -134,13 +140,12 @@ class ViewPrizeEventSelect(discord.ui.Select):
             return
 
         event_code = self.values[0]
-        user_data = self.bot.gamers.get(self.user.id, {})
-        event_obj = self.bot.events.get(event_code, {})
+        user_data = self.bot.store.get_gamer(self.user.id) or {}
+        event_obj = self.bot.store.get_event(event_code) or {}
         prizes = event_obj.get("prizes", [])
 
-        # 準備一個「已兌換清單」(若尚未有redeemed_prizes，就初始化)
-        redeemed_map = user_data.setdefault("redeemed_prizes", {})
-        user_redeemed_list = redeemed_map.setdefault(event_code, [])
+        # 「已兌換清單」：只讀取，不可在 store 中的玩家資料上補欄位 (不在寫入者執行緒內)
+        user_redeemed_list = user_data.get("redeemed_prizes", {}).get(event_code, [])
 
         # 生成可視化訊息
         lines = []
@@ -172,91 +177,44 @@ class SelectionMenuSelect(discord.ui.Select):
         self.user = user
         self.bot = cog.bot
 
-        user_data = self.bot.gamers.get(user.id)
-        has_card = (user_data and user_data.get("gamer_card_number"))
+        # 只看快取的功能旗標，不讀取點數紀錄 / 圖片清單，選單建立時間不隨紀錄數量增加
+        caps = self.bot.store.capabilities.get(user.id)
 
         options = []
-        if not user_data:
+        if not caps.exists:
             options.append(discord.SelectOption(label="綁定卡號", description="請輸入卡號綁定", value="bind_card"))
             options.append(discord.SelectOption(label="略過綁卡", description="可略過綁卡，但會限制部分功能", value="skip_card"))
-
-            if self.has_any_timestamp(user.id):
-                options.append(discord.SelectOption(label="查詢歷史紀錄", description="最多可以查詢最後10筆資料", value="query_timestamps"))
-
         else:
-            if not has_card:
+            if not caps.has_card:
                 options.append(discord.SelectOption(label="綁定卡號", description="請輸入卡號綁定", value="bind_card"))
                 options.append(discord.SelectOption(label="參加活動", description="請先確認活動編號再使用此功能", value="join_event"))
-                
-                joined = user_data.get("joined_events", [])
-                if joined:
-                    options.append(discord.SelectOption(label="已參加的活動", description="可查詢已參加的活動", value="check_joined_events"))
-                    options.append(discord.SelectOption(label="上傳圖片", description="請點選查詢指令", value="upload_pic"))
-                    if self.has_redeemable_event(joined):
-                        options.append(discord.SelectOption(label="查看獎品", value="view_prize_list"))
-
-                if self.has_any_timestamp(user.id):
-                    options.append(discord.SelectOption(label="查詢歷史紀錄", description="最多可以查詢最後10筆資料", value="query_timestamps"))
             else:
                 options.append(discord.SelectOption(label="參加活動", description="請先查詢活動編號再使用此功能", value="join_event"))
                 options.append(discord.SelectOption(label="查詢卡號", description="此指令僅提供查詢，若需修改請洽店員", value="query_card"))
 
-                joined = user_data.get("joined_events", [])
-                if joined:
-                    options.append(discord.SelectOption(label="已參加的活動", description="可查詢已參加的活動", value="check_joined_events"))
-                    options.append(discord.SelectOption(label="上傳圖片", description="請點選查詢指令", value="upload_pic"))
-                    if self.has_redeemable_event(joined):
-                        options.append(discord.SelectOption(label="查看獎品", value="view_prize_list"))
+            if caps.has_joined_events:
+                options.append(discord.SelectOption(label="已參加的活動", description="可查詢已參加的活動", value="check_joined_events"))
+                options.append(discord.SelectOption(label="上傳圖片", description="請點選查詢指令", value="upload_pic"))
+                if caps.has_redeemable_event:
+                    options.append(discord.SelectOption(label="查看獎品", value="view_prize_list"))
 
-                if self.has_any_timestamp(user.id):
-                    options.append(discord.SelectOption(label="查詢歷史紀錄", description="最多可以查詢最後10筆資料", value="query_timestamps"))
+        if caps.has_history:
+            options.append(discord.SelectOption(label="查詢歷史紀錄", description="最多可以查詢最後10筆資料", value="query_timestamps"))
 
         super().__init__(placeholder="選擇功能", min_values=1, max_values=1, options=options)
 
-    def has_any_timestamp(self, user_id: int) -> bool:
-        user_data = self.bot.gamers.get(user_id, {})
-        points_history = user_data.get("points_history", [])
-        if points_history:
-            return True
-
-        joined_map = user_data.get("joined_event_timestamps", {})
-        if joined_map:
-            return True
-
-        image_list = self.bot.user_images.get(user_id, [])
-        for img in image_list:
-            if img.get("upload_time") or img.get("approved_time") or img.get("rejected_time"):
-                return True
-            
-        return False
-
-    def has_redeemable_event(self, joined_events: list) -> bool:
-        for ev_code in joined_events:
-            event_obj = self.bot.events.get(ev_code, {})
-            if "prizes" in event_obj and event_obj["prizes"]:
-                return True
-        return False
-
+    @timed(CALLBACK_SECONDS, callback="selection_menu")
     async def callback(self, interaction: discord.Interaction):
         choice = self.values[0]
         if choice == "bind_card":
             modal = CardBindModal(self.cog)
             await interaction.response.send_modal(modal)
         elif choice == "skip_card":
-            if self.user.id not in self.bot.gamers:
-                self.bot.gamers[self.user.id] = {
-                    "gamer_id": self.user.id,
-                    "gamer_card_number": None,
-                    "gamer_is_blocked": False,
-                    "gamer_bind_gamepass": None,
-                    "joined_events": [],
-                    "history_event_list": [],
-                    "history_event_pts_list": [],
-                    "events_points": {},
-                    "joined_event_timestamps": {},
-                    "redeemed_prizes": {}  
-                }
-                save_data()
+            def create_gamer():
+                if not self.bot.store.has_gamer(self.user.id):
+                    self.bot.store.save_gamer(new_gamer(self.user.id))
+
+            await self.bot.writer.run(create_gamer)
             await interaction.response.send_message("已略過綁卡，你可以隨時使用「綁定卡號」功能綁定。", ephemeral=True)
             await self.cog.update_menu(interaction.user)
         elif choice == "join_event":
@@ -271,7 +229,7 @@ class SelectionMenuSelect(discord.ui.Select):
                 ephemeral=True
             )
         elif choice == "check_joined_events":
-            user_data = self.bot.gamers.get(self.user.id, {})
+            user_data = self.bot.store.get_gamer(self.user.id) or {}
             joined = user_data.get("joined_events", [])
             if not joined:
                 await interaction.response.send_message("你目前尚未參加任何活動。", ephemeral=True)
@@ -279,97 +237,14 @@ class SelectionMenuSelect(discord.ui.Select):
             view = JoinedEventsView(self.bot, joined, self.user.id)
             await interaction.response.send_message("請選擇要查詢的活動：", view=view, ephemeral=True)
         elif choice == "query_timestamps":
-            user_data = self.bot.gamers.get(self.user.id, {})
-            points_history = user_data.get("points_history", [])
-            joined_map = user_data.get("joined_event_timestamps", {})
-            user_images = self.bot.user_images.get(self.user.id, [])
-
-            all_records = []
-            for item in points_history:
-                stamp = item.get("timestamp")
-                if not stamp:
-                    continue
-                record_type = item.get("type","?")
-                pts = item.get("points",0)
-                ev_code = item.get("event_code","")
-
-                # --- 新增 admin_redeem 顯示 ---
-                if record_type == "admin_redeem":
-                    # 後台兌換 => 撈出 prize_name
-                    event_obj = self.bot.events.get(ev_code, {})
-                    prize_name = "?"
-                    prize_id = item.get("prize_id")
-                    for p in event_obj.get("prizes", []):
-                        if p["prize_id"] == prize_id:
-                            prize_name = p["prize_name"]
-                            break
-                    detail = f"獎品兌換 (活動：{ev_code}, 獎品={prize_name})"
-
-                elif record_type == "global":
-                    detail = f"全域加點 +{pts}"
-                elif record_type == "event":
-                    detail = f"活動({ev_code})加點 +{pts}"
-                elif record_type == "api":
-                    detail = f"API加點 +{pts}"
-                elif record_type == "redeem":
-                    # 舊邏輯
-                    detail = f"兌換獎品 `{item.get('prize_name','?')}` {pts} 點"  # pts為負值
-                else:
-                    detail = f"其他加點/動作 {pts}"
-
-                all_records.append({"timestamp": stamp, "detail": detail})
-
-            for ev_code, tstamp in joined_map.items():
-                all_records.append({
-                    "timestamp": tstamp,
-                    "detail": f"加入活動 {ev_code}"
-                })
-
-            for img in user_images:
-                event_code = img["event_code"]
-                task_id = img["task_id"]
-                event_obj = self.bot.events.get(event_code, {})
-                tasks = event_obj.get("tasks", [])
-                task_obj = None
-                for t in tasks:
-                    if t.get("task_id") == task_id:
-                        task_obj = t
-                        break
-                task_name = task_obj.get("task_name", "未知任務") if task_obj else "未知任務"
-
-                if "upload_time" in img:
-                    all_records.append({
-                        "timestamp": img["upload_time"],
-                        "detail": f"上傳圖片 `{img['filename']}` (活動={img['event_code']}, 任務={task_name})"
-                    })
-                if "approved_time" in img:
-                    all_records.append({
-                        "timestamp": img["approved_time"],
-                        "detail": f"圖片 `{img['filename']}` 審核通過 (活動={img['event_code']}, 任務={task_name})"
-                    })
-                if "rejected_time" in img:
-                    all_records.append({
-                        "timestamp": img["rejected_time"],
-                        "detail": f"圖片 `{img['filename']}` 審核拒絕 (活動={img['event_code']}, 任務={task_name})"
-                    })
-
-            if not all_records:
+            recent_10 = self.bot.store.timelines.last(self.user.id, 10)
+            if not recent_10:
                 await interaction.response.send_message("尚無任何時間戳記紀錄。", ephemeral=True)
                 return
 
-            def parse_iso(s):
-                try:
-                    return datetime.fromisoformat(s)
-                except:
-                    return None
-
-            valid_records = [r for r in all_records if parse_iso(r["timestamp"])]
-            valid_records.sort(key=lambda x: parse_iso(x["timestamp"]))
-
-            recent_10 = valid_records[-10:]
             lines = []
-            for r in recent_10:
-                lines.append(f"[{r['timestamp']}] {r['detail']}")
+            for entry in recent_10:
+                lines.append(f"[{entry['timestamp']}] {describe(entry, self.bot.store)}")
 
             msg = "**以下為最近10筆時間戳記紀錄：**\n" + "\n".join(lines)
             await interaction.response.send_message(msg, ephemeral=True)
@@ -407,4 +282,4 @@ class SelectionMenuCog(commands.Cog):
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(SelectionMenuCog(bot))
-    print("SelectionMenuCog 已成功加載。")
\ No newline at end of file
+    log.info("SelectionMenuCog 已成功加載。")
\ No newline at end of file
@@ -0,0 +1,122 @@
+import logging
+import os
+import re
+import threading
+import uuid
+from typing import Optional
+
+try:
+    from PIL import Image
+except ImportError:  # 沒有安裝 Pillow 時不產生縮圖 / 不計算感知 hash
+    Image = None
+
+EXTENSIONS = {"image/png": ".png", "image/jpeg": ".jpg", "image/gif": ".gif"}
+CONTENT_TYPES = {ext: mime for mime, ext in EXTENSIONS.items()}
+THUMB_SIZES = (128, 256, 512)
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+log = logging.getLogger(__name__)
+
+
+def perceptual_hash(path: str) -> Optional[str]:
+    """
+    64-bit dHash (16 碼 hex)：縮成 9x8 灰階後比較每列相鄰像素的明暗。
+    重新壓縮、縮放、輕微調色的同一張截圖 hash 幾乎相同，可用 Hamming 距離判斷相似度。
+    無法解碼或沒有 Pillow 時為 None。
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as img:
+            img.draft("L", (64, 64))  # JPEG 直接以低解析度解碼，省時間與記憶體
+            pixels = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    except Exception as e:
+        log.warning("無法計算 %s 的感知 hash: %r", path, e)
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{value:016x}"
+
+
+class ImageArchive:
+    """
+    上傳圖片的本機保存區，以內容 sha256 定址：
+    - 原圖：root/<hash 前兩碼>/<hash><副檔名>，相同內容只存一份，寫入後不再變動
+    - 縮圖：root/thumbs/<邊長>/<hash 前兩碼>/<hash>.jpg，第一次被請求時才產生並保存
+    """
+
+    def __init__(self, root: str, thumb_workers: int = 2):
+        self.root = root
+        # 同時產生縮圖的數量上限 (頁面一次載入大量縮圖時避免同時解碼太多張原圖)
+        self._thumb_slots = threading.Semaphore(thumb_workers)
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, content_hash: str, content_type: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash + EXTENSIONS[content_type])
+
+    def put(self, src_path: str, content_hash: str, content_type: str) -> str:
+        """把下載完成的暫存檔移入保存區 (已有相同內容則刪除暫存檔)，回傳保存路徑。"""
+        path = self.path_for(content_hash, content_type)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(src_path)
+        else:
+            os.replace(src_path, path)
+        return path
+
+    def find(self, content_hash: str) -> Optional[tuple]:
+        """(路徑, content type)；hash 格式不對或檔案不存在時為 None。"""
+        if not _HASH_RE.match(content_hash):
+            return None
+        for content_type in EXTENSIONS:
+            path = self.path_for(content_hash, content_type)
+            if os.path.exists(path):
+                return path, content_type
+        return None
+
+    def thumbnail(self, content_hash: str, size: int) -> Optional[tuple]:
+        """
+        (縮圖路徑, "image/jpeg")；尚未產生時先產生。
+        原圖不存在時為 None；沒有 Pillow 或原圖無法解碼時退回原圖。
+        """
+        found = self.find(content_hash)
+        if found is None:
+            return None
+        path = os.path.join(self.root, "thumbs", str(size), content_hash[:2], content_hash + ".jpg")
+        if os.path.exists(path):
+            return path, "image/jpeg"
+        if Image is None:
+            return found
+        with self._thumb_slots:
+            if not os.path.exists(path):
+                if not self._make_thumbnail(found[0], path, size):
+                    return found
+        return path, "image/jpeg"
+
+    @staticmethod
+    def _make_thumbnail(src: str, dest: str, size: int) -> bool:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp_path = f"{dest}.{uuid.uuid4().hex}.tmp"
+        try:
+            with Image.open(src) as img:
+                img.draft("RGB", (size, size))
+                img.thumbnail((size, size))
+                if img.mode in ("RGBA", "LA", "P"):
+                    # 透明部分以白色底呈現
+                    rgba = img.convert("RGBA")
+                    thumb = Image.new("RGB", rgba.size, (255, 255, 255))
+                    thumb.paste(rgba, mask=rgba.getchannel("A"))
+                else:
+                    thumb = img.convert("RGB")
+                thumb.save(tmp_path, "JPEG", quality=80, optimize=True)
+            os.replace(tmp_path, dest)
+            return True
+        except Exception as e:
+            log.warning("無法產生 %s 的縮圖: %r", src, e)
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            return False
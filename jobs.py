@@ -0,0 +1,121 @@
+import asyncio
+import inspect
+import itertools
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+log = logging.getLogger(__name__)
+
+
+def _now() -> str:
+    return (datetime.utcnow() + timedelta(hours=8)).isoformat()
+
+
+class Job:
+    """一個在背景逐筆處理的工作，可查詢進度、可取消。"""
+
+    def __init__(self, job_id: int, kind: str, target: str, total: int):
+        self.job_id = job_id
+        self.kind = kind
+        self.target = target
+        self.total = total
+        self.done = 0
+        self.changed = 0
+        self.status = "pending"
+        self.error = None
+        self.started_at = _now()
+        self.finished_at = None
+        self.task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "target": self.target,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "changed": self.changed,
+            "progress": round(self.done / self.total, 4) if self.total else 1.0,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobManager:
+    """
+    在 event loop 上執行背景工作：每處理 chunk_size 筆就讓出控制權，
+    Discord 互動與後台請求不會被長時間卡住。
+    """
+
+    def __init__(self, keep: int = 100, chunk_size: int = 50):
+        self.keep = keep
+        self.chunk_size = chunk_size
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        # 執行中的 task (已被 keep 擠出列表的工作也在內)，關機時一併取消
+        self._tasks = set()
+
+    def start(self, kind: str, target: str, items: Iterable, step: Callable[[object], bool]) -> Job:
+        """
+        對 items 逐筆呼叫 step(item)，step 回傳 True (或回傳結果為 True 的 awaitable) 代表該筆有變動。
+        需在 event loop 內呼叫。
+        """
+        items = list(items)
+        job = Job(next(self._ids), kind, target, len(items))
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.keep:
+            self._jobs.popitem(last=False)
+        job.task = asyncio.get_running_loop().create_task(self._run(job, items, step))
+        self._tasks.add(job.task)
+        job.task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def stop(self):
+        """取消所有執行中的工作並等待結束，供關機時呼叫 (取消的工作可於重啟後再次執行)。"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job: Job, items: list, step):
+        job.status = "running"
+        try:
+            for item in items:
+                changed = step(item)
+                if inspect.isawaitable(changed):
+                    changed = await changed
+                if changed:
+                    job.changed += 1
+                job.done += 1
+                if job.done % self.chunk_size == 0:
+                    await asyncio.sleep(0)
+            job.status = "done"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            log.exception("背景工作 %s(%s) 失敗", job.kind, job.target)
+        finally:
+            job.finished_at = _now()
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> list:
+        return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    def cancel(self, job_id: int) -> bool:
+        job = self._jobs.get(job_id)
+        if not job or job.status not in ("pending", "running"):
+            return False
+        if job.status == "pending":
+            # 尚未開始執行的 task 被取消時不會進入 _run，直接標記
+            job.status = "cancelled"
+            job.finished_at = _now()
+        job.task.cancel()
+        return True
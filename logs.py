@@ -0,0 +1,157 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """佇列已滿時丟棄紀錄並計數；呼叫端 (event loop / 寫入者執行緒) 不會被日誌的 I/O 卡住。"""
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    """時間 等級 logger: 訊息 key=value ... (extra={"fields": {...}} 的欄位接在訊息後)"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """每筆一行 JSON：ts / level / logger / msg，再加上 fields 中的欄位。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None,
+                  queue_size: int = 10000) -> DroppingQueueHandler:
+    """
+    設定 root logger：紀錄先放入佇列，由背景執行緒寫到 stdout。
+    level 預設讀 LOG_LEVEL (INFO；DEBUG 時才輸出各處的除錯訊息)，
+    fmt 預設讀 LOG_FORMAT (text 或 json)。程式結束時會先寫完佇列中剩餘的紀錄。
+    回傳放入 root logger 的 handler (dropped 為佇列已滿而丟棄的筆數)。
+    """
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "text")).lower()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    handler = DroppingQueueHandler(queue.Queue(queue_size))
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return handler
+
+
+class AuditLog:
+    """
+    點數 / 兌換 / 封鎖等操作的稽核紀錄：每筆一行 JSON，只附加寫入 path；
+    超過 max_bytes 時輪替為 path.1 ... path.<backups>，最舊的捨棄。
+    寫入經由佇列交給背景執行緒，呼叫端不等待磁碟 I/O (佇列不設上限，稽核紀錄不丟棄)；
+    query() 依玩家 / 活動 / 動作由新到舊查詢 (尚在佇列中的紀錄查不到)。
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        self.path = path
+        self.backups = backups
+        self._handler = logging.handlers.QueueHandler(queue.Queue())
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._file = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True
+        )
+        self._file.setFormatter(logging.Formatter("%(message)s"))
+        self._listener = logging.handlers.QueueListener(self._handler.queue, self._file)
+        self._started = False
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    ###############################
+    # 啟動 / 停止
+    ###############################
+    def start(self):
+        if not self._started:
+            self._listener.start()
+            self._started = True
+
+    def stop(self):
+        """寫完佇列中的紀錄後停止。"""
+        if self._started:
+            self._listener.stop()
+            self._started = False
+        self._file.close()
+
+    ###############################
+    # 寫入 / 查詢
+    ###############################
+    def record(self, action: str, data: dict):
+        entry = {"ts": (datetime.utcnow() + timedelta(hours=8)).isoformat(), "action": action}
+        entry.update(data)
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            self.counts[action] += 1
+        self._handler.handle(logging.makeLogRecord({"msg": line, "levelno": logging.INFO, "levelname": "INFO"}))
+
+    def query(self, gamer_id: Optional[int] = None, event_code: Optional[str] = None,
+              action: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """由新到舊列出符合條件的紀錄 (從目前的檔案讀到最舊的輪替檔)，最多 limit 筆。"""
+        found = []
+        paths = [self.path] + [f"{self.path}.{i}" for i in range(1, self.backups + 1)]
+        for path in paths:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    lines = f.readlines()
+            except FileNotFoundError:
+                # 尚未建立，或剛好被輪替
+                continue
+            for line in reversed(lines):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 寫到一半的最後一行
+                    continue
+                if gamer_id is not None and entry.get("gamer_id") != gamer_id:
+                    continue
+                if event_code is not None and entry.get("event_code") != event_code:
+                    continue
+                if action is not None and entry.get("action") != action:
+                    continue
+                found.append(entry)
+                if len(found) >= limit:
+                    return found
+        return found
@@ -1,18 +1,27 @@
 import os
+import sys
 import json
 import asyncio
-import traceback
+import logging
 import re
 import time
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+from itertools import islice
 from typing import Optional, List
 
+# 啟動階段計時從這裡開始 (含以下第三方套件的 import)
+IMPORT_STARTED = time.perf_counter()
+
+# python main.py 執行時模組名稱是 __main__；讓 cogs 的 `from main import ...` 沿用這個模組，
+# 不會再執行一次 main.py (重複建立 bot / app、重新讀取 .env)
+if __name__ == "__main__":
+    sys.modules.setdefault("main", sys.modules[__name__])
+
 import uvicorn
-import aiohttp
 
-from fastapi import FastAPI, HTTPException, Request, Body
-from fastapi.responses import HTMLResponse, StreamingResponse, RedirectResponse
+from fastapi import FastAPI, HTTPException, Request, Body, Query
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
 
 from pydantic import BaseModel, field_validator
@@ -22,6 +31,22 @@ from discord.ext.commands import CheckFailure
 import discord
 from dotenv import load_dotenv
 
+from storage import open_store, new_gamer, new_event, credit_points, total_points, DuplicateCardError, StateWriter
+from storage.base import GAMER_SORTS
+from storage.event_refs import strip_event_refs
+from storage.journal import JSON_BACKEND
+from storage.timeline import describe
+from jobs import JobManager
+from notify import Outbox
+from uploads import UploadPipeline
+from image_archive import ImageArchive, THUMB_SIZES
+from render_cache import RenderCache
+from supervisor import BotSupervisor, LoopLagMonitor
+from logs import setup_logging, AuditLog
+from startup import StartupPhases, ReadinessGate
+from metrics import (REGISTRY, HTTP_SECONDS, PERSIST_SECONDS, RENDER_SECONDS, COMMAND_SECONDS,
+                     HttpMetricsMiddleware, timed)
+
 ###############################
 # 載入環境變數
 ###############################
@@ -29,6 +54,14 @@ load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
 if not TOKEN:
     raise ValueError("DISCORD_TOKEN 未設置")
+# 設為 0 時不連線 Discord，只提供網頁後台 (benchmark / 負載測試也以此執行)
+DISCORD_BOT_ENABLED = os.getenv("DISCORD_BOT_ENABLED", "1") != "0"
+
+###############################
+# 日誌：經由佇列寫到 stdout (LOG_LEVEL / LOG_FORMAT)，預設不輸出 DEBUG
+###############################
+log_handler = setup_logging()
+log = logging.getLogger("main")
 
 ###############################
 # Discord Bot 初始化
@@ -44,20 +77,59 @@ bot = commands.Bot(command_prefix="RA ", intents=intents)
 # 資料檔路徑
 ###############################
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_FILE_PATH = os.path.join(BASE_DIR, "data.json")
+# 所有執行期資料的目錄 (預設為專案目錄；benchmark 等可指向暫存目錄)
+DATA_DIR = os.getenv("DATA_DIR", BASE_DIR)
+DATA_FILE_PATH = os.path.join(DATA_DIR, "data.json")
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(DATA_DIR, "data.db"))
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+OUTBOX_PATH = os.path.join(DATA_DIR, "outbox.json")
+UPLOAD_SPOOL_DIR = os.path.join(DATA_DIR, "upload_spool")
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", os.path.join(DATA_DIR, "image_store"))
+AUDIT_LOG_PATH = os.getenv("AUDIT_LOG_PATH", os.path.join(DATA_DIR, "audit.log"))
 
 ###############################
-# 全域結構
+# Outbox：所有私訊 / 頻道訊息經由背景佇列送出 (限速、重試、重啟後續送)
 ###############################
-bot.user_images = {}
-bot.events = {}
-bot.gamers = {}
+outbox = Outbox(OUTBOX_PATH)
+bot.outbox = outbox
 
 ###############################
-# API 紀錄函式
+# 上傳圖片：串流下載、格式檢查、依內容 hash 保存到 archive
+###############################
+archive = ImageArchive(IMAGE_STORE_DIR)
+uploads = UploadPipeline(
+    UPLOAD_SPOOL_DIR,
+    archive,
+    max_bytes=int(os.getenv("MAX_UPLOAD_MB", "8")) * 1024 * 1024,
+    workers=int(os.getenv("UPLOAD_WORKERS", "3"))
+)
+bot.uploads = uploads
+
 ###############################
+# 全域結構 (由 load_data() 建立)
+###############################
+bot.store = None
+# 單一寫入者：FastAPI 與 cogs 對資料的修改都在此依序執行
+def observe_command(name: str, wait: float, run: float):
+    COMMAND_SECONDS.observe(wait, command=name, phase="wait")
+    COMMAND_SECONDS.observe(run, command=name, phase="run")
+
+writer = StateWriter(observe=observe_command)
+bot.writer = writer
+jobs = JobManager()
+
+###############################
+# 稽核紀錄：點數 / 兌換 / 封鎖等操作寫入可輪替的 audit.log，可依玩家或活動查詢
+###############################
+audit = AuditLog(
+    AUDIT_LOG_PATH,
+    max_bytes=int(os.getenv("AUDIT_LOG_MAX_MB", "10")) * 1024 * 1024,
+    backups=int(os.getenv("AUDIT_LOG_BACKUPS", "5"))
+)
+bot.audit = audit
+
 def record_api(action: str, data: dict):
-    print(f"[API紀錄] action={action}, data={data}")
+    audit.record(action, data)
 
 ###############################
 # 時間處理
@@ -69,73 +141,48 @@ def get_timestamp_now() -> str:
 ###############################
 # 確保玩家存在
 ###############################
-def ensure_gamer(gamer_id: int):
-    if gamer_id not in bot.gamers:
-        bot.gamers[gamer_id] = {
-            "gamer_id": gamer_id,
-            "gamer_card_number": None,
-            "gamer_is_blocked": False,
-            "gamer_bind_gamepass": None,
-            "joined_events": [],
-            "history_event_list": [],
-            "history_event_pts_list": [],
-            "events_points": {}
-        }
+def ensure_gamer(gamer_id: int) -> dict:
+    """取得玩家資料，不存在時回傳新的預設資料 (需自行 save_gamer)。"""
+    gamer = bot.store.get_gamer(gamer_id)
+    if gamer is None:
+        gamer = new_gamer(gamer_id)
+    return gamer
 
 ###############################
-# 讀寫 data.json
+# 載入 / 存檔
 ###############################
+def observe_persist(seconds: float):
+    # 背景存檔每寫出一批 (journal append + fsync) 記錄一次
+    PERSIST_SECONDS.observe(seconds, op="save")
+
+@timed(PERSIST_SECONDS, op="load")
 def load_data():
-    if os.path.exists(DATA_FILE_PATH):
-        try:
-            with open(DATA_FILE_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                bot.user_images = data.get("user_images", {})
-                bot.events = data.get("events", {})
-                raw_gamers = data.get("gamers", {})
-                # string->int
-                bot.gamers = {int(k): v for k, v in raw_gamers.items()}
-                print("DEBUG: 成功載入 JSON")
-        except Exception as e:
-            print(f"WARNING: 載入 JSON 失敗: {e}")
-    else:
-        print("DEBUG: data.json 不存在, 建立預設空資料")
-        data = {"user_images": {}, "events": {}, "gamers": {}}
-        try:
-            with open(DATA_FILE_PATH, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            print("DEBUG: 新的 data.json 已建立")
-        except Exception as e:
-            print(f"ERROR: 建立 data.json 失敗: {e}")
-        bot.user_images = {}
-        bot.events = {}
-        bot.gamers = {}
-
-def save_data():
-    print("DEBUG: save_data() 正在執行...")
-    data = {
-        "user_images": bot.user_images,
-        "events": bot.events,
-        "gamers": bot.gamers
-    }
     try:
-        with open(DATA_FILE_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-            f.flush()  # 強制 flush 資料到磁碟
-        print("DEBUG: 已將資料寫入 JSON")
-    except Exception as e:
-        print("ERROR: 寫入 JSON 檔案失敗!", e)
-        traceback.print_exc()
+        bot.store = open_store(
+            STORAGE_BACKEND,
+            DATA_FILE_PATH,
+            SQLITE_PATH,
+            compact_threshold=int(os.getenv("JOURNAL_COMPACT_THRESHOLD", "1000")),
+            debounce_seconds=float(os.getenv("PERSIST_DEBOUNCE_SECONDS", "0.5")),
+            observe_flush=observe_persist
+        )
+        bot.store.writer = writer
+        render_cache.bind(bot.store.versions)
+        log.info("成功載入資料 (backend=%s, json=%s)", STORAGE_BACKEND, JSON_BACKEND)
+    except Exception:
+        log.exception("載入資料失敗")
+        raise
 
 ###############################
 # Bot 加點邏輯
 ###############################
+@writer.command
 def add_points_internal(gamer_id: int, points: int) -> str:
-    ensure_gamer(gamer_id)
-    bot.gamers[gamer_id]["history_event_pts_list"].append(points)
-    bot.gamers[gamer_id].setdefault("points_history", [])
+    gamer = ensure_gamer(gamer_id)
+    credit_points(gamer, points)
+    gamer.setdefault("points_history", [])
     ts_str = get_timestamp_now()
-    bot.gamers[gamer_id]["points_history"].append({
+    gamer["points_history"].append({
         "type": "global",
         "points": points,
         "timestamp": ts_str
@@ -145,39 +192,69 @@ def add_points_internal(gamer_id: int, points: int) -> str:
         "points": points, 
         "timestamp": ts_str
     })
-    save_data()
+    bot.store.save_gamer(gamer)
     return f"已為玩家 {gamer_id} 新增 {points} 點數"
 
-def add_event_points_internal(gamer_id: int, event_code: str, points: int) -> str:
-    ensure_gamer(gamer_id)
-    bot.gamers[gamer_id]["history_event_pts_list"].append(points)
-    bot.gamers[gamer_id]["events_points"].setdefault(event_code, 0)
-    bot.gamers[gamer_id]["events_points"][event_code] += points
-    bot.gamers[gamer_id].setdefault("points_history", [])
-    ts_str = get_timestamp_now()
-    bot.gamers[gamer_id]["points_history"].append({
+def apply_event_points(gamer: dict, event_code: str, points: int, ts_str: str):
+    """活動加點並寫入 points_history (不存檔，由呼叫端 save_gamer)。"""
+    credit_points(gamer, points, event_code)
+    gamer.setdefault("points_history", [])
+    gamer["points_history"].append({
         "type": "event",
         "event_code": event_code,
         "points": points,
         "timestamp": ts_str
     })
     record_api("add_event_points", {
-        "gamer_id": gamer_id, 
+        "gamer_id": gamer["gamer_id"], 
         "event_code": event_code, 
         "points": points, 
         "timestamp": ts_str
     })
-    save_data()
+
+@writer.command
+def add_event_points_internal(gamer_id: int, event_code: str, points: int) -> str:
+    gamer = ensure_gamer(gamer_id)
+    apply_event_points(gamer, event_code, points, get_timestamp_now())
+    bot.store.save_gamer(gamer)
     return f"已為玩家 {gamer_id} 在活動 {event_code} 新增 {points} 點數"
 
 bot.add_points_internal = add_points_internal
 bot.add_event_points_internal = add_event_points_internal
 
+###############################
+# 通知 (經由 outbox 送出)
+###############################
+REVIEW_CHANNEL_ID = int(os.getenv("TARGET_CHANNEL_ID", "0"))
+
+async def _send_dm(payload: dict):
+    user = bot.get_user(payload["user_id"]) or await bot.fetch_user(payload["user_id"])
+    await user.send(payload["content"])
+
+async def _edit_review_message(payload: dict):
+    channel = bot.get_channel(REVIEW_CHANNEL_ID)
+    if channel is None:
+        return
+    # 審核完成：更新文字並移除按鈕
+    await channel.get_partial_message(payload["message_id"]).edit(content=payload["content"], view=None)
+
+outbox.register("dm", _send_dm)
+outbox.register("review_edit", _edit_review_message)
+
+def notify_user(user_id: int, content: str):
+    """私訊玩家；同一位玩家尚未送出的通知會合併成一則。"""
+    outbox.put("dm", {"user_id": user_id, "content": content}, route=f"dm:{user_id}", merge="append")
+
+def update_review_message(message_id: int, content: str):
+    outbox.put("review_edit", {"message_id": message_id, "content": content}, route=f"channel:{REVIEW_CHANNEL_ID}")
+
+bot.notify_user = notify_user
+
 ###############################
 # 黑名單檢查
 ###############################
 def not_blocked(ctx: commands.Context):
-    user_data = bot.gamers.get(ctx.author.id)
+    user_data = bot.store.get_gamer(ctx.author.id)
     if user_data and user_data.get("gamer_is_blocked"):
         raise CheckFailure("你已被加入黑名單，無法使用。")
     return True
@@ -201,41 +278,91 @@ def update_event_max_points(event_dict: dict):
 ###############################
 # Lifespan：啟動前後處理
 ###############################
+# 資料載入前收到的請求最多等待幾秒，之後回 503
+STARTUP_GATE_WAIT = float(os.getenv("STARTUP_GATE_WAIT", "10"))
+startup = StartupPhases(started=IMPORT_STARTED)
+
+async def start_services():
+    """在背景載入資料並啟動各服務；完成前 HTTP 已可連線 (ReadinessGate 擋下需要資料的請求)。"""
+    try:
+        with startup.phase("load_data"):
+            await asyncio.to_thread(load_data)
+        with startup.phase("services"):
+            audit.start()
+            writer.start()
+            bot.store.start()
+    except Exception as e:
+        # /healthz 與 /readyz 回 503，其餘請求由 ReadinessGate 回 503
+        log.error("啟動失敗: %r", e)
+        startup.set_failed(e)
+        return
+    startup.set_ready()
+    # cogs 會讀取資料，資料載入後才啟動 bot
+    if DISCORD_BOT_ENABLED:
+        supervisor.start()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    load_data()
-    loop = asyncio.get_event_loop()
-    loop.create_task(start_bot())
+    loop_lag.start()
+    starting = asyncio.get_running_loop().create_task(start_services(), name="startup")
     yield
+    # 載入中就收到關機：等載入完成後照常關閉 (載入在執行緒中，無法中途取消)
+    await starting
+    await supervisor.stop()
+    # 背景工作 (例如刪除活動後的清除) 會排入寫入指令，須在寫入者停止前取消並等待結束；
+    # 未完成的清除可於重啟後再次呼叫刪除活動繼續
+    await jobs.stop()
+    loop_lag.stop()
+    await uploads.close()
+    # 等已排入的寫入指令執行完再存檔；在執行緒中等待，讓指令經 call_soon_threadsafe
+    # 排入 outbox 的通知在這段期間照常進入佇列
+    await asyncio.to_thread(writer.stop)
+    # 寫入者停止後 outbox 不會再有新訊息，此時保存才不會遺漏
+    outbox.stop()
+    audit.stop()
+    # 關機前把尚未寫出的變動全部存檔
+    if bot.store is not None:
+        bot.store.close()
 
 ###############################
 # 建立 FastAPI 應用
 ###############################
 app = FastAPI(lifespan=lifespan)
-templates = Jinja2Templates(directory="templates")
+app.add_middleware(ReadinessGate, startup=startup, wait=STARTUP_GATE_WAIT)
+# 每個請求依路由記錄耗時 (/metrics)；最後加入的在最外層，啟動中回的 503 也會記錄
+app.add_middleware(HttpMetricsMiddleware, histogram=HTTP_SECONDS)
+templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
+# 頁面依賴的資料版本未變時，直接回 304 或快取的 HTML
+render_cache = RenderCache(templates)
 
 ###############################
 # 啟動 Discord Bot
 ###############################
+COGS = (
+    "cogs.card_binding",
+    "cogs.selection_menu",
+    "cogs.image_review",
+    "cogs.admin_management",
+    "cogs.event_management"
+)
+
+async def load_extension_timed(name: str):
+    with startup.phase(f"cog:{name.rsplit('.', 1)[-1]}"):
+        await bot.load_extension(name)
+
 async def load_cogs():
-    await bot.load_extension("cogs.card_binding")
-    await bot.load_extension("cogs.selection_menu")
-    await bot.load_extension("cogs.image_review")
-    await bot.load_extension("cogs.admin_management")
-    await bot.load_extension("cogs.event_management")
-
-async def start_bot():
-    async with bot:
-        await load_cogs()
-        while True:
-            try:
-                await bot.start(TOKEN)
-            except aiohttp.client_exceptions.WSServerHandshakeError as e:
-                print(f"連接Discord失敗: {e}, 5秒後重試...")
-                time.sleep(5)
-            except Exception as e:
-                print(f"發生錯誤: {e}")
-                break
+    # 各 cog 的 setup / cog_load 互不相依，一起進行
+    with startup.phase("cogs"):
+        await asyncio.gather(*(load_extension_timed(name) for name in COGS))
+
+async def setup_bot():
+    await load_cogs()
+    # cogs 註冊完 handler 後才開始送出；登入完成前先累積在 outbox
+    outbox.start(bot.wait_until_ready)
+
+# bot 在背景執行，連線失敗時以非同步退避重試，不影響網頁後台
+supervisor = BotSupervisor(bot, TOKEN, setup=setup_bot)
+loop_lag = LoopLagMonitor()
 
 ###############################
 # 首頁 -> Redirect /dashboard
@@ -244,6 +371,91 @@ async def start_bot():
 def root_redirect():
     return RedirectResponse(url="/dashboard")
 
+###############################
+# 健康檢查
+###############################
+# event loop 延遲超過此值 (秒) 視為不健康
+HEALTH_MAX_LOOP_LAG = float(os.getenv("HEALTH_MAX_LOOP_LAG", "5"))
+
+@app.get("/healthz")
+async def healthz():
+    """
+    bot 連線狀態與 event loop 延遲。Discord 重新連線中網頁後台仍可使用，回 200 (status=degraded)；
+    bot 無法啟動 (failed) 或 loop 延遲過高時回 503。
+    """
+    bot_health = supervisor.health()
+    lag = loop_lag.stats()
+    healthy = (startup.error is None and bot_health["state"] != "failed"
+               and lag["last_ms"] <= HEALTH_MAX_LOOP_LAG * 1000)
+    if not healthy:
+        status = "unhealthy"
+    elif not startup.ready:
+        status = "starting"
+    else:
+        status = "ok" if bot_health["connected"] else "degraded"
+    body = {
+        "status": status,
+        "startup": startup.stats(),
+        "bot": bot_health,
+        "loop_lag": lag,
+        "outbox_depth": outbox.stats()["depth"]
+    }
+    return JSONResponse(body, status_code=200 if healthy else 503)
+
+@app.get("/readyz")
+async def readyz():
+    """資料載入完成後回 200；載入中或失敗回 503 (部署時等這個再切換流量)。"""
+    return JSONResponse(startup.stats(), status_code=200 if startup.ready else 503)
+
+###############################
+# Metrics (Prometheus text format)
+###############################
+def _store_stat(key: str):
+    return bot.store.persist_stats().get(key) if bot.store is not None else None
+
+def register_metrics():
+    """各元件既有的統計在 /metrics 輸出時才讀取。"""
+    REGISTRY.gauge("ra_loop_lag_seconds", "event loop 最近一次延遲", lambda: loop_lag.last)
+    REGISTRY.gauge("ra_loop_lag_max_seconds", "event loop 近期最大延遲", lambda: loop_lag.stats()["max_ms"] / 1000)
+    REGISTRY.gauge("ra_bot_connected", "Discord bot 是否已連線", lambda: int(supervisor.connected))
+    REGISTRY.gauge("ra_bot_restarts_total", "Discord 連線重試次數", lambda: supervisor.restarts, kind="counter")
+    REGISTRY.gauge("ra_persist_pending", "尚未寫入磁碟的變動數 (背景存檔佇列)", lambda: _store_stat("pending"))
+    REGISTRY.gauge("ra_persist_flushes_total", "背景存檔次數", lambda: _store_stat("flushes"), kind="counter")
+    REGISTRY.gauge("ra_persist_last_flush_seconds", "最近一次背景存檔耗時", lambda: _store_stat("last_flush_seconds"))
+    REGISTRY.gauge("ra_writer_queue_depth", "寫入者佇列中等待的指令數", lambda: writer.stats()["queued"])
+    REGISTRY.gauge("ra_writer_commands_total", "寫入指令數", lambda: {
+        ("ok",): writer.executed - writer.failed,
+        ("failed",): writer.failed
+    }, ("result",), kind="counter")
+    REGISTRY.gauge("ra_outbox_messages", "outbox 中的訊息數", lambda: {
+        (state,): value for state, value in outbox.stats().items() if state in ("ready", "delayed", "inflight")
+    }, ("state",))
+    REGISTRY.gauge("ra_outbox_messages_total", "outbox 送出結果", lambda: {
+        (result,): value for result, value in outbox.stats().items() if result in ("sent", "retried", "dropped", "merged")
+    }, ("result",), kind="counter")
+    REGISTRY.gauge("ra_render_cache_total", "頁面快取結果", lambda: {
+        ("hit",): render_cache.hits,
+        ("miss",): render_cache.misses,
+        ("not_modified",): render_cache.not_modified
+    }, ("result",), kind="counter")
+    REGISTRY.gauge("ra_pending_images", "待審核圖片數",
+                   lambda: len(bot.store.pending_images) if bot.store is not None else None)
+    REGISTRY.gauge("ra_audit_records_total", "稽核紀錄筆數", lambda: {
+        (action,): n for action, n in audit.counts.items()
+    }, ("action",), kind="counter")
+    REGISTRY.gauge("ra_log_dropped_total", "日誌佇列已滿而丟棄的筆數", lambda: log_handler.dropped, kind="counter")
+    REGISTRY.gauge("ra_ready", "資料是否已載入完成", lambda: int(startup.ready))
+    REGISTRY.gauge("ra_startup_phase_seconds", "各啟動階段耗時", lambda: {
+        (name,): seconds for name, seconds in startup.phases.items()
+    }, ("phase",))
+
+register_metrics()
+
+@app.get("/metrics")
+async def metrics_api():
+    # 在 event loop 上輸出，outbox 等只在 loop 上修改的統計不會讀到一半
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 ###############################
 # 資料模型
 ###############################
@@ -267,71 +479,146 @@ class GamerData(BaseModel):
     gamer_is_blocked: bool = False
     gamer_bind_gamepass: str = None
 
+###############################
+# 列表 API：cursor 分頁 / 欄位投影 / NDJSON
+###############################
+MAX_PAGE_SIZE = 1000
+
+def _split_fields(value: Optional[str]) -> Optional[set]:
+    if not value:
+        return None
+    return {f.strip() for f in value.split(",") if f.strip()}
+
+def _project(record: dict, fields: Optional[set], exclude: Optional[set]) -> dict:
+    if fields is None and exclude is None:
+        return record
+    return {
+        k: v for k, v in record.items()
+        if (fields is None or k in fields) and (exclude is None or k not in exclude)
+    }
+
+def _ndjson_line(record: dict) -> str:
+    # 記憶體中的資料可能同時被 Bot 修改，序列化失敗時重試
+    for _ in range(5):
+        try:
+            return json.dumps(record, ensure_ascii=False) + "\n"
+        except RuntimeError:
+            time.sleep(0)
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+def list_response(records, cursor_key: str, limit: Optional[int], fields: Optional[str],
+                  exclude: Optional[str], fmt: str):
+    """
+    records 需依 cursor_key 排序且已套用 cursor。
+    - format=ndjson：逐筆串流，不在記憶體組出整個回應
+    - 有 limit：回傳 {"items": [...], "next_cursor": ...}，next_cursor 為 None 代表沒有下一頁
+    - 皆無：維持舊行為，回傳完整 list
+    """
+    if fmt not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format 只能是 json 或 ndjson")
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit 需介於 1 ~ {MAX_PAGE_SIZE}")
+    field_set, exclude_set = _split_fields(fields), _split_fields(exclude)
+    if limit is not None:
+        records = islice(records, limit + 1)
+
+    if fmt == "ndjson":
+        def generate():
+            for i, rec in enumerate(records):
+                if limit is not None and i >= limit:
+                    break
+                yield _ndjson_line(_project(rec, field_set, exclude_set))
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+    page = list(records)
+    if limit is None:
+        return [_project(rec, field_set, exclude_set) for rec in page]
+    next_cursor = page[limit - 1][cursor_key] if len(page) > limit else None
+    return {
+        "items": [_project(rec, field_set, exclude_set) for rec in page[:limit]],
+        "next_cursor": next_cursor
+    }
+
 ###############################
 # Event 相關 API
 ###############################
 @app.post("/api/event")
+@writer.command
 def create_event_api(data: EventData):
-    if data.event_code in bot.events:
+    if bot.store.has_event(data.event_code):
         raise HTTPException(status_code=400, detail="活動編號已存在")
+    if bot.store.event_cleanup_pending(data.event_code):
+        raise HTTPException(status_code=409, detail="此活動編號的舊紀錄仍在清除中，請稍後再試 (或再次刪除該活動以繼續清除)")
     try:
         _ = datetime.strptime(data.event_start_date, "%Y-%m-%d").date()
         _ = datetime.strptime(data.event_end_date, "%Y-%m-%d").date()
     except ValueError:
         raise HTTPException(status_code=400, detail="日期格式錯誤(YYYY-MM-DD)")
 
-    bot.events[data.event_code] = {
-        "event_code": data.event_code,
-        "event_name": data.event_name,
-        "event_description": data.event_description,
-        "event_start_date": data.event_start_date,
-        "event_end_date": data.event_end_date,
-        "gamer_list": [],
-        "tasks": [],
-        "max_points": 0,
-        "prizes": []  # 預設一個 prizes list
-    }
-    if data.tasks:
-        tid = 1
-        for t in data.tasks:
-            bot.events[data.event_code]["tasks"].append({
-                "task_id": tid,
-                "task_name": t.get("task_name", "未命名任務"),
-                "task_description": t.get("task_description", ""),
-                "task_points": t.get("task_points", 0),
-                "assigned_users": [],
-                "checked_users": []
-            })
-            tid += 1
-
-    update_event_max_points(bot.events[data.event_code])
-    save_data()
+    event_obj = new_event(
+        data.event_code, data.event_name, data.event_description,
+        data.event_start_date, data.event_end_date
+    )
+    for t in data.tasks or []:
+        event_obj.add_task(
+            t.get("task_name", "未命名任務"),
+            t.get("task_description", ""),
+            t.get("task_points", 0)
+        )
+
+    update_event_max_points(event_obj)
+    bot.store.save_event(event_obj)
     return {"event_code": data.event_code, "message": "活動已建立"}
 
 @app.get("/api/event")
-def get_events_api():
-    return list(bot.events.values())
+def get_events_api(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    fmt: str = Query("json", alias="format")
+):
+    events = bot.store.iter_events()
+    if cursor is not None or limit is not None:
+        # 分頁時依 event_code 排序，cursor 為上一頁最後一個 event_code
+        events = iter(sorted(
+            (ev for ev in events if cursor is None or ev["event_code"] > cursor),
+            key=lambda ev: ev["event_code"]
+        ))
+    return list_response(events, "event_code", limit, fields, exclude, fmt)
 
 @app.get("/api/event/{event_code}")
 def get_event_api(event_code: str):
-    if event_code not in bot.events:
+    event_obj = bot.store.get_event(event_code)
+    if event_obj is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return event_obj
+
+@app.get("/api/event/{event_code}/leaderboard")
+def get_event_leaderboard_api(event_code: str, offset: int = 0, limit: int = 10):
+    if not bot.store.has_event(event_code):
         raise HTTPException(status_code=404, detail="Event not found")
-    return bot.events[event_code]
+    limit = max(1, min(limit, 100))
+    return [
+        {"rank": rank, "gamer_id": gid, "points": points}
+        for rank, gid, points in bot.store.leaderboard(event_code, max(offset, 0), limit)
+    ]
 
 @app.put("/api/event")
+@writer.command
 def reset_events_api():
-    bot.events.clear()
-    save_data()
+    bot.store.clear_events()
     return {"message": "All events reset"}
 
 ###############################
 # 新增：編輯 / 刪除 活動
 ###############################
 @app.put("/api/event/{event_code}")
+@writer.command
 def edit_event_api(event_code: str, data: dict):
-    if event_code not in bot.events:
+    ev_obj = bot.store.get_event(event_code)
+    if ev_obj is None:
         raise HTTPException(status_code=404, detail="Event not found")
-    ev_obj = bot.events[event_code]
     ev_obj["event_name"] = data.get("event_name", ev_obj["event_name"])
     ev_obj["event_description"] = data.get("event_description", ev_obj["event_description"])
     ev_obj["event_start_date"] = data.get("event_start_date", ev_obj["event_start_date"])
@@ -341,259 +628,429 @@ def edit_event_api(event_code: str, data: dict):
         _ = datetime.strptime(ev_obj["event_end_date"], "%Y-%m-%d").date()
     except ValueError:
         raise HTTPException(status_code=400, detail="日期格式錯誤(YYYY-MM-DD)")
-    save_data()
+    bot.store.save_event(ev_obj)
     return {"message": f"活動 {event_code} 已更新"}
 
 @app.delete("/api/event/{event_code}")
-def delete_event_api(event_code: str):
+async def delete_event_api(event_code: str):
     """
     刪除活動後，也要把所有玩家對此活動的參考清除，
     包括歷史紀錄 (points_history、history_event_list 等)。
+    只處理反向索引中有參考此活動的玩家，並在背景分批執行，
+    可由 /api/jobs/{job_id} 查詢進度或取消；若中途取消，再次呼叫即可繼續清除。
     """
-    if event_code not in bot.events:
-        raise HTTPException(status_code=404, detail="Event not found")
+    def delete() -> list:
+        affected = bot.store.gamers_with_event(event_code)
+        if not bot.store.has_event(event_code) and not affected:
+            raise HTTPException(status_code=404, detail="Event not found")
+        # 1) 刪除活動
+        bot.store.delete_event(event_code)
+        return affected
+
+    affected = await writer.run(delete)
+
+    # 2) 背景移除受影響玩家中所有關於此 event_code 的紀錄 (每位玩家一個寫入指令)
+    def cleanup(gamer_id: int) -> bool:
+        user_data = bot.store.get_gamer(gamer_id)
+        if user_data is None or not strip_event_refs(user_data, event_code):
+            return False
+        bot.store.save_gamer(user_data)
+        return True
+
+    job = jobs.start("delete_event", event_code, affected, lambda gamer_id: writer.run(cleanup, gamer_id))
+    log.info("已刪除活動 %s，背景清除 %d 位玩家的紀錄", event_code, len(affected),
+             extra={"fields": {"job_id": job.job_id}})
+    record_api("delete_event", {"event_code": event_code, "affected": len(affected), "job_id": job.job_id})
+    return {
+        "message": f"活動 {event_code} 已刪除，正在背景清除 {len(affected)} 位玩家與此活動的關聯",
+        "job_id": job.job_id
+    }
 
-    print(f"DEBUG: 刪除活動前，bot.events = {list(bot.events.keys())}")
-
-    # 1) 刪除活動
-    bot.events.pop(event_code, None)
-    print(f"DEBUG: 刪除活動後，bot.events = {list(bot.events.keys())}")
-
-    # 2) 遍歷每個玩家，移除所有關於此 event_code 的紀錄
-    for g_id, user_data in bot.gamers.items():
-        print(f"DEBUG: 處理 gamer {g_id} 前，資料 = {user_data}")
-        if "joined_events" in user_data and event_code in user_data["joined_events"]:
-            user_data["joined_events"].remove(event_code)
-            print(f"DEBUG: gamer {g_id} - joined_events 移除 {event_code}")
-        if "events_points" in user_data and event_code in user_data["events_points"]:
-            user_data["events_points"].pop(event_code, None)
-            print(f"DEBUG: gamer {g_id} - events_points 移除 {event_code}")
-        if "redeemed_prizes" in user_data and event_code in user_data["redeemed_prizes"]:
-            user_data["redeemed_prizes"].pop(event_code, None)
-            print(f"DEBUG: gamer {g_id} - redeemed_prizes 移除 {event_code}")
-        if "joined_event_timestamps" in user_data and event_code in user_data["joined_event_timestamps"]:
-            user_data["joined_event_timestamps"].pop(event_code, None)
-            print(f"DEBUG: gamer {g_id} - joined_event_timestamps 移除 {event_code}")
-        if "history_event_list" in user_data:
-            original_history = user_data["history_event_list"][:]
-            user_data["history_event_list"] = [ev for ev in user_data["history_event_list"] if ev != event_code]
-            print(f"DEBUG: gamer {g_id} history_event_list: {original_history} -> {user_data['history_event_list']}")
-        if "points_history" in user_data:
-            original_points_history = user_data["points_history"][:]
-            new_points_history = []
-            for rec in user_data["points_history"]:
-                # 移除所有 type 為 "event" 且 event_code 為被刪除的紀錄
-                if rec.get("type") == "event" and rec.get("event_code") == event_code:
-                    continue
-                new_points_history.append(rec)
-            user_data["points_history"] = new_points_history
-            print(f"DEBUG: gamer {g_id} points_history: {original_points_history} -> {user_data['points_history']}")
-        print(f"DEBUG: 完成處理 gamer {g_id}, 最終資料 = {user_data}")
-    
-    # 3) 存檔
-    save_data()
-    print("DEBUG: data.json 更新完畢")
-    # 若需要增加資料更新頻率，可考慮在此處每次修改完玩家資料後即呼叫 save_data()（但目前每次操作皆會呼叫）
-    return {"message": f"活動 {event_code} 已刪除，並同步清除所有玩家與此活動的關聯"}
+###############################
+# 背景工作
+###############################
+@app.get("/api/jobs")
+def list_jobs_api():
+    return jobs.list()
+
+@app.get("/api/jobs/{job_id}")
+def get_job_api(job_id: int):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job_api(job_id: int):
+    if not jobs.cancel(job_id):
+        raise HTTPException(status_code=400, detail="此工作不存在或已結束")
+    return {"message": f"工作 {job_id} 已取消"}
+
+@app.get("/api/writer")
+def writer_stats_api():
+    return writer.stats()
+
+@app.get("/api/audit")
+def audit_log_api(gamer_id: Optional[int] = None, event_code: Optional[str] = None,
+                  action: Optional[str] = None, limit: int = 100):
+    """稽核紀錄，由新到舊；例：/api/audit?gamer_id=123、/api/audit?event_code=E1&action=redeem_prize"""
+    return audit.query(gamer_id, event_code, action, max(1, min(limit, 1000)))
+
+@app.get("/api/outbox")
+async def outbox_stats_api():
+    # 在 event loop 上讀取，避免與 outbox 同時修改
+    return outbox.stats()
+
+###############################
+# 審核佇列 (批次審核)
+###############################
+class BulkReviewData(BaseModel):
+    image_ids: List[str]
+    action: str
+
+    @field_validator("action")
+    def validate_action(cls, v):
+        if v not in ("approve", "reject"):
+            raise ValueError("action 必須是 approve 或 reject")
+        return v
+
+def review_queue(event_code: Optional[str] = None, task_id: Optional[int] = None) -> List[dict]:
+    """待審核圖片依 (活動, 任務) 分組，各組內依上傳時間排序。"""
+    groups = {}
+    events = {}
+    for image_id, user_id, img in bot.store.iter_pending_images():
+        code = img.get("event_code")
+        tid = img.get("task_id")
+        if event_code is not None and code != event_code:
+            continue
+        if task_id is not None and tid != task_id:
+            continue
+        group = groups.get((code, tid))
+        if group is None:
+            if code not in events:
+                events[code] = bot.store.get_event(code)
+            event_obj = events[code]
+            task = event_obj.task(tid) if event_obj else None
+            group = groups[(code, tid)] = {
+                "event_code": code,
+                "event_name": event_obj.get("event_name", "N/A") if event_obj else "N/A",
+                "task_id": tid,
+                "task_name": task.get("task_name", "無任務名稱") if task else f"任務ID={tid}",
+                "task_points": task.get("task_points", 0) if task else 0,
+                "items": []
+            }
+        group["items"].append({
+            "image_id": image_id,
+            "user_id": user_id,
+            "username": img.get("username"),
+            "filename": img.get("filename"),
+            "upload_time": img.get("upload_time"),
+            "content_hash": img.get("content_hash"),
+            "review_jump_url": img.get("review_jump_url")
+        })
+    result = sorted(groups.values(), key=lambda g: (str(g["event_code"]), g["task_id"] or 0))
+    for group in result:
+        group["items"].sort(key=lambda item: item["upload_time"] or "")
+    return result
+
+def bulk_review(image_ids: List[str], approve: bool) -> dict:
+    """
+    一次審核多張圖片：圖片狀態、任務的 checked_users 與玩家點數在同一個交易中寫入，
+    每位玩家只讀寫一次；通知每位玩家合併為一則私訊，經由 outbox 送出。
+    """
+    now = get_timestamp_now()
+    reviewed, skipped = [], []
+    events = {}
+    credits = {}
+    with bot.store.batch():
+        for image_id in dict.fromkeys(image_ids):
+            found = bot.store.find_image(image_id)
+            if not found:
+                skipped.append(image_id)
+                continue
+            user_id, seq, img = found
+            code = img.get("event_code")
+            if code not in events:
+                events[code] = bot.store.get_event(code)
+            event_obj = events[code]
+            task = event_obj.task(img.get("task_id")) if event_obj else None
+            points = task.get("task_points", 0) if task else 0
+            if approve:
+                img["status"] = "approved"
+                img["approved_time"] = now
+                if task and user_id not in task["checked_users"]:
+                    task["checked_users"].append(user_id)
+                credits.setdefault(user_id, []).append((code, points))
+            else:
+                img["status"] = "rejected"
+                img["rejected_time"] = now
+            bot.store.update_image(user_id, seq, img)
+            reviewed.append((image_id, user_id, img, event_obj, task, points))
+
+        if approve:
+            for event_obj in events.values():
+                if event_obj:
+                    bot.store.save_event(event_obj)
+            for user_id, items in credits.items():
+                gamer = ensure_gamer(user_id)
+                for code, points in items:
+                    apply_event_points(gamer, code, points, now)
+                bot.store.save_gamer(gamer)
+
+    # 交易完成後才送出通知
+    lines_by_user = {}
+    for image_id, user_id, img, event_obj, task, points in reviewed:
+        event_name = event_obj.get("event_name", "N/A") if event_obj else "N/A"
+        task_name = f"{task.get('task_name', '無任務名稱')} (ID={task['task_id']})" if task else f"任務ID={img.get('task_id')}"
+        status = f"已通過(+{points}點)" if approve else "已拒絕"
+        lines_by_user.setdefault(user_id, []).append(
+            f"- `{img.get('filename')}` 活動：{event_name} 任務：{task_name} {status}"
+        )
+        if img.get("review_message_id"):
+            update_review_message(img["review_message_id"], f"圖片 `{img.get('filename')}` 審核狀態：{task_name} 審核：{status} (批次)")
+    for user_id, lines in lines_by_user.items():
+        footer = "" if approve else "\n請重新上傳。"
+        notify_user(user_id, "你的圖片審核結果：\n" + "\n".join(lines) + footer)
+
+    action = "bulk_approve" if approve else "bulk_reject"
+    record_api(action, {"count": len(reviewed), "skipped": len(skipped)})
+    return {
+        "action": "approve" if approve else "reject",
+        "reviewed": [r[0] for r in reviewed],
+        "skipped": skipped,
+        "credited_gamers": len(credits)
+    }
+
+@app.get("/api/review/pending")
+def review_pending_api(event_code: Optional[str] = None, task_id: Optional[int] = None):
+    return review_queue(event_code, task_id)
+
+@app.post("/api/review/bulk")
+async def review_bulk_api(data: BulkReviewData):
+    if not data.image_ids:
+        raise HTTPException(status_code=400, detail="未選擇任何圖片")
+    return await writer.run(bulk_review, data.image_ids, data.action == "approve")
+
+@app.get("/dashboard/review", response_class=HTMLResponse)
+def dashboard_review(request: Request, event_code: Optional[str] = None):
+    return render_cache.render(
+        request, ("dashboard_review", event_code), [("user_images", None), ("events", None)], "review_queue.html",
+        lambda: {"groups": review_queue(event_code), "event_code": event_code}
+    )
 
 ###############################
 # Task 相關
 ###############################
 @app.post("/api/event/{event_code}/task")
+@writer.command
 def add_task_to_event_api(event_code: str, task_name: str, task_description: str="", task_points: int=0):
-    if event_code not in bot.events:
+    event_obj = bot.store.get_event(event_code)
+    if event_obj is None:
         raise HTTPException(status_code=404, detail="Event not found")
-    tasks = bot.events[event_code].setdefault("tasks", [])
-    new_id = len(tasks) + 1
-    tasks.append({
-        "task_id": new_id,
-        "task_name": task_name,
-        "task_description": task_description,
-        "task_points": task_points,
-        "assigned_users": [],
-        "checked_users": []
-    })
-    update_event_max_points(bot.events[event_code])
-    save_data()
+    event_obj.add_task(task_name, task_description, task_points)
+    update_event_max_points(event_obj)
+    bot.store.save_event(event_obj)
     return {"message": f"已新增任務 {task_name} (點數:{task_points}) 到活動 {event_code}"}
 
 @app.put("/api/event/{event_code}/task/{task_id}")
+@writer.command
 def edit_task_api(event_code: str, task_id: int, data: dict):
-    if event_code not in bot.events:
+    event_obj = bot.store.get_event(event_code)
+    if event_obj is None:
         raise HTTPException(status_code=404, detail="Event not found")
-    tasks = bot.events[event_code].get("tasks", [])
-    the_task = None
-    for t in tasks:
-        if t["task_id"] == task_id:
-            the_task = t
-            break
+    the_task = event_obj.task(task_id)
     if not the_task:
         raise HTTPException(status_code=404, detail="Task not found")
     the_task["task_name"] = data.get("task_name", the_task["task_name"])
     the_task["task_description"] = data.get("task_description", the_task["task_description"])
     the_task["task_points"] = data.get("task_points", the_task["task_points"])
-    update_event_max_points(bot.events[event_code])
-    save_data()
+    update_event_max_points(event_obj)
+    bot.store.save_event(event_obj)
     return {"message": f"任務 {task_id} 已更新"}
 
 @app.delete("/api/event/{event_code}/task/{task_id}")
+@writer.command
 def delete_task_api(event_code: str, task_id: int):
-    if event_code not in bot.events:
+    event_obj = bot.store.get_event(event_code)
+    if event_obj is None:
         raise HTTPException(status_code=404, detail="Event not found")
-    tasks = bot.events[event_code].get("tasks", [])
-    idx = None
-    for i, t in enumerate(tasks):
-        if t["task_id"] == task_id:
-            idx = i
-            break
-    if idx is None:
+    if event_obj.remove_task(task_id) is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    tasks.pop(idx)
-    update_event_max_points(bot.events[event_code])
-    save_data()
+    update_event_max_points(event_obj)
+    bot.store.save_event(event_obj)
     return {"message": f"任務 {task_id} 已刪除"}
 
 ###############################
 # Prize 相關
 ###############################
 @app.post("/api/event/{event_code}/prize")
+@writer.command
 def add_prize_api(event_code: str, data: dict):
-    if event_code not in bot.events:
+    event_obj = bot.store.get_event(event_code)
+    if event_obj is None:
         raise HTTPException(status_code=404, detail="Event not found")
-    event_obj = bot.events[event_code]
-    event_obj.setdefault("prizes", [])
-    prize_list = event_obj["prizes"]
-    new_id = len(prize_list) + 1
     prize_name = data.get("prize_name", "未命名獎勵")
     cost = data.get("points_required", 0)
-    prize_list.append({
-        "prize_id": new_id,
-        "prize_name": prize_name,
-        "points_required": cost
-    })
-    save_data()
+    event_obj.add_prize(prize_name, cost)
+    bot.store.save_event(event_obj)
     return {"message": f"已新增獎勵 {prize_name}(需:{cost}點) 到活動 {event_code}"}
 
 @app.put("/api/event/{event_code}/prize/{prize_id}")
+@writer.command
 def edit_prize_api(event_code: str, prize_id: int, data: dict):
-    if event_code not in bot.events:
+    event_obj = bot.store.get_event(event_code)
+    if event_obj is None:
         raise HTTPException(status_code=404, detail="Event not found")
-    event_obj = bot.events[event_code]
-    prizes = event_obj.setdefault("prizes", [])
-    the_prize = None
-    for p in prizes:
-        if p["prize_id"] == prize_id:
-            the_prize = p
-            break
+    the_prize = event_obj.prize(prize_id)
     if not the_prize:
         raise HTTPException(status_code=404, detail="Prize not found")
     the_prize["prize_name"] = data.get("prize_name", the_prize["prize_name"])
     the_prize["points_required"] = data.get("points_required", the_prize["points_required"])
-    save_data()
+    bot.store.save_event(event_obj)
     return {"message": f"活動{event_code}的獎勵 {prize_id} 已更新"}
 
 @app.delete("/api/event/{event_code}/prize/{prize_id}")
+@writer.command
 def delete_prize_api(event_code: str, prize_id: int):
-    if event_code not in bot.events:
+    event_obj = bot.store.get_event(event_code)
+    if event_obj is None:
         raise HTTPException(status_code=404, detail="Event not found")
-    event_obj = bot.events[event_code]
-    prizes = event_obj.setdefault("prizes", [])
-    idx = None
-    for i, p in enumerate(prizes):
-        if p["prize_id"] == prize_id:
-            idx = i
-            break
-    if idx is None:
+    if event_obj.remove_prize(prize_id) is None:
         raise HTTPException(status_code=404, detail="Prize not found")
-    prizes.pop(idx)
-    save_data()
+    bot.store.save_event(event_obj)
     return {"message": f"活動{event_code}的獎勵 {prize_id} 已刪除"}
 
 ###############################
 # Gamer 相關
 ###############################
 @app.post("/api/gamer")
+@writer.command
 def create_gamer_api(data: GamerData):
-    new_id = len(bot.gamers) + 1
-    bot.gamers[new_id] = {
-        "gamer_id": new_id,
-        "gamer_card_number": data.gamer_card_number,
-        "gamer_is_blocked": data.gamer_is_blocked,
-        "gamer_bind_gamepass": data.gamer_bind_gamepass,
-        "joined_events": [],
-        "history_event_list": [],
-        "history_event_pts_list": [],
-        "events_points": {}
-    }
-    save_data()
+    # 刪除過玩家後 count + 1 可能已被使用，往後找第一個未使用的 ID，不可覆蓋既有玩家
+    # (不用 max + 1：Discord 建立的玩家 ID 為 snowflake，後台建立的玩家維持小號)
+    new_id = bot.store.count_gamers() + 1
+    while bot.store.has_gamer(new_id):
+        new_id += 1
+    gamer = new_gamer(new_id, data.gamer_card_number)
+    gamer["gamer_is_blocked"] = data.gamer_is_blocked
+    gamer["gamer_bind_gamepass"] = data.gamer_bind_gamepass
+    try:
+        bot.store.save_gamer(gamer)
+    except DuplicateCardError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"gamer_id": new_id, "message": f"玩家 {new_id} 已建立"}
 
 @app.get("/api/gamer")
-def get_all_gamers_api():
-    return list(bot.gamers.values())
+def get_all_gamers_api(
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    blocked: Optional[bool] = None,
+    event_code: Optional[str] = None,
+    has_card: Optional[bool] = None,
+    fmt: str = Query("json", alias="format")
+):
+    """
+    例：/api/gamer?limit=100&exclude=points_history&blocked=false
+        /api/gamer?format=ndjson (完整匯出，逐行串流)
+    cursor 為上一頁回傳的 next_cursor (gamer_id)。
+    """
+    gamers = bot.store.query_gamers(after=cursor, blocked=blocked, event_code=event_code, has_card=has_card)
+    return list_response(gamers, "gamer_id", limit, fields, exclude, fmt)
 
 @app.get("/api/gamer/{gamer_id}")
 def get_gamer_data_api(gamer_id: int):
-    if gamer_id not in bot.gamers:
+    gamer = bot.store.get_gamer(gamer_id)
+    if gamer is None:
         raise HTTPException(status_code=404, detail="Gamer not found")
-    return bot.gamers[gamer_id]
+    return gamer
 
 @app.put("/api/gamer/{gamer_id}/points")
+@writer.command
 def add_points_to_gamer_api(gamer_id: int, points: int):
-    if gamer_id not in bot.gamers:
+    gamer = bot.store.get_gamer(gamer_id)
+    if gamer is None:
         raise HTTPException(status_code=404, detail="Gamer not found")
-    bot.gamers[gamer_id]["history_event_pts_list"].append(points)
-    bot.gamers[gamer_id].setdefault("points_history", [])
+    credit_points(gamer, points)
+    gamer.setdefault("points_history", [])
     ts_str = get_timestamp_now()
-    bot.gamers[gamer_id]["points_history"].append({
+    gamer["points_history"].append({
         "type": "api",
         "points": points,
         "timestamp": ts_str
     })
-    save_data()
+    bot.store.save_gamer(gamer)
+    record_api("add_api_points", {"gamer_id": gamer_id, "points": points, "timestamp": ts_str})
     return {"message": f"已為玩家 {gamer_id} 增加 {points} 點"}
 
+@app.get("/api/gamer/{gamer_id}/history")
+def get_gamer_history_api(gamer_id: int, offset: int = 0, limit: int = 20):
+    """點數紀錄分頁，新的在前。"""
+    gamer = bot.store.get_gamer(gamer_id)
+    if gamer is None:
+        raise HTTPException(status_code=404, detail="Gamer not found")
+    history = gamer.get("points_history", [])
+    offset = max(offset, 0)
+    limit = max(1, min(limit, 200))
+    end = len(history) - offset
+    items = history[max(end - limit, 0):end][::-1] if end > 0 else []
+    return {
+        "items": items,
+        "total": len(history),
+        "next_offset": offset + limit if end - limit > 0 else None
+    }
+
+@app.get("/api/gamer/{gamer_id}/rank")
+def get_gamer_rank_api(gamer_id: int, event_code: Optional[str] = None):
+    """玩家名次；帶 event_code 時為該活動的名次，否則依累計點數。"""
+    if not bot.store.has_gamer(gamer_id):
+        raise HTTPException(status_code=404, detail="Gamer not found")
+    found = bot.store.gamer_rank(gamer_id, event_code)
+    if found is None:
+        return {"gamer_id": gamer_id, "event_code": event_code, "rank": None, "points": 0, "total": 0}
+    rank, points, total = found
+    return {"gamer_id": gamer_id, "event_code": event_code, "rank": rank, "points": points, "total": total}
+
 @app.put("/api/gamer/{gamer_id}/card")
+@writer.command
 def update_gamer_card_api(gamer_id: int, new_card_number: str):
-    if gamer_id not in bot.gamers:
+    gamer = bot.store.get_gamer(gamer_id)
+    if gamer is None:
         raise HTTPException(status_code=404, detail="Gamer not found")
-    bot.gamers[gamer_id]["gamer_card_number"] = new_card_number
-    save_data()
+    gamer["gamer_card_number"] = new_card_number
+    try:
+        bot.store.save_gamer(gamer)
+    except DuplicateCardError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"message": f"玩家 {gamer_id} 的卡號已更新為 {new_card_number}"}
 
 @app.get("/api/gamer/card/{card_number}")
 def get_gamer_by_card_api(card_number: str):
-    for g_id, data in bot.gamers.items():
-        if data.get("gamer_card_number") == card_number:
-            return data
+    gamer = bot.store.find_gamer_by_card(card_number)
+    if gamer is not None:
+        return gamer
     raise HTTPException(status_code=404, detail="Player with this card number not found")
 
 @app.put("/api/gamer/{gamer_id}/redeem_prize")
+@writer.command
 def redeem_prize_api(gamer_id: int, event_code: str, prize_id: int = Body(embed=True)):
-    if gamer_id not in bot.gamers:
+    user_data = bot.store.get_gamer(gamer_id)
+    if user_data is None:
         raise HTTPException(status_code=404, detail="Gamer not found")
-    if event_code not in bot.events:
+    event_obj = bot.store.get_event(event_code)
+    if event_obj is None:
         raise HTTPException(status_code=404, detail="Event not found")
 
-    event_obj = bot.events[event_code]
-    if "prizes" not in event_obj:
+    if not event_obj["prizes"]:
         raise HTTPException(status_code=400, detail="此活動沒有獎品。")
-    valid_ids = [p["prize_id"] for p in event_obj["prizes"]]
-    if prize_id not in valid_ids:
+    chosen_prize = event_obj.prize(prize_id)
+    if not chosen_prize:
         raise HTTPException(status_code=400, detail="此獎品ID不在活動中")
 
-    user_data = bot.gamers[gamer_id]
     user_data.setdefault("redeemed_prizes", {})
     user_data["redeemed_prizes"].setdefault(event_code, [])
 
-    chosen_prize = None
-    for p in event_obj["prizes"]:
-        if p["prize_id"] == prize_id:
-            chosen_prize = p
-            break
-    if not chosen_prize:
-        raise HTTPException(status_code=400, detail="查無此獎品")
-
     cost_points = chosen_prize.get("points_required", 0)
     events_points = user_data.setdefault("events_points", {})
     current_points = events_points.setdefault(event_code, 0)
@@ -612,152 +1069,281 @@ def redeem_prize_api(gamer_id: int, event_code: str, prize_id: int = Body(embed=
         "event_code": event_code,
         "prize_id": prize_id
     })
-    save_data()
+    bot.store.save_gamer(user_data)
+    record_api("redeem_prize", {
+        "gamer_id": gamer_id,
+        "event_code": event_code,
+        "prize_id": prize_id,
+        "points_required": cost_points,
+        "timestamp": ts_str
+    })
     return {"message": f"已為玩家 {gamer_id} 兌換獎品(活動={event_code})"}
 
 ###############################
 # Dashboard
 ###############################
+DASHBOARD_PAGE_SIZE = 50
+
+def _dashboard_row(gamer: dict) -> dict:
+    return {
+        "gamer_id": gamer["gamer_id"],
+        "gamer_card_number": gamer.get("gamer_card_number"),
+        "gamer_is_blocked": bool(gamer.get("gamer_is_blocked")),
+        "joined_events": gamer.get("joined_events", []),
+        "total_points": total_points(gamer)
+    }
+
+def dashboard_gamer_page(q: str = "", sort: str = "gamer_id", order: str = "asc",
+                         offset: int = 0, limit: int = DASHBOARD_PAGE_SIZE) -> dict:
+    """
+    後台玩家列表的一頁 (只含列表需要的欄位)。
+    q 為空時依 sort/order 排序；有 q 時依序列出 ID 完全相符、卡號包含 q、參加活動 q 的玩家。
+    """
+    if sort not in GAMER_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort 只能是 {', '.join(GAMER_SORTS)}")
+    offset = max(offset, 0)
+    limit = max(1, min(limit, 200))
+    q = q.strip()
+    if not q:
+        rows = bot.store.page_gamers(sort, order == "desc", offset, limit + 1)
+        total = bot.store.count_gamers()
+    else:
+        need = offset + limit + 1
+        found = {}
+        if q.isdigit():
+            gamer = bot.store.get_gamer(int(q))
+            if gamer:
+                found[gamer["gamer_id"]] = gamer
+        for gamer in bot.store.search_gamers_by_card(q, limit=need):
+            found.setdefault(gamer["gamer_id"], gamer)
+        event_code = q if bot.store.has_event(q) else q.upper()
+        for gamer in islice(bot.store.query_gamers(event_code=event_code), need):
+            found.setdefault(gamer["gamer_id"], gamer)
+        rows = list(found.values())[offset:need]
+        total = None
+    return {
+        "items": [_dashboard_row(g) for g in rows[:limit]],
+        "next_offset": offset + limit if len(rows) > limit else None,
+        "total": total
+    }
+
 @app.get("/dashboard", response_class=HTMLResponse)
 def dashboard_page(request: Request):
     status = "機器人運作中"
     debug_info = "資料載入成功"
-    return templates.TemplateResponse("dashboard.html", {
-        "request": request,
-        "events": bot.events,
-        "gamers": bot.gamers,
-        "status": status,
-        "debug": debug_info
-    })
+    # 只在伺服器端渲染第一頁，其餘由 /api/dashboard/gamers 分頁載入
+    return render_cache.render(
+        request, ("dashboard",), [("events", None), ("gamers", None)], "dashboard.html",
+        lambda: {
+            "events": bot.store.events_dict(),
+            "gamer_page": dashboard_gamer_page(),
+            "page_size": DASHBOARD_PAGE_SIZE,
+            "status": status,
+            "debug": debug_info
+        }
+    )
+
+@app.get("/api/dashboard/gamers")
+def dashboard_gamers_api(q: str = "", sort: str = "gamer_id", order: str = "asc",
+                         offset: int = 0, limit: int = DASHBOARD_PAGE_SIZE):
+    return dashboard_gamer_page(q, sort, order, offset, limit)
 
 @app.get("/dashboard/management", response_class=HTMLResponse)
 def dashboard_management(request: Request):
-    return templates.TemplateResponse("dashboard_management.html", {
-        "request": request,
-        "events": bot.events
-    })
+    return render_cache.render(
+        request, ("dashboard_management",), [("events", None)], "dashboard_management.html",
+        lambda: {"events": bot.store.events_dict()}
+    )
 
 @app.get("/dashboard/event/{event_code}", response_class=HTMLResponse)
 def dashboard_event_detail(request: Request, event_code: str):
-    if event_code not in bot.events:
+    event = bot.store.get_event(event_code)
+    if event is None:
         raise HTTPException(status_code=404, detail="Event not found")
-    event = bot.events[event_code]
-    return templates.TemplateResponse("event_tasks_detail.html", {
-        "request": request,
-        "event_code": event_code,
-        "event": event
-    })
+    with RENDER_SECONDS.time(template="event_tasks_detail.html"):
+        return templates.TemplateResponse("event_tasks_detail.html", {
+            "request": request,
+            "event_code": event_code,
+            "event": event
+        })
+
+###############################
+# 上傳圖片檔 (原圖 / 縮圖)
+###############################
+# 檔名即內容 hash，內容永不變動，可讓瀏覽器長期快取
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+FILE_CHUNK_SIZE = 64 * 1024
+
+def parse_range(value: Optional[str], size: int) -> Optional[tuple]:
+    """
+    解析單一區段的 Range: bytes=start-end / start- / -suffix，回傳 (start, end) (含 end)。
+    沒有 Range 或格式不支援 (例如多個區段) 時為 None，回傳整個檔案；範圍超出檔案時丟出 416。
+    """
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    start, _, end = value[len("bytes="):].strip().partition("-")
+    try:
+        if start:
+            start, end = int(start), (int(end) if end else size - 1)
+        elif end:
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            return None
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+def file_response(request: Request, path: str, media_type: str, etag: str):
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    size = os.path.getsize(path)
+    byte_range = parse_range(request.headers.get("range"), size)
+    start, end = byte_range or (0, size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    def read_file():
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(FILE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    return StreamingResponse(read_file(), status_code=206 if byte_range else 200,
+                             media_type=media_type, headers=headers)
+
+@app.get("/images/{content_hash}")
+def get_image_file(request: Request, content_hash: str):
+    found = archive.find(content_hash)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    path, media_type = found
+    return file_response(request, path, media_type, f'"{content_hash}"')
+
+@app.get("/images/{content_hash}/thumb")
+def get_image_thumbnail(request: Request, content_hash: str, size: int = 256):
+    # 只允許固定幾種尺寸，避免任意尺寸各產生一份縮圖
+    size = min(THUMB_SIZES, key=lambda s: abs(s - size))
+    found = archive.thumbnail(content_hash, size)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    path, media_type = found
+    return file_response(request, path, media_type, f'"{content_hash}-{size}"')
 
 ###############################
 # 其餘 Gamer / Timestamps 頁面
 ###############################
 @app.get("/task/{event_code}/{task_id}", response_class=HTMLResponse)
 def task_detail(request: Request, event_code: str, task_id: int):
-    if event_code not in bot.events:
-        raise HTTPException(status_code=404, detail="Event not found")
-    the_task = None
-    for t in bot.events[event_code]["tasks"]:
-        if t["task_id"] == task_id:
-            the_task = t
-            break
-    if not the_task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return templates.TemplateResponse("task_detail.html", {
-        "request": request,
-        "event_code": event_code,
-        "task": the_task
-    })
+    def build_context():
+        event_obj = bot.store.get_event(event_code)
+        if event_obj is None:
+            raise HTTPException(status_code=404, detail="Event not found")
+        the_task = event_obj.task(task_id)
+        if not the_task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        submissions = [
+            {"user_id": uid, **img} for uid, img in bot.store.task_images(event_code, task_id)
+        ]
+        submissions.sort(key=lambda img: img.get("upload_time") or "", reverse=True)
+        return {"event_code": event_code, "task": the_task, "submissions": submissions}
+
+    return render_cache.render(
+        request, ("task", event_code, task_id), [("events", event_code), ("user_images", None)],
+        "task_detail.html", build_context
+    )
 
 @app.get("/gamer/{gamer_id}/event/{event_code}", response_class=HTMLResponse)
 def user_event_detail(request: Request, gamer_id: int, event_code: str):
-    gamer = bot.gamers.get(gamer_id)
-    if not gamer:
-        raise HTTPException(status_code=404, detail="Gamer not found")
-    event = bot.events.get(event_code)
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    events_points = gamer.setdefault("events_points", {})
-    user_points = events_points.setdefault(event_code, 0)
-    tasks = event.get("tasks", [])
-    return templates.TemplateResponse("user_event_detail.html", {
-        "request": request,
-        "gamer_id": gamer_id,
-        "event_code": event_code,
-        "event": event,
-        "user_points": user_points,
-        "tasks": tasks,
-        "gamer": gamer
-    })
+    def build_context():
+        gamer = bot.store.get_gamer(gamer_id)
+        if not gamer:
+            raise HTTPException(status_code=404, detail="Gamer not found")
+        event = bot.store.get_event(event_code)
+        if not event:
+            raise HTTPException(status_code=404, detail="Event not found")
+        # 只讀取，不在頁面渲染時寫入玩家資料
+        user_points = gamer.get("events_points", {}).get(event_code, 0)
+        return {
+            "gamer_id": gamer_id,
+            "event_code": event_code,
+            "event": event,
+            "user_points": user_points,
+            "tasks": event.get("tasks", []),
+            "gamer": gamer,
+            "submissions": [img for img in bot.store.get_images(gamer_id) if img.get("event_code") == event_code]
+        }
+
+    return render_cache.render(
+        request, ("user_event", gamer_id, event_code),
+        [("gamers", gamer_id), ("events", event_code), ("user_images", gamer_id)],
+        "user_event_detail.html", build_context
+    )
+
+TIMELINE_PAGE_SIZE = 200
 
 @app.get("/gamer/{gamer_id}/timestamps", response_class=HTMLResponse)
-def gamer_timestamps(request: Request, gamer_id: int):
-    user_data = bot.gamers.get(gamer_id)
-    if not user_data:
+def gamer_timestamps(request: Request, gamer_id: int, offset: int = 0, limit: int = TIMELINE_PAGE_SIZE):
+    offset = max(offset, 0)
+    limit = max(1, min(limit, 1000))
+
+    def build_context():
+        if not bot.store.has_gamer(gamer_id):
+            raise HTTPException(status_code=404, detail="Gamer not found")
+        # 時間軸已依時間排序，只取需要的那一頁
+        total = bot.store.timelines.count(gamer_id)
+        entries = bot.store.timelines.page(gamer_id, offset, limit)
+        return {
+            "gamer_id": gamer_id,
+            "all_records": [{"timestamp": e["timestamp"], "detail": describe(e, bot.store)} for e in entries],
+            "total": total,
+            "offset": offset,
+            "limit": limit
+        }
+
+    # 說明文字會用到活動 / 任務 / 獎品名稱，因此也依賴 events
+    return render_cache.render(
+        request, ("timestamps", gamer_id, offset, limit),
+        [("gamers", gamer_id), ("user_images", gamer_id), ("events", None)],
+        "gamer_timestamps.html", build_context
+    )
+
+@app.get("/api/gamer/{gamer_id}/timeline")
+def get_gamer_timeline_api(gamer_id: int, offset: int = 0, limit: int = 50,
+                           start: Optional[str] = None, end: Optional[str] = None):
+    """
+    玩家時間軸 (由舊到新)。
+    帶 start / end (ISO 時間) 時回傳該區間內的全部項目，否則回傳由最新往回 offset 筆後的一頁。
+    """
+    if not bot.store.has_gamer(gamer_id):
         raise HTTPException(status_code=404, detail="Gamer not found")
-    all_records = []
-    points_history = user_data.get("points_history", [])
-    for item in points_history:
-        stamp = item.get("timestamp")
-        if not stamp:
-            continue
-        rtype = item.get("type", "?")
-        ev_code = item.get("event_code", "")
-        pts = item.get("points", 0)
-        if rtype == "global":
-            detail = f"全域加點 +{pts}"
-        elif rtype == "event":
-            detail = f"活動({ev_code})加點 +{pts}"
-        elif rtype == "api":
-            detail = f"API加點 +{pts}"
-        elif rtype == "admin_redeem":
-            evobj = bot.events.get(ev_code, {})
-            pname = "?"
-            for p in evobj.get("prizes", []):
-                if p["prize_id"] == item.get("prize_id"):
-                    pname = p["prize_name"]
-                    break
-            detail = f"後台兌換(活動={ev_code}, 獎品={pname})"
-        else:
-            detail = f"其他動作 {pts}"
-        all_records.append({"timestamp": stamp, "detail": detail})
-    joined_map = user_data.get("joined_event_timestamps", {})
-    for ev_code, tstamp in joined_map.items():
-        if tstamp:
-            all_records.append({"timestamp": tstamp, "detail": f"加入活動 {ev_code}"})
-    user_imgs = bot.user_images.get(gamer_id, [])
-    for img in user_imgs:
-        if "upload_time" in img:
-            all_records.append({
-                "timestamp": img["upload_time"],
-                "detail": f"上傳圖片 `{img['filename']}`(活動={img['event_code']}, 任務ID={img['task_id']})"
-            })
-        if "approved_time" in img:
-            all_records.append({
-                "timestamp": img["approved_time"],
-                "detail": f"圖片 `{img['filename']}`審核通過 (活動={img['event_code']}, 任務ID={img['task_id']})"
-            })
-        if "rejected_time" in img:
-            all_records.append({
-                "timestamp": img["rejected_time"],
-                "detail": f"圖片 `{img['filename']}`審核拒絕 (活動={img['event_code']}, 任務ID={img['task_id']})"
-            })
-    def parse_iso(s):
+    if start or end:
         try:
-            return datetime.fromisoformat(s)
-        except:
-            return None
-    valid_records = []
-    for r in all_records:
-        dt = parse_iso(r["timestamp"])
-        if dt:
-            valid_records.append({"timestamp": r["timestamp"], "detail": r["detail"], "dt": dt})
-    valid_records.sort(key=lambda x: x["dt"])
-    final_list = [{"timestamp": r["timestamp"], "detail": r["detail"]} for r in valid_records]
-    return templates.TemplateResponse("gamer_timestamps.html", {
-        "request": request,
-        "gamer_id": gamer_id,
-        "all_records": final_list
-    })
+            start_dt = datetime.fromisoformat(start) if start else None
+            end_dt = datetime.fromisoformat(end) if end else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="時間格式錯誤(ISO 8601)")
+        entries = bot.store.timelines.between(gamer_id, start_dt, end_dt)
+        next_offset = None
+    else:
+        offset = max(offset, 0)
+        limit = max(1, min(limit, 1000))
+        entries = bot.store.timelines.page(gamer_id, offset, limit)
+        next_offset = offset + limit if bot.store.timelines.count(gamer_id) > offset + limit else None
+    return {
+        "items": [dict(e, detail=describe(e, bot.store)) for e in entries],
+        "next_offset": next_offset
+    }
+
+startup.record("import", time.perf_counter() - IMPORT_STARTED)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8080, log_level="info")
\ No newline at end of file
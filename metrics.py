@@ -0,0 +1,241 @@
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Sequence, Tuple
+
+# 秒；涵蓋 1ms 的記憶體操作到數秒的 Discord 呼叫
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def header(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def lines(self) -> Iterable[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> [各 bucket 的次數 (非累計)..., sum, count]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def lines(self) -> Iterable[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets, values):
+                cumulative += n
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, key)} {values[-2]:.6f}"
+            yield f"{self.name}_count{_labels(self.label_names, key)} {values[-1]}"
+
+
+class CallbackMetric(_Metric):
+    """
+    輸出時才呼叫 fn 取值的 gauge / counter，用來匯出各元件已有的統計 (outbox、寫入者、快取...)。
+    沒有 labels 時 fn 回傳數值；有 labels 時回傳 {(label 值, ...): 數值}。值為 None 的略過。
+    """
+
+    def __init__(self, name: str, help_text: str, fn: Callable, labels: Sequence[str] = (), kind: str = "gauge"):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+        self.kind = kind
+
+    def lines(self) -> Iterable[str]:
+        value = self.fn()
+        items = value.items() if self.label_names else [((), value)]
+        for key, v in sorted(items, key=lambda item: item[0]):
+            if v is not None:
+                yield f"{self.name}{_labels(self.label_names, key)} {_number(float(v))}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name: str, help_text: str, fn: Callable, labels: Sequence[str] = (),
+              kind: str = "gauge") -> CallbackMetric:
+        """註冊 (或替換) 取值函式；重新載入時以新的 fn 取代舊的。"""
+        metric = CallbackMetric(name, help_text, fn, labels, kind)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)。"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        out = []
+        for metric in metrics:
+            try:
+                lines = list(metric.lines())
+            except Exception as e:
+                # 單一指標取值失敗不影響其他指標
+                out.append(f"# {metric.name} 取值失敗: {e!r}")
+                continue
+            out.extend(metric.header())
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+def timed(histogram: Histogram, **labels):
+    """量測函式 (同步或 async) 的執行時間，例外也會記錄。"""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with histogram.time(**labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class HttpMetricsMiddleware:
+    """
+    ASGI middleware：每個 HTTP 請求的耗時 (含回應內容送完) 依 method / 路由樣板 / 狀態碼記入 histogram。
+    以路由樣板 (例如 /api/gamer/{gamer_id}) 而非實際路徑分類，避免 label 數量無限增加。
+    """
+
+    def __init__(self, app, histogram: Histogram, skip: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.histogram = histogram
+        self.skip = skip
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.skip:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            self.histogram.observe(
+                time.perf_counter() - started,
+                method=scope.get("method", ""),
+                route=getattr(route, "path", "unmatched"),
+                status=status[0]
+            )
+
+
+###############################
+# 預設 registry 與共用指標 (main.py、render_cache 與 cogs 共用)
+###############################
+REGISTRY = Registry()
+
+HTTP_SECONDS = REGISTRY.histogram(
+    "ra_http_request_seconds", "HTTP 請求耗時", ("method", "route", "status"))
+PERSIST_SECONDS = REGISTRY.histogram(
+    "ra_persist_seconds", "載入 (load_data) / 背景存檔 (每批寫出) 耗時", ("op",))
+RENDER_SECONDS = REGISTRY.histogram(
+    "ra_template_render_seconds", "Jinja2 模板渲染耗時", ("template",))
+CALLBACK_SECONDS = REGISTRY.histogram(
+    "ra_discord_callback_seconds", "Discord 互動 callback 耗時", ("callback",))
+COMMAND_SECONDS = REGISTRY.histogram(
+    "ra_writer_command_seconds", "寫入指令的排隊 (wait) 與執行 (run) 時間", ("command", "phase"))
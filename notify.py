@@ -0,0 +1,337 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Optional
+
+# Discord 單則訊息長度上限；合併私訊時不可超過
+MAX_MESSAGE_LENGTH = 2000
+# 這些狀態碼重試也不會成功 (例如對方關閉私訊 403)，直接放棄
+PERMANENT_STATUS = (400, 401, 403, 404)
+
+log = logging.getLogger(__name__)
+
+
+class OutboxMessage:
+    def __init__(self, msg_id: int, kind: str, route: str, payload: dict, merge: Optional[str] = None,
+                 attempts: int = 0, created: Optional[float] = None, not_before: float = 0.0):
+        self.msg_id = msg_id
+        self.kind = kind
+        self.route = route
+        self.payload = payload
+        self.merge = merge
+        self.attempts = attempts
+        self.created = created or time.time()
+        # 重試時間 (time.time())，0 代表可立即送出
+        self.not_before = not_before
+        self.sending = False
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.msg_id,
+            "kind": self.kind,
+            "route": self.route,
+            "payload": self.payload,
+            "merge": self.merge,
+            "attempts": self.attempts,
+            "created": self.created,
+            "not_before": self.not_before
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "OutboxMessage":
+        return cls(d["id"], d["kind"], d["route"], d["payload"], d.get("merge"),
+                   d.get("attempts", 0), d.get("created"), d.get("not_before", 0.0))
+
+
+class Outbox:
+    """
+    所有對 Discord 的私訊 / 頻道訊息都排入這個 outbox，由背景工作送出，呼叫端不需等待。
+
+    - route (例如 "dm:<user_id>"、"channel:<channel_id>")：同一 route 同時最多 route_limit 則在送出中，
+      某位玩家的私訊卡住不會影響其他人；全域另以 token bucket 限速並限制同時送出數 (workers)。
+    - 失敗時依例外判斷：429 依 retry_after 等待；400/401/403/404 直接放棄；
+      其餘以指數退避 + jitter 重試，最多 max_attempts 次。
+    - 尚未送出 / 等待重試的訊息會寫入 path (JSON)，重啟後繼續送出。
+    - 同一 route 尚未送出的私訊可合併 (merge="append")；選單等重複項目可略過 (merge="dedupe")。
+
+    訊息內容 (payload) 必須能轉成 JSON；實際送出由 register(kind, handler) 註冊的 handler(payload) 負責。
+    put() 可在任何執行緒呼叫。
+    """
+
+    def __init__(self, path: Optional[str] = None, rate: float = 5.0, burst: int = 5, workers: int = 4,
+                 route_limit: int = 1, max_attempts: int = 8, base_delay: float = 2.0, max_delay: float = 300.0,
+                 send_timeout: float = 30.0):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.workers = workers
+        self.route_limit = route_limit
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.send_timeout = send_timeout
+        self._handlers: Dict[str, Callable[[dict], Awaitable]] = {}
+        self._messages: Dict[int, OutboxMessage] = {}
+        self._ready: "OrderedDict[str, deque]" = OrderedDict()
+        self._delayed = []
+        self._inflight: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # start() 之前 put() 直接在呼叫端執行緒排入 (寫入者、啟動流程等可能同時呼叫)，以此鎖保護
+        self._put_lock = threading.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks = []
+        self._dirty = False
+        self._latencies = deque(maxlen=1000)
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+        self.merged = 0
+        self._load()
+
+    ###############################
+    # 註冊 / 排入
+    ###############################
+    def register(self, kind: str, handler: Callable[[dict], Awaitable]):
+        self._handlers[kind] = handler
+
+    def put(self, kind: str, payload: dict, route: str, merge: Optional[str] = None):
+        with self._put_lock:
+            if self._loop is None:
+                self._enqueue(kind, payload, route, merge)
+                return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._enqueue(kind, payload, route, merge)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, kind, payload, route, merge)
+
+    def _enqueue(self, kind: str, payload: dict, route: str, merge: Optional[str]):
+        queue = self._ready.get(route)
+        if merge and queue:
+            last = queue[-1]
+            if last.kind == kind and last.merge == merge and not last.sending:
+                if merge == "dedupe" and last.payload == payload:
+                    self.merged += 1
+                    return
+                if merge == "append":
+                    content = last.payload["content"] + "\n\n" + payload["content"]
+                    if len(content) <= MAX_MESSAGE_LENGTH:
+                        last.payload["content"] = content
+                        self.merged += 1
+                        self._changed()
+                        return
+        msg = OutboxMessage(next(self._ids), kind, route, payload, merge)
+        self._messages[msg.msg_id] = msg
+        self._schedule(msg)
+        self._changed()
+
+    def _schedule(self, msg: OutboxMessage):
+        if msg.not_before > time.time():
+            heapq.heappush(self._delayed, (msg.not_before, msg.msg_id))
+        else:
+            self._ready.setdefault(msg.route, deque()).append(msg)
+        if self._wake is not None:
+            self._wake.set()
+
+    def _changed(self):
+        self._dirty = True
+        if self._wake is not None:
+            self._wake.set()
+
+    ###############################
+    # 啟動 / 停止
+    ###############################
+    def start(self, wait_ready: Optional[Callable[[], Awaitable]] = None):
+        """在 event loop 內呼叫；wait_ready (例如 bot.wait_until_ready) 完成後才開始送出。"""
+        # 持有鎖設定 _loop：之後的 put() 一律交給 event loop，不會與送出工作同時修改佇列
+        with self._put_lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.workers)
+            self._tasks = [
+                self._loop.create_task(self._dispatch(wait_ready)),
+                self._loop.create_task(self._persist_loop())
+            ]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._save()
+
+    ###############################
+    # 送出
+    ###############################
+    async def _acquire_token(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def _next_ready(self) -> Optional[OutboxMessage]:
+        now = time.time()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, msg_id = heapq.heappop(self._delayed)
+            msg = self._messages.get(msg_id)
+            if msg is not None:
+                self._ready.setdefault(msg.route, deque()).append(msg)
+        # 依 route 輪流取出，已達同時送出上限的 route 先跳過
+        for route in list(self._ready):
+            if self._inflight.get(route, 0) >= self.route_limit:
+                continue
+            queue = self._ready[route]
+            msg = queue.popleft()
+            if queue:
+                self._ready.move_to_end(route)
+            else:
+                del self._ready[route]
+            return msg
+        return None
+
+    async def _dispatch(self, wait_ready):
+        if wait_ready is not None:
+            await wait_ready()
+        while True:
+            msg = self._next_ready()
+            if msg is None:
+                timeout = max(self._delayed[0][0] - time.time(), 0) if self._delayed else None
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._acquire_token()
+            await self._slots.acquire()
+            msg.sending = True
+            self._inflight[msg.route] = self._inflight.get(msg.route, 0) + 1
+            self._loop.create_task(self._deliver(msg))
+
+    async def _deliver(self, msg: OutboxMessage):
+        try:
+            handler = self._handlers.get(msg.kind)
+            if handler is None:
+                raise LookupError(f"沒有註冊 {msg.kind} 的 handler")
+            await asyncio.wait_for(handler(msg.payload), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._failed(msg, e)
+        else:
+            self.sent += 1
+            self._latencies.append(time.time() - msg.created)
+            del self._messages[msg.msg_id]
+        finally:
+            msg.sending = False
+            self._inflight[msg.route] -= 1
+            if not self._inflight[msg.route]:
+                del self._inflight[msg.route]
+            self._slots.release()
+            self._changed()
+
+    def _failed(self, msg: OutboxMessage, error: Exception):
+        msg.attempts += 1
+        status = getattr(error, "status", None)
+        if msg.kind not in self._handlers or status in PERMANENT_STATUS or msg.attempts >= self.max_attempts:
+            self.dropped += 1
+            del self._messages[msg.msg_id]
+            log.error("outbox 放棄送出 %s (%s)，已嘗試 %d 次: %r", msg.kind, msg.route, msg.attempts, error)
+            return
+        retry_after = getattr(error, "retry_after", None)
+        if status == 429 and retry_after:
+            delay = float(retry_after)
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** (msg.attempts - 1))
+            delay *= random.uniform(0.5, 1.5)
+        msg.not_before = time.time() + delay
+        self.retried += 1
+        # 非逾時 / HTTP 錯誤的例外附上 traceback
+        unexpected = not isinstance(error, asyncio.TimeoutError) and status is None
+        log.warning("outbox 送出 %s (%s) 失敗，%.1f 秒後重試: %r", msg.kind, msg.route, delay, error,
+                    exc_info=error if unexpected else None)
+        self._schedule(msg)
+
+    ###############################
+    # 保存
+    ###############################
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning("無法讀取 %s，略過未送出的訊息: %s", self.path, e)
+            return
+        for rec in records:
+            msg = OutboxMessage.from_dict(rec)
+            self._messages[msg.msg_id] = msg
+            self._schedule(msg)
+        self._ids = itertools.count(max(self._messages, default=0) + 1)
+        if self._messages:
+            log.info("outbox 載入 %d 則未送出的訊息", len(self._messages))
+
+    def _save(self):
+        if not self.path:
+            return
+        self._dirty = False
+        # 送出中的訊息也一併保存：若送出途中當機，重啟後會再送一次
+        records = [msg.to_dict() for msg in self._messages.values()]
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(records, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self._dirty = True
+            log.error("無法寫入 %s: %s", self.path, e)
+
+    async def _persist_loop(self, interval: float = 1.0):
+        while True:
+            await asyncio.sleep(interval)
+            if self._dirty:
+                self._save()
+
+    ###############################
+    # 統計
+    ###############################
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 3) if latencies else None
+
+        return {
+            "depth": len(self._messages),
+            "ready": sum(len(q) for q in self._ready.values()),
+            "delayed": len(self._delayed),
+            "inflight": sum(self._inflight.values()),
+            "routes": len(self._ready),
+            "sent": self.sent,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "merged": self.merged,
+            "latency_p50": pct(0.5),
+            "latency_p95": pct(0.95),
+            "latency_max": round(latencies[-1], 3) if latencies else None
+        }
@@ -0,0 +1,82 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+from fastapi.templating import Jinja2Templates
+
+from metrics import RENDER_SECONDS
+from storage.versions import EntityVersions
+
+
+class RenderCache:
+    """
+    已渲染頁面的快取。每頁宣告它依賴的資料 (collection, key)，
+    ETag 由這些資料的版本號算出：
+    - 瀏覽器帶的 If-None-Match 與目前 ETag 相同 -> 直接回 304，不組資料也不渲染
+    - 快取中已有相同 ETag 的 HTML -> 直接回傳
+    - 否則才呼叫 build_context() 並渲染
+    """
+
+    def __init__(self, templates: Jinja2Templates, max_entries: int = 512):
+        self.templates = templates
+        self.max_entries = max_entries
+        self.versions: Optional[EntityVersions] = None
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def bind(self, versions: EntityVersions):
+        """load_data() 建立儲存層後呼叫；換了儲存層就清空快取。"""
+        with self._lock:
+            self.versions = versions
+            self._pages.clear()
+
+    def etag(self, page_key: tuple, deps: Iterable[Tuple[str, object]]) -> str:
+        state = repr((page_key, [(c, k, self.versions.get(c, k)) for c, k in deps]))
+        digest = hashlib.blake2s(state.encode("utf-8"), digest_size=8).hexdigest()
+        return f'"{self.versions.epoch}-{digest}"'
+
+    def render(self, request: Request, page_key: tuple, deps: Iterable[Tuple[str, object]],
+               template_name: str, build_context: Callable[[], dict]) -> Response:
+        deps = list(deps)
+        etag = self.etag(page_key, deps)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in _parse_if_none_match(request.headers.get("if-none-match")):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        with self._lock:
+            cached = self._pages.get(page_key)
+            if cached and cached[0] == etag:
+                self._pages.move_to_end(page_key)
+                self.hits += 1
+                return HTMLResponse(cached[1], headers=headers)
+
+        self.misses += 1
+        context = build_context()
+        context["request"] = request
+        with RENDER_SECONDS.time(template=template_name):
+            html = self.templates.get_template(template_name).render(context)
+        with self._lock:
+            self._pages[page_key] = (etag, html)
+            self._pages.move_to_end(page_key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return HTMLResponse(html, headers=headers)
+
+
+def _parse_if_none_match(value: Optional[str]) -> set:
+    if not value:
+        return set()
+    tags = set()
+    for part in value.split(","):
+        part = part.strip()
+        if part.startswith("W/"):
+            part = part[2:]
+        tags.add(part)
+    return tags
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class StartupPhases:
+    """
+    啟動流程的狀態：各階段 (import、載入資料、啟動背景服務、載入 cogs...) 的耗時，
+    以及資料是否已載入完成 (ready)。HTTP 伺服器不等資料載入就開始接受連線，
+    ready 之前需要資料的請求由 ReadinessGate 等待或回 503。
+    """
+
+    def __init__(self, started: Optional[float] = None):
+        # time.perf_counter() 的起點 (預設為建立時)；ready_after 由此起算
+        self.started = time.perf_counter() if started is None else started
+        self.phases: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+        self.error: Optional[str] = None
+        # ready 或失敗時 set (Python 3.10 起 asyncio.Event 可在 event loop 外建立)
+        self._done = asyncio.Event()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = round(seconds, 4)
+        log.info("啟動階段 %s: %.3f 秒", name, seconds)
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_after is not None
+
+    def set_ready(self):
+        self.ready_after = round(time.perf_counter() - self.started, 4)
+        self._done.set()
+        log.info("資料已載入，開始處理請求 (啟動後 %.3f 秒)", self.ready_after)
+
+    def set_failed(self, error: BaseException):
+        self.error = repr(error)
+        self._done.set()
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """等到 ready (回傳 True)；逾時或啟動失敗回傳 False。"""
+        if not self._done.is_set():
+            try:
+                await asyncio.wait_for(self._done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.ready
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "ready_after_seconds": self.ready_after,
+            "phases": dict(self.phases)
+        }
+
+
+class ReadinessGate:
+    """
+    ASGI middleware：資料載入完成前，請求最多等待 wait 秒，仍未完成 (或載入失敗) 時回 503 與 Retry-After。
+    allow 中的路徑 (健康檢查、metrics) 不需等待。
+    """
+
+    def __init__(self, app, startup: StartupPhases, wait: float = 10.0,
+                 allow: Tuple[str, ...] = ("/healthz", "/readyz", "/metrics"), retry_after: int = 5):
+        self.app = app
+        self.startup = startup
+        self.wait = wait
+        self.allow = allow
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.startup.ready or scope.get("path") in self.allow:
+            await self.app(scope, receive, send)
+            return
+        if await self.startup.wait_ready(self.wait):
+            await self.app(scope, receive, send)
+            return
+        detail = "啟動失敗，請查看日誌" if self.startup.error else "啟動中，資料尚未載入完成"
+        body = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.retry_after).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
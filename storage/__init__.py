@@ -0,0 +1,46 @@
+import logging
+import os
+
+from storage.journal import Journal, DELETED, COLLECTIONS
+from storage.scheduler import PersistScheduler
+from storage.base import Store, new_gamer
+from storage.card_index import CardIndex, DuplicateCardError
+from storage.event_model import Event, new_event
+from storage.leaderboard import Leaderboard, credit_points, total_points
+from storage.versions import EntityVersions
+from storage.writer import StateWriter
+from storage.json_store import JsonStore
+from storage.sqlite_store import SqliteStore
+
+log = logging.getLogger(__name__)
+
+
+def open_store(backend: str, data_file_path: str, sqlite_path: str, **json_options) -> Store:
+    """
+    依 STORAGE_BACKEND 建立儲存層並載入資料。
+    第一次切換到 sqlite 時，若資料庫為空且 data.json 存在，會自動匯入。
+    """
+    backend = (backend or "json").lower()
+    if backend == "json":
+        store = JsonStore(data_file_path, **json_options)
+        store.load()
+        return store
+    if backend == "sqlite":
+        store = SqliteStore(sqlite_path)
+        store.load()
+        if store.is_empty() and os.path.exists(data_file_path):
+            legacy = JsonStore(data_file_path, **json_options)
+            legacy.load()
+            store.import_state(legacy.export_state())
+            legacy.close()
+            log.info("已將 %s 匯入 %s", data_file_path, sqlite_path)
+        return store
+    raise ValueError(f"未知的 STORAGE_BACKEND: {backend}")
+
+
+__all__ = [
+    "Journal", "DELETED", "COLLECTIONS", "PersistScheduler",
+    "Store", "new_gamer", "CardIndex", "DuplicateCardError",
+    "Event", "new_event", "Leaderboard", "credit_points", "total_points", "EntityVersions", "StateWriter",
+    "JsonStore", "SqliteStore", "open_store"
+]
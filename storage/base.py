@@ -0,0 +1,268 @@
+import logging
+from contextlib import nullcontext
+from typing import Iterator, List, Optional, Tuple
+
+from storage.card_index import DuplicateCardError
+from storage.event_model import Event
+
+log = logging.getLogger(__name__)
+
+
+def new_gamer(gamer_id: int, card_number: Optional[str] = None) -> dict:
+    """建立預設的玩家資料 (所有建立玩家的地方共用)。"""
+    return {
+        "gamer_id": gamer_id,
+        "gamer_card_number": card_number,
+        "gamer_is_blocked": False,
+        "gamer_bind_gamepass": None,
+        "joined_events": [],
+        "history_event_list": [],
+        "history_event_pts_list": [],
+        "events_points": {},
+        "joined_event_timestamps": {},
+        "redeemed_prizes": {},
+        "total_points": 0
+    }
+
+
+def gamer_matches(gamer: dict, blocked: Optional[bool] = None, event_code: Optional[str] = None,
+                  has_card: Optional[bool] = None) -> bool:
+    """query_gamers 的篩選條件；None 代表不篩選。"""
+    if blocked is not None and bool(gamer.get("gamer_is_blocked")) != blocked:
+        return False
+    if has_card is not None and bool(gamer.get("gamer_card_number")) != has_card:
+        return False
+    if event_code is not None and event_code not in gamer.get("joined_events", []):
+        return False
+    return True
+
+
+GAMER_SORTS = ("gamer_id", "card", "points")
+
+
+def page_slice(seq, offset: int, limit: int, desc: bool = False) -> list:
+    """由 seq 取出排序後的一頁；desc 時從尾端往前取，不複製整個 seq。"""
+    if not desc:
+        return list(seq[offset:offset + limit])
+    end = len(seq) - offset
+    if end <= 0:
+        return []
+    return list(seq[max(end - limit, 0):end])[::-1]
+
+
+class Store:
+    """
+    玩家 / 活動 / 圖片 的資料存取介面。
+
+    取得的 dict 與 data.json 中的格式相同；修改後必須呼叫對應的 save_*() 才會寫入。
+    JsonStore 回傳的是記憶體中的同一個物件 (設定 writer 後，寫入者執行緒取得的是複本)，
+    SqliteStore 則每次組出新的 dict。
+    修改資料一律經由 StateWriter (storage.writer) 以單一寫入者執行。
+    每次 save_* / delete_* 都會遞增 self.versions (EntityVersions) 中對應的版本號；
+    self.timelines (TimelineIndex) 依版本號增量維護每位玩家的時間軸；
+    self.capabilities (CapabilityIndex) 由 save_* / delete_* 增量維護功能選單用的旗標；
+    self.pending_images (PendingImageIndex) 為待審核圖片的 image_id 索引；
+    self.image_phashes (PerceptualHashIndex) 為圖片感知 hash 的相似查詢索引。
+    """
+
+    ###############################
+    # 生命週期
+    ###############################
+    def load(self):
+        raise NotImplementedError
+
+    def start(self):
+        """啟動背景工作 (若有)。"""
+
+    def flush(self):
+        """把尚未寫出的變動寫入磁碟。"""
+
+    def close(self):
+        self.flush()
+
+    def persist_stats(self) -> dict:
+        """背景寫入的狀態 (metrics 用)：pending 為尚未寫入磁碟的變動數。"""
+        return {"pending": 0}
+
+    def batch(self):
+        """
+        with store.batch(): ... 區塊內的多筆 save_* 全有或全無：丟出例外時全部回復。
+        SQLite 合併為一次交易；JsonStore 回復記憶體中的資料 (見 JsonStore.batch)。
+        預設不支援回復，子類別須覆寫。
+        """
+        return nullcontext()
+
+    ###############################
+    # Gamer
+    ###############################
+    def get_gamer(self, gamer_id: int) -> Optional[dict]:
+        raise NotImplementedError
+
+    def has_gamer(self, gamer_id: int) -> bool:
+        return self.get_gamer(gamer_id) is not None
+
+    def save_gamer(self, gamer: dict):
+        """卡號已被其他玩家使用時丟出 DuplicateCardError。"""
+        raise NotImplementedError
+
+    def delete_gamer(self, gamer_id: int):
+        raise NotImplementedError
+
+    def count_gamers(self) -> int:
+        raise NotImplementedError
+
+    def iter_gamers(self) -> Iterator[dict]:
+        raise NotImplementedError
+
+    def list_gamers(self, offset: int = 0, limit: int = 50) -> List[dict]:
+        raise NotImplementedError
+
+    def page_gamers(self, sort: str = "gamer_id", desc: bool = False, offset: int = 0, limit: int = 50) -> List[dict]:
+        """
+        依 sort 排序後的一頁玩家。sort 可為 gamer_id / card / points (total_points)；
+        依卡號排序時，沒有卡號的玩家一律排在最後 (依 gamer_id)。
+        """
+        raise NotImplementedError
+
+    def query_gamers(self, after: Optional[int] = None, blocked: Optional[bool] = None,
+                     event_code: Optional[str] = None, has_card: Optional[bool] = None) -> Iterator[dict]:
+        """
+        依 gamer_id 由小到大逐筆產生符合條件的玩家 (見 gamer_matches)，
+        after 為上一頁最後一位的 gamer_id (cursor 分頁)。
+        """
+        raise NotImplementedError
+
+    def find_gamer_by_card(self, card_number: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def gamers_with_event(self, event_code: str) -> List[int]:
+        """仍有 event_code 相關紀錄的玩家 ID (見 event_refs.event_refs)。"""
+        raise NotImplementedError
+
+    def leaderboard(self, event_code: Optional[str] = None, offset: int = 0, limit: int = 10) -> List[Tuple[int, int, int]]:
+        """
+        [(名次, gamer_id, 點數), ...]，依點數由高到低。
+        event_code 為 None 時為全域排行榜 (total_points)，否則為該活動的 events_points。
+        """
+        raise NotImplementedError
+
+    def gamer_rank(self, gamer_id: int, event_code: Optional[str] = None) -> Optional[Tuple[int, int, int]]:
+        """(名次, 點數, 榜上人數)，不在榜上則為 None。"""
+        raise NotImplementedError
+
+    def search_gamers_by_card(self, keyword: str, prefix: bool = False, limit: Optional[int] = None) -> List[dict]:
+        """
+        卡號包含 keyword (prefix=True 時為開頭是 keyword) 的玩家，不分大小寫、依卡號排序。
+        keyword 為空時回傳全部玩家；limit 為回傳筆數上限。
+        """
+        raise NotImplementedError
+
+    ###############################
+    # Event
+    ###############################
+    def get_event(self, event_code: str) -> Optional[Event]:
+        raise NotImplementedError
+
+    def has_event(self, event_code: str) -> bool:
+        return self.get_event(event_code) is not None
+
+    def event_cleanup_pending(self, event_code: str) -> bool:
+        """
+        活動已刪除但仍有玩家留有其紀錄 (背景清除尚未完成或被取消)。
+        此時不可重新建立同一編號，否則清除會連新活動的紀錄一併移除。
+        """
+        return not self.has_event(event_code) and bool(self.gamers_with_event(event_code))
+
+    def save_event(self, event: dict):
+        raise NotImplementedError
+
+    def delete_event(self, event_code: str):
+        raise NotImplementedError
+
+    def clear_events(self):
+        raise NotImplementedError
+
+    def iter_events(self) -> Iterator[dict]:
+        raise NotImplementedError
+
+    def events_dict(self) -> dict:
+        """{event_code: event}，活動數量少，供模板一次使用。"""
+        return {ev["event_code"]: ev for ev in self.iter_events()}
+
+    ###############################
+    # 圖片
+    ###############################
+    def get_images(self, user_id: int) -> list:
+        raise NotImplementedError
+
+    def save_images(self, user_id: int, images: list):
+        raise NotImplementedError
+
+    def iter_images(self) -> Iterator[Tuple[int, list]]:
+        raise NotImplementedError
+
+    def get_image(self, user_id: int, seq: int) -> Optional[dict]:
+        """使用者圖片清單中的第 seq 張。"""
+        raise NotImplementedError
+
+    def update_image(self, user_id: int, seq: int, image: dict):
+        """只寫回單張圖片 (審核時使用，不必重寫整個清單)。"""
+        raise NotImplementedError
+
+    def images_with_hash(self, content_hash: str) -> List[Tuple[int, dict]]:
+        """內容 hash (sha256) 相同的圖片 [(user_id, 圖片), ...]，用來偵測重複上傳。"""
+        raise NotImplementedError
+
+    def task_images(self, event_code: str, task_id: int) -> List[Tuple[int, dict]]:
+        """某任務所有上傳的圖片 [(user_id, 圖片), ...]。"""
+        raise NotImplementedError
+
+    def similar_images(self, phash: str, max_distance: int) -> List[Tuple[int, int, dict]]:
+        """感知 hash 差異 <= max_distance 的圖片 [(距離, user_id, 圖片), ...]，由近到遠。"""
+        found = []
+        for distance, user_id, seq in self.image_phashes.near(phash, max_distance):
+            image = self.get_image(user_id, seq)
+            if image is not None:
+                found.append((distance, user_id, image))
+        return found
+
+    def find_image(self, image_id: str) -> Optional[Tuple[int, int, dict]]:
+        """以 image_id 取得待審核的圖片 (user_id, 序號, 圖片)；已審核或不存在時為 None。"""
+        found = self.pending_images.get(image_id)
+        if found is None:
+            return None
+        user_id, seq = found
+        image = self.get_image(user_id, seq)
+        return (user_id, seq, image) if image is not None else None
+
+    def iter_pending_images(self) -> Iterator[Tuple[str, int, dict]]:
+        """所有待審核圖片 (image_id, user_id, 圖片)。"""
+        for image_id, (user_id, seq) in self.pending_images.items():
+            image = self.get_image(user_id, seq)
+            if image is not None:
+                yield image_id, user_id, image
+
+    ###############################
+    # 匯入 / 匯出
+    ###############################
+    def export_state(self) -> dict:
+        """回傳與 data.json 相同格式的完整資料。"""
+        return {
+            "user_images": {str(uid): imgs for uid, imgs in self.iter_images()},
+            "events": self.events_dict(),
+            "gamers": {str(g["gamer_id"]): g for g in self.iter_gamers()}
+        }
+
+    def import_state(self, state: dict):
+        for uid, imgs in state.get("user_images", {}).items():
+            self.save_images(int(uid), imgs)
+        for ev in state.get("events", {}).values():
+            self.save_event(ev)
+        for gid, g in state.get("gamers", {}).items():
+            g["gamer_id"] = int(gid)
+            try:
+                self.save_gamer(g)
+            except DuplicateCardError as e:
+                log.warning("匯入時%s，玩家 %s 的卡號已清除", e, gid)
+                g["gamer_card_number"] = None
+                self.save_gamer(g)
@@ -0,0 +1,129 @@
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from storage.timeline import IMAGE_STAMPS
+
+
+class Capabilities:
+    """
+    單一玩家的功能旗標，功能選單只看這些旗標決定要顯示哪些選項。
+    redeemable 為已參加且有獎品的活動數量。
+    """
+    __slots__ = ("exists", "has_card", "joined", "has_records", "has_image_stamps", "redeemable")
+
+    def __init__(self):
+        self.exists = False
+        self.has_card = False
+        self.joined = frozenset()
+        self.has_records = False
+        self.has_image_stamps = False
+        self.redeemable = 0
+
+    @property
+    def has_joined_events(self) -> bool:
+        return bool(self.joined)
+
+    @property
+    def has_history(self) -> bool:
+        """點數紀錄 / 加入活動時間 / 圖片時間 任一存在 (即「查詢歷史紀錄」有東西可看)。"""
+        return self.has_records or self.has_image_stamps
+
+    @property
+    def has_redeemable_event(self) -> bool:
+        return self.redeemable > 0
+
+
+def _has_image_stamps(images: list) -> bool:
+    return any(img.get(field) for img in images for field, _ in IMAGE_STAMPS)
+
+
+class CapabilityIndex:
+    """
+    各玩家的 Capabilities 快取。第一次查詢時由玩家資料算出，
+    之後由儲存層的 save_* / delete_* 呼叫 gamer_saved() 等方法增量更新，
+    查詢不必再掃描點數紀錄或圖片清單。
+    另外維護「有獎品的活動」集合；活動的獎品從無到有 (或相反) 時，
+    只調整快取中有參加該活動的玩家。
+    """
+
+    def __init__(self, store, max_gamers: int = 10000):
+        self.store = store
+        self.max_gamers = max_gamers
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._prized = set()
+
+    def reset(self, prized_codes: Iterable[str]):
+        """load() 時呼叫：清空快取並設定目前有獎品的活動。"""
+        with self._lock:
+            self._entries.clear()
+            self._prized = set(prized_codes)
+
+    def get(self, gamer_id: int) -> Capabilities:
+        with self._lock:
+            caps = self._entries.get(gamer_id)
+            if caps is None:
+                caps = Capabilities()
+                self._apply_gamer(caps, self.store.get_gamer(gamer_id))
+                caps.has_image_stamps = _has_image_stamps(self.store.get_images(gamer_id))
+                self._entries[gamer_id] = caps
+                while len(self._entries) > self.max_gamers:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(gamer_id)
+            return caps
+
+    def _apply_gamer(self, caps: Capabilities, gamer: Optional[dict]):
+        # 呼叫端需持有 self._lock
+        gamer = gamer or {}
+        caps.exists = bool(gamer)
+        caps.has_card = bool(gamer.get("gamer_card_number"))
+        caps.joined = frozenset(gamer.get("joined_events", []))
+        caps.has_records = bool(gamer.get("points_history") or gamer.get("joined_event_timestamps"))
+        caps.redeemable = len(caps.joined & self._prized)
+
+    ###############################
+    # 由儲存層呼叫
+    ###############################
+    def gamer_saved(self, gamer: dict):
+        with self._lock:
+            caps = self._entries.get(gamer["gamer_id"])
+            if caps is not None:
+                self._apply_gamer(caps, gamer)
+
+    def gamer_deleted(self, gamer_id: int):
+        with self._lock:
+            caps = self._entries.get(gamer_id)
+            if caps is not None:
+                self._apply_gamer(caps, None)
+
+    def images_saved(self, user_id: int, images: list):
+        with self._lock:
+            caps = self._entries.get(user_id)
+            if caps is not None:
+                caps.has_image_stamps = _has_image_stamps(images)
+
+    def image_saved(self, user_id: int, image: dict):
+        with self._lock:
+            caps = self._entries.get(user_id)
+            if caps is not None and not caps.has_image_stamps:
+                caps.has_image_stamps = _has_image_stamps([image])
+
+    def event_saved(self, event: dict):
+        self._set_prized(event["event_code"], bool(event.get("prizes")))
+
+    def event_deleted(self, event_code: str):
+        self._set_prized(event_code, False)
+
+    def _set_prized(self, event_code: str, prized: bool):
+        with self._lock:
+            if (event_code in self._prized) == prized:
+                return
+            if prized:
+                self._prized.add(event_code)
+            else:
+                self._prized.discard(event_code)
+            delta = 1 if prized else -1
+            for caps in self._entries.values():
+                if event_code in caps.joined:
+                    caps.redeemable += delta
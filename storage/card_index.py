@@ -0,0 +1,115 @@
+import bisect
+from typing import Dict, List, Optional, Set
+
+# 卡號固定 8 碼，長度 1~3 的子字串全部建索引；更長的關鍵字以 3-gram 交集後再比對
+GRAM_MAX = 3
+
+
+def card_grams(card: str) -> Set[str]:
+    """卡號(小寫)所有長度 1~GRAM_MAX 的子字串。"""
+    card = card.lower()
+    grams = set()
+    for n in range(1, GRAM_MAX + 1):
+        for i in range(len(card) - n + 1):
+            grams.add(card[i:i + n])
+    return grams
+
+
+class DuplicateCardError(ValueError):
+    def __init__(self, card_number: str, owner_id: int):
+        super().__init__(f"卡號 {card_number} 已被玩家 {owner_id} 綁定")
+        self.card_number = card_number
+        self.owner_id = owner_id
+
+
+class CardIndex:
+    """
+    卡號 -> 玩家 ID 的唯一索引，並提供前綴 / 子字串查詢。
+    - 精確查詢：dict，O(1)
+    - 前綴查詢：排序後的小寫卡號清單 + bisect
+    - 子字串查詢：n-gram -> 玩家 ID 集合
+    """
+
+    def __init__(self):
+        self._by_card: Dict[str, int] = {}
+        self._by_gamer: Dict[int, str] = {}
+        self._sorted: List[tuple] = []
+        self._grams: Dict[str, Set[int]] = {}
+
+    def __len__(self):
+        return len(self._by_card)
+
+    def owner(self, card_number: str) -> Optional[int]:
+        return self._by_card.get(card_number)
+
+    def card_of(self, gamer_id: int) -> Optional[str]:
+        return self._by_gamer.get(gamer_id)
+
+    def check(self, gamer_id: int, card_number: Optional[str]):
+        """card_number 已屬於其他玩家時丟出 DuplicateCardError。"""
+        if not card_number:
+            return
+        owner = self._by_card.get(card_number)
+        if owner is not None and owner != gamer_id:
+            raise DuplicateCardError(card_number, owner)
+
+    def set(self, gamer_id: int, card_number: Optional[str]):
+        old = self._by_gamer.get(gamer_id)
+        if old == card_number:
+            return
+        self.check(gamer_id, card_number)
+        if old:
+            self._remove(gamer_id, old)
+        if card_number:
+            self._by_card[card_number] = gamer_id
+            self._by_gamer[gamer_id] = card_number
+            bisect.insort(self._sorted, (card_number.lower(), gamer_id))
+            for g in card_grams(card_number):
+                self._grams.setdefault(g, set()).add(gamer_id)
+
+    def remove(self, gamer_id: int):
+        old = self._by_gamer.get(gamer_id)
+        if old:
+            self._remove(gamer_id, old)
+
+    def _remove(self, gamer_id: int, card_number: str):
+        self._by_card.pop(card_number, None)
+        self._by_gamer.pop(gamer_id, None)
+        key = (card_number.lower(), gamer_id)
+        i = bisect.bisect_left(self._sorted, key)
+        if i < len(self._sorted) and self._sorted[i] == key:
+            self._sorted.pop(i)
+        for g in card_grams(card_number):
+            ids = self._grams.get(g)
+            if ids:
+                ids.discard(gamer_id)
+                if not ids:
+                    del self._grams[g]
+
+    def ordered(self) -> List[tuple]:
+        """依卡號 (小寫) 排序的 [(卡號, gamer_id), ...]，呼叫端不可修改。"""
+        return self._sorted
+
+    def prefix(self, keyword: str) -> List[int]:
+        kw = keyword.lower()
+        i = bisect.bisect_left(self._sorted, (kw,))
+        result = []
+        while i < len(self._sorted) and self._sorted[i][0].startswith(kw):
+            result.append(self._sorted[i][1])
+            i += 1
+        return result
+
+    def search(self, keyword: str) -> List[int]:
+        """卡號包含 keyword (不分大小寫) 的玩家 ID，依卡號排序。"""
+        kw = keyword.lower()
+        if len(kw) <= GRAM_MAX:
+            ids = self._grams.get(kw, set())
+        else:
+            candidates = None
+            for i in range(len(kw) - GRAM_MAX + 1):
+                ids = self._grams.get(kw[i:i + GRAM_MAX], set())
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+            ids = {gid for gid in candidates if kw in self._by_gamer[gid].lower()}
+        return sorted(ids, key=lambda gid: self._by_gamer[gid].lower())
@@ -0,0 +1,104 @@
+from typing import Optional
+
+
+class Event(dict):
+    """
+    活動資料。對外 (API / 模板 / data.json) 仍是原本的 dict 格式，
+    tasks / prizes 依然是保持順序的 list；另外維護 id -> 物件 的對照表，查詢為 O(1)。
+
+    新的 task_id / prize_id 由 next_task_id / next_prize_id 遞增配發，
+    刪除後不會再被重複使用 (舊版用 len(list)+1，刪除後會撞號)。
+
+    增刪 task / prize 須經由 add_* / remove_*，或整個替換 (event["tasks"] = [...])；
+    直接修改 list 本身 (append、以索引替換等) 不會更新對照表。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setdefault("tasks", [])
+        self.setdefault("prizes", [])
+        self._index_tasks()
+        self._index_prizes()
+        # 舊資料沒有配號器：從目前最大 id 接續
+        self["next_task_id"] = max(self.get("next_task_id", 1), max(self._tasks, default=0) + 1)
+        self["next_prize_id"] = max(self.get("next_prize_id", 1), max(self._prizes, default=0) + 1)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if key == "tasks":
+            self._index_tasks()
+        elif key == "prizes":
+            self._index_prizes()
+
+    def _index_tasks(self):
+        self._tasks = {t["task_id"]: t for t in self["tasks"]}
+
+    def _index_prizes(self):
+        self._prizes = {p["prize_id"]: p for p in self["prizes"]}
+
+    ###############################
+    # Task
+    ###############################
+    def task(self, task_id: int) -> Optional[dict]:
+        return self._tasks.get(task_id)
+
+    def add_task(self, task_name: str, task_description: str = "", task_points: int = 0) -> dict:
+        task = {
+            "task_id": self["next_task_id"],
+            "task_name": task_name,
+            "task_description": task_description,
+            "task_points": task_points,
+            "assigned_users": [],
+            "checked_users": []
+        }
+        self["next_task_id"] += 1
+        self["tasks"].append(task)
+        self._tasks[task["task_id"]] = task
+        return task
+
+    def remove_task(self, task_id: int) -> Optional[dict]:
+        task = self.task(task_id)
+        if task is not None:
+            self["tasks"][:] = [t for t in self["tasks"] if t is not task]
+            del self._tasks[task_id]
+        return task
+
+    ###############################
+    # Prize
+    ###############################
+    def prize(self, prize_id: int) -> Optional[dict]:
+        return self._prizes.get(prize_id)
+
+    def add_prize(self, prize_name: str, points_required: int = 0) -> dict:
+        prize = {
+            "prize_id": self["next_prize_id"],
+            "prize_name": prize_name,
+            "points_required": points_required
+        }
+        self["next_prize_id"] += 1
+        self["prizes"].append(prize)
+        self._prizes[prize["prize_id"]] = prize
+        return prize
+
+    def remove_prize(self, prize_id: int) -> Optional[dict]:
+        prize = self.prize(prize_id)
+        if prize is not None:
+            self["prizes"][:] = [p for p in self["prizes"] if p is not prize]
+            del self._prizes[prize_id]
+        return prize
+
+
+def new_event(event_code: str, event_name: str, event_description: str,
+              event_start_date: str, event_end_date: str) -> Event:
+    """建立預設的活動資料 (所有建立活動的地方共用)。"""
+    return Event({
+        "event_code": event_code,
+        "event_name": event_name,
+        "event_description": event_description,
+        "event_start_date": event_start_date,
+        "event_end_date": event_end_date,
+        "gamer_list": [],
+        "tasks": [],
+        "max_points": 0,
+        "prizes": []
+    })
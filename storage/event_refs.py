@@ -0,0 +1,65 @@
+from typing import Dict, List, Set
+
+
+def event_refs(gamer: dict) -> Set[str]:
+    """玩家資料中所有會被「刪除活動」連帶清除的 event_code。"""
+    refs = set(gamer.get("joined_events", []))
+    refs.update(gamer.get("events_points", {}))
+    refs.update(gamer.get("redeemed_prizes", {}))
+    refs.update(gamer.get("joined_event_timestamps", {}))
+    refs.update(gamer.get("history_event_list", []))
+    for rec in gamer.get("points_history", []):
+        if rec.get("type") == "event" and rec.get("event_code"):
+            refs.add(rec["event_code"])
+    return refs
+
+
+def strip_event_refs(gamer: dict, event_code: str) -> bool:
+    """移除玩家資料中所有關於 event_code 的紀錄，回傳是否有變動。"""
+    changed = False
+    if event_code in gamer.get("joined_events", []):
+        gamer["joined_events"] = [ev for ev in gamer["joined_events"] if ev != event_code]
+        changed = True
+    for key in ("events_points", "redeemed_prizes", "joined_event_timestamps"):
+        if event_code in gamer.get(key, {}):
+            gamer[key].pop(event_code, None)
+            changed = True
+    if event_code in gamer.get("history_event_list", []):
+        gamer["history_event_list"] = [ev for ev in gamer["history_event_list"] if ev != event_code]
+        changed = True
+    history = gamer.get("points_history", [])
+    # 移除所有 type 為 "event" 且 event_code 為被刪除的紀錄
+    kept = [rec for rec in history if not (rec.get("type") == "event" and rec.get("event_code") == event_code)]
+    if len(kept) != len(history):
+        gamer["points_history"] = kept
+        changed = True
+    return changed
+
+
+class EventRefIndex:
+    """event_code -> 參考此活動的玩家 ID 集合 (反向索引)。"""
+
+    def __init__(self):
+        self._by_event: Dict[str, Set[int]] = {}
+        self._by_gamer: Dict[int, Set[str]] = {}
+
+    def set(self, gamer_id: int, refs: Set[str]):
+        old = self._by_gamer.get(gamer_id, set())
+        for code in old - refs:
+            ids = self._by_event.get(code)
+            if ids:
+                ids.discard(gamer_id)
+                if not ids:
+                    del self._by_event[code]
+        for code in refs - old:
+            self._by_event.setdefault(code, set()).add(gamer_id)
+        if refs:
+            self._by_gamer[gamer_id] = set(refs)
+        else:
+            self._by_gamer.pop(gamer_id, None)
+
+    def remove(self, gamer_id: int):
+        self.set(gamer_id, set())
+
+    def gamers(self, event_code: str) -> List[int]:
+        return sorted(self._by_event.get(event_code, ()))
@@ -0,0 +1,222 @@
+import itertools
+import threading
+import uuid
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+
+def new_image_id() -> str:
+    """新上傳圖片的 image_id (存在圖片資料中，審核按鈕的 custom_id 也用它)。"""
+    return uuid.uuid4().hex
+
+
+def image_id_of(user_id: int, seq: int, image: dict) -> str:
+    """圖片的 image_id；舊資料沒有 image_id 時以 "使用者-序號" 代替 (圖片清單只會往後附加)。"""
+    return image.get("image_id") or f"{user_id}-{seq}"
+
+
+def image_content_hash(image: dict) -> Optional[str]:
+    return image.get("content_hash")
+
+
+def image_task(image: dict) -> Optional[Tuple[str, int]]:
+    if image.get("event_code") is None or image.get("task_id") is None:
+        return None
+    return image["event_code"], image["task_id"]
+
+
+class PendingImageIndex:
+    """
+    待審核圖片的索引：image_id -> (user_id, 在該使用者圖片清單中的序號)。
+    審核時以 image_id 直接取得圖片，不需掃描使用者的整個圖片清單；
+    啟動時也由此重新註冊所有待審核訊息的按鈕。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[int, int]] = {}
+        self._by_user: Dict[int, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def get(self, image_id: str) -> Optional[Tuple[int, int]]:
+        return self._pending.get(image_id)
+
+    def items(self) -> Iterator[Tuple[str, Tuple[int, int]]]:
+        with self._lock:
+            return iter(list(self._pending.items()))
+
+    def set_user(self, user_id: int, images: list):
+        """以使用者目前的圖片清單重建他的待審核項目 (save_images 時呼叫)。"""
+        with self._lock:
+            for image_id in self._by_user.pop(user_id, set()):
+                self._pending.pop(image_id, None)
+            ids = set()
+            for seq, img in enumerate(images):
+                if img.get("status") == "pending":
+                    image_id = image_id_of(user_id, seq, img)
+                    self._pending[image_id] = (user_id, seq)
+                    ids.add(image_id)
+            if ids:
+                self._by_user[user_id] = ids
+
+    def set_image(self, user_id: int, seq: int, image: dict):
+        """單張圖片變動 (update_image 時呼叫)。"""
+        image_id = image_id_of(user_id, seq, image)
+        with self._lock:
+            ids = self._by_user.setdefault(user_id, set())
+            if image.get("status") == "pending":
+                self._pending[image_id] = (user_id, seq)
+                ids.add(image_id)
+            else:
+                self._pending.pop(image_id, None)
+                ids.discard(image_id)
+            if not ids:
+                del self._by_user[user_id]
+
+
+class ImageKeyIndex:
+    """
+    key(圖片) -> {(user_id, 序號)} 的索引 (JsonStore 用)，key 為 None 的圖片不列入。
+    例如內容 hash (偵測重複上傳)、(活動, 任務) (任務頁列出上傳的圖片)。
+    """
+
+    def __init__(self, key: Callable[[dict], Optional[Hashable]]):
+        self.key = key
+        self._lock = threading.Lock()
+        self._refs: Dict[Hashable, Set[Tuple[int, int]]] = {}
+        self._keys: Dict[Tuple[int, int], Hashable] = {}
+        self._by_user: Dict[int, Set[int]] = {}
+
+    def get(self, key: Hashable) -> List[Tuple[int, int]]:
+        with self._lock:
+            return sorted(self._refs.get(key, ()))
+
+    def _add(self, ref: Tuple[int, int], image: dict):
+        key = self.key(image)
+        if key is None:
+            return
+        self._keys[ref] = key
+        self._refs.setdefault(key, set()).add(ref)
+        self._by_user.setdefault(ref[0], set()).add(ref[1])
+
+    def _remove(self, ref: Tuple[int, int]):
+        key = self._keys.pop(ref, None)
+        if key is None:
+            return
+        refs = self._refs[key]
+        refs.discard(ref)
+        if not refs:
+            del self._refs[key]
+        seqs = self._by_user[ref[0]]
+        seqs.discard(ref[1])
+        if not seqs:
+            del self._by_user[ref[0]]
+
+    def set_user(self, user_id: int, images: list):
+        with self._lock:
+            for seq in list(self._by_user.get(user_id, ())):
+                self._remove((user_id, seq))
+            for seq, img in enumerate(images):
+                self._add((user_id, seq), img)
+
+    def set_image(self, user_id: int, seq: int, image: dict):
+        with self._lock:
+            self._remove((user_id, seq))
+            self._add((user_id, seq), image)
+
+
+PHASH_BITS = 64
+
+
+def parse_phash(phash: str) -> int:
+    return int(phash, 16)
+
+
+class PerceptualHashIndex:
+    """
+    感知 hash (64-bit dHash) -> {(user_id, 序號)}，用來找出相似 (非完全相同) 的圖片。
+
+    以 multi-index hashing 查詢：hash 切成 chunks 段，各段各自建表。
+    兩個 hash 差異 (Hamming 距離) <= d 時，至少有一段的差異 <= d // chunks，
+    所以只需在每段的表中查「與查詢值差 r 個位元以內」的值，再逐一計算完整距離；
+    不必掃描全部圖片，圖片數量增加到數十萬張時查詢仍很快。
+    """
+
+    def __init__(self, chunks: int = 4):
+        self.chunks = chunks
+        self.chunk_bits = PHASH_BITS // chunks
+        self._mask = (1 << self.chunk_bits) - 1
+        self._lock = threading.Lock()
+        self._hashes: Dict[Tuple[int, int], int] = {}
+        self._tables: List[Dict[int, Set[Tuple[int, int]]]] = [{} for _ in range(chunks)]
+        self._by_user: Dict[int, Set[int]] = {}
+        self._masks: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _parts(self, value: int) -> List[int]:
+        return [(value >> (i * self.chunk_bits)) & self._mask for i in range(self.chunks)]
+
+    def _add(self, ref: Tuple[int, int], value: int):
+        self._hashes[ref] = value
+        for table, part in zip(self._tables, self._parts(value)):
+            table.setdefault(part, set()).add(ref)
+        self._by_user.setdefault(ref[0], set()).add(ref[1])
+
+    def _remove(self, ref: Tuple[int, int]):
+        value = self._hashes.pop(ref, None)
+        if value is None:
+            return
+        for table, part in zip(self._tables, self._parts(value)):
+            refs = table[part]
+            refs.discard(ref)
+            if not refs:
+                del table[part]
+        seqs = self._by_user[ref[0]]
+        seqs.discard(ref[1])
+        if not seqs:
+            del self._by_user[ref[0]]
+
+    def set_user(self, user_id: int, images: list):
+        with self._lock:
+            for seq in list(self._by_user.get(user_id, ())):
+                self._remove((user_id, seq))
+            for seq, img in enumerate(images):
+                if img.get("phash"):
+                    self._add((user_id, seq), parse_phash(img["phash"]))
+
+    def set_image(self, user_id: int, seq: int, image: dict):
+        with self._lock:
+            self._remove((user_id, seq))
+            if image.get("phash"):
+                self._add((user_id, seq), parse_phash(image["phash"]))
+
+    def _flip_masks(self, radius: int) -> List[int]:
+        # 差 0..radius 個位元的所有遮罩 (radius=1 時為 1 + 16 個，radius=2 時為 137 個)
+        masks = self._masks.get(radius)
+        if masks is None:
+            masks = [sum(1 << b for b in bits)
+                     for r in range(radius + 1) for bits in itertools.combinations(range(self.chunk_bits), r)]
+            self._masks[radius] = masks
+        return masks
+
+    def near(self, phash: str, max_distance: int) -> List[Tuple[int, int, int]]:
+        """與 phash 差異 <= max_distance 的圖片 [(距離, user_id, 序號), ...]，由近到遠。"""
+        value = parse_phash(phash)
+        masks = self._flip_masks(max_distance // self.chunks)
+        found = []
+        seen = set()
+        with self._lock:
+            for table, part in zip(self._tables, self._parts(value)):
+                for mask in masks:
+                    for ref in table.get(part ^ mask, ()):
+                        if ref in seen:
+                            continue
+                        seen.add(ref)
+                        distance = bin(self._hashes[ref] ^ value).count("1")
+                        if distance <= max_distance:
+                            found.append((distance, ref[0], ref[1]))
+        found.sort()
+        return found
@@ -0,0 +1,239 @@
+import os
+import json
+import logging
+import threading
+
+try:
+    import orjson
+except ImportError:  # 沒有安裝 orjson 時使用標準庫 json (較慢，格式相同)
+    orjson = None
+
+# 快照 / 日誌使用的 JSON 實作 (載入時記錄在日誌中)
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+COLLECTIONS = ("user_images", "events", "gamers")
+
+log = logging.getLogger(__name__)
+
+# 刪除標記：append() 的 value 為此值時寫入刪除紀錄
+DELETED = object()
+
+
+def _loads(data):
+    """解析 JSON (str 或 bytes)。"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps(value) -> bytes:
+    """壓縮格式 (無縮排 / 空白) 的 UTF-8 JSON；非字串的 key (例如 int) 轉成字串，與 json.dumps 相同。"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _empty_state() -> dict:
+    return {name: {} for name in COLLECTIONS}
+
+
+def _apply_record(state: dict, rec: dict):
+    coll = state.setdefault(rec["c"], {})
+    key = str(rec["k"])
+    if rec.get("d"):
+        coll.pop(key, None)
+    else:
+        coll[key] = rec["v"]
+
+
+def _replay_file(state: dict, path: str) -> int:
+    """
+    將 journal 檔逐行套用到 state，回傳套用筆數。
+    最後一行若因當機只寫了一半，略過即可(該筆變更從未被確認)。
+    """
+    if not os.path.exists(path):
+        return 0
+    count = 0
+    with open(path, "rb") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = _loads(line)
+            except ValueError:
+                log.warning("%s 第 %d 行損毀，已略過", path, lineno)
+                continue
+            _apply_record(state, rec)
+            count += 1
+    return count
+
+
+def _read_snapshot(path: str) -> dict:
+    state = _empty_state()
+    if os.path.exists(path):
+        # 一次讀入再解析；舊版有縮排的 data.json 也能讀取
+        with open(path, "rb") as f:
+            data = _loads(f.read())
+        for name in COLLECTIONS:
+            state[name] = data.get(name, {})
+    return state
+
+
+def _write_snapshot(path: str, state: dict):
+    """
+    寫入暫存檔後 fsync 再 rename，確保快照不會只寫一半。
+    不縮排：檔案較小，啟動時讀取與解析都較快 (需要閱讀時可用 python -m json.tool 排版)。
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_dumps(state))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Journal:
+    """
+    data.json 快照 + data.journal 追加式日誌。
+
+    每次變更只追加一筆 compact 紀錄 (單一玩家/活動/圖片清單)，
+    日誌累積超過 compact_threshold 筆後，於背景執行緒合併成新的快照。
+    啟動時先讀快照，再依序重播尚未合併的日誌。
+    """
+
+    def __init__(self, snapshot_path: str, compact_threshold: int = 1000):
+        self.snapshot_path = snapshot_path
+        self.journal_path = os.path.splitext(snapshot_path)[0] + ".journal"
+        self.compacting_path = self.journal_path + ".compacting"
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._fh = None
+        self._records = 0
+        self._compactor = None
+
+    ###############################
+    # 啟動載入
+    ###############################
+    def load(self) -> dict:
+        """
+        回傳 {"user_images": {...}, "events": {...}, "gamers": {...}}，key 皆為字串。
+        若重播了任何日誌，會立即寫出新快照並清空日誌。
+        """
+        with self._lock:
+            self._wait_compactor()
+            if not os.path.exists(self.snapshot_path):
+                log.info("data.json 不存在, 建立預設空資料")
+                _write_snapshot(self.snapshot_path, _empty_state())
+            state = _read_snapshot(self.snapshot_path)
+            # 先重播上次未完成合併的舊日誌，再重播目前的日誌
+            replayed = _replay_file(state, self.compacting_path)
+            replayed += _replay_file(state, self.journal_path)
+            if replayed:
+                log.info("已重播 %d 筆 journal 紀錄", replayed)
+                _write_snapshot(self.snapshot_path, state)
+                for path in (self.compacting_path, self.journal_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+            self._close_fh()
+            self._records = 0
+            return state
+
+    ###############################
+    # 寫入
+    ###############################
+    def append(self, collection: str, key, value=DELETED):
+        self.append_many([(collection, key, value)])
+
+    def append_many(self, changes, fsync: bool = False):
+        """changes: [(collection, key, value或DELETED), ...]，一次寫入並 flush。"""
+        self.append_lines([self.encode_record(*change) for change in changes], fsync=fsync)
+
+    @staticmethod
+    def encode_record(collection: str, key, value=DELETED) -> str:
+        if collection not in COLLECTIONS:
+            raise ValueError(f"未知的資料集合: {collection}")
+        if value is DELETED:
+            rec = {"c": collection, "k": str(key), "d": 1}
+        else:
+            rec = {"c": collection, "k": str(key), "v": value}
+        return _dumps(rec).decode("utf-8")
+
+    def append_lines(self, lines, fsync: bool = False):
+        """寫入已由 encode_record() 編碼好的紀錄。"""
+        if not lines:
+            return
+        with self._lock:
+            fh = self._open_fh()
+            fh.write("\n".join(lines) + "\n")
+            fh.flush()
+            if fsync:
+                os.fsync(fh.fileno())
+            self._records += len(lines)
+            need_compact = self._records >= self.compact_threshold
+        if need_compact:
+            self.compact()
+
+    ###############################
+    # 背景合併
+    ###############################
+    def compact(self, wait: bool = False):
+        """
+        把目前的日誌換成 .compacting，之後的寫入進新日誌；
+        背景執行緒從磁碟上的「快照 + .compacting」產生新快照，不碰記憶體中的即時資料。
+        """
+        with self._lock:
+            if self._compactor and self._compactor.is_alive():
+                thread = self._compactor
+            elif self._records == 0:
+                return
+            else:
+                self._close_fh()
+                if os.path.exists(self.compacting_path):
+                    # 上一次合併失敗留下的舊日誌：接在後面一起合併，不可覆蓋
+                    with open(self.journal_path, "r", encoding="utf-8") as src, \
+                            open(self.compacting_path, "a", encoding="utf-8") as dst:
+                        dst.write(src.read())
+                    os.remove(self.journal_path)
+                else:
+                    os.replace(self.journal_path, self.compacting_path)
+                self._records = 0
+                thread = threading.Thread(target=self._run_compaction, name="journal-compactor", daemon=True)
+                self._compactor = thread
+                thread.start()
+        if wait:
+            thread.join()
+
+    def _run_compaction(self):
+        try:
+            state = _read_snapshot(self.snapshot_path)
+            _replay_file(state, self.compacting_path)
+            _write_snapshot(self.snapshot_path, state)
+            os.remove(self.compacting_path)
+            log.debug("journal 已合併至 data.json")
+        except Exception:
+            # 合併失敗時保留 .compacting，下次啟動會重播，資料不會遺失
+            log.exception("journal 合併失敗")
+
+    def close(self):
+        with self._lock:
+            self._close_fh()
+        self._wait_compactor()
+
+    ###############################
+    # 內部
+    ###############################
+    def _open_fh(self):
+        if self._fh is None:
+            self._fh = open(self.journal_path, "a", encoding="utf-8")
+        return self._fh
+
+    def _close_fh(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def _wait_compactor(self):
+        if self._compactor and self._compactor.is_alive():
+            self._compactor.join()
+        self._compactor = None
@@ -0,0 +1,344 @@
+import bisect
+import copy
+import logging
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from storage.base import Store, GAMER_SORTS, gamer_matches, page_slice
+from storage.capabilities import CapabilityIndex
+from storage.card_index import CardIndex, DuplicateCardError
+from storage.event_model import Event
+from storage.event_refs import EventRefIndex, event_refs
+from storage.image_index import ImageKeyIndex, PendingImageIndex, PerceptualHashIndex, image_content_hash, image_task
+from storage.journal import Journal, DELETED
+from storage.leaderboard import LeaderboardIndex
+from storage.scheduler import PersistScheduler
+from storage.timeline import TimelineIndex
+from storage.versions import EntityVersions
+
+log = logging.getLogger(__name__)
+
+
+class JsonStore(Store):
+    """
+    全部資料放在記憶體 dict，變動透過 journal + 背景排程寫回 data.json。
+    """
+
+    def __init__(self, data_file_path: str, compact_threshold: int = 1000, debounce_seconds: float = 0.5,
+                 observe_flush: Optional[Callable[[float], None]] = None):
+        self.journal = Journal(data_file_path, compact_threshold=compact_threshold)
+        self.persister = PersistScheduler(self.journal, self._resolve, window=debounce_seconds,
+                                          observe=observe_flush)
+        self.gamers = {}
+        self.events = {}
+        self.user_images = {}
+        self.cards = CardIndex()
+        self.event_refs = EventRefIndex()
+        self.boards = LeaderboardIndex()
+        self.versions = EntityVersions()
+        self.timelines = TimelineIndex(self)
+        self.capabilities = CapabilityIndex(self)
+        self.pending_images = PendingImageIndex()
+        self.image_hashes = ImageKeyIndex(image_content_hash)
+        self.image_tasks = ImageKeyIndex(image_task)
+        self.image_phashes = PerceptualHashIndex()
+        # 設定 StateWriter 後，寫入者執行緒經由 get_* 取得的是複本 (見 _own)
+        self.writer = None
+        # 依 gamer_id 排序，供分頁與 cursor 查詢
+        self._ids = []
+        # batch() 中各筆資料第一次變動前的物件，例外時據此回復
+        self._undo = None
+        self._batch_depth = 0
+
+    ###############################
+    # 生命週期
+    ###############################
+    def load(self):
+        data = self.journal.load()
+        # string->int
+        self.user_images = {int(k): v for k, v in data["user_images"].items()}
+        self.events = {code: Event(ev) for code, ev in data["events"].items()}
+        self.gamers = {int(k): v for k, v in data["gamers"].items()}
+        self.cards = CardIndex()
+        self.event_refs = EventRefIndex()
+        self.boards = LeaderboardIndex()
+        self._ids = sorted(self.gamers)
+        self.capabilities.reset(code for code, ev in self.events.items() if ev.get("prizes"))
+        self.pending_images = PendingImageIndex()
+        self.image_hashes = ImageKeyIndex(image_content_hash)
+        self.image_tasks = ImageKeyIndex(image_task)
+        self.image_phashes = PerceptualHashIndex()
+        for uid, images in self.user_images.items():
+            self.pending_images.set_user(uid, images)
+            self.image_hashes.set_user(uid, images)
+            self.image_tasks.set_user(uid, images)
+            self.image_phashes.set_user(uid, images)
+        for gid, gamer in self.gamers.items():
+            self.event_refs.set(gid, event_refs(gamer))
+            self.boards.update(gamer)
+            try:
+                self.cards.set(gid, gamer.get("gamer_card_number"))
+            except DuplicateCardError as e:
+                # 舊資料可能已有重複卡號：保留先載入的那位，其餘清除卡號並寫回，
+                # 否則之後該玩家每次 save_gamer 都會失敗
+                log.warning("載入時%s，玩家 %s 的卡號已清除", e, gid)
+                gamer["gamer_card_number"] = None
+                self.persister.mark_dirty("gamers", gid)
+
+    def start(self):
+        self.persister.start()
+
+    def flush(self):
+        self.persister.flush()
+
+    def close(self):
+        self.persister.stop()
+        self.journal.close()
+
+    def persist_stats(self) -> dict:
+        return {
+            "pending": self.persister.pending,
+            "flushes": self.persister.flush_count,
+            "last_flush_seconds": self.persister.last_flush_seconds
+        }
+
+    @contextmanager
+    def batch(self):
+        """
+        區塊內丟出例外時，把區塊中變動過的資料全部回復成變動前的物件 (連同各索引)。
+        依賴 copy-on-write：需在寫入者執行緒內使用，已存的物件不會被原地修改。
+        回復在記憶體中進行；背景存檔途中寫出的部分變動會在回復後再被覆寫。
+        """
+        if self._batch_depth:
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_depth -= 1
+            return
+        self._batch_depth = 1
+        self._undo = {}
+        try:
+            yield
+        except BaseException:
+            undo, self._undo = self._undo, None
+            self._rollback(undo)
+            raise
+        finally:
+            self._batch_depth = 0
+            self._undo = None
+
+    def _remember(self, collection: str, key):
+        if self._undo is not None and (collection, key) not in self._undo:
+            self._undo[(collection, key)] = self._resolve(collection, key)
+
+    def _rollback(self, undo: dict):
+        # 由後往前回復，例如先換回後一位玩家的卡號，前一位才能拿回原本的卡號
+        for (collection, key), value in reversed(list(undo.items())):
+            if collection == "gamers":
+                if value is DELETED:
+                    self.delete_gamer(key)
+                else:
+                    self.save_gamer(value)
+            elif collection == "events":
+                if value is DELETED:
+                    self.delete_event(key)
+                else:
+                    self.save_event(value)
+            else:
+                self.save_images(key, [] if value is DELETED else value)
+                if value is DELETED:
+                    self.user_images.pop(key, None)
+        log.warning("batch 失敗，已回復 %d 筆變動", len(undo))
+
+    def _changed(self, collection: str, key):
+        self.versions.bump(collection, key)
+        self.persister.mark_dirty(collection, key)
+
+    def _own(self, value):
+        # 寫入者修改的是複本，save_* 時才換上新物件；其他執行緒讀到的一直是上一個完整版本
+        if value is not None and self.writer is not None and self.writer.in_writer():
+            return copy.deepcopy(value)
+        return value
+
+    def _resolve(self, collection: str, key):
+        source = {"gamers": self.gamers, "events": self.events, "user_images": self.user_images}[collection]
+        return source.get(key, DELETED)
+
+    ###############################
+    # Gamer
+    ###############################
+    def get_gamer(self, gamer_id: int) -> Optional[dict]:
+        return self._own(self.gamers.get(gamer_id))
+
+    def has_gamer(self, gamer_id: int) -> bool:
+        return gamer_id in self.gamers
+
+    def save_gamer(self, gamer: dict):
+        gamer_id = gamer["gamer_id"]
+        self._remember("gamers", gamer_id)
+        card = gamer.get("gamer_card_number")
+        try:
+            self.cards.set(gamer_id, card)
+        except DuplicateCardError:
+            # 回復成原本的卡號，記憶體中的資料不可帶著重複卡號
+            gamer["gamer_card_number"] = self.cards.card_of(gamer_id)
+            raise
+        self.event_refs.set(gamer_id, event_refs(gamer))
+        self.boards.update(gamer)
+        if gamer_id not in self.gamers:
+            bisect.insort(self._ids, gamer_id)
+        self.gamers[gamer_id] = gamer
+        self.capabilities.gamer_saved(gamer)
+        self._changed("gamers", gamer_id)
+
+    def delete_gamer(self, gamer_id: int):
+        self._remember("gamers", gamer_id)
+        if self.gamers.pop(gamer_id, None) is not None:
+            del self._ids[bisect.bisect_left(self._ids, gamer_id)]
+        self.cards.remove(gamer_id)
+        self.event_refs.remove(gamer_id)
+        self.boards.remove(gamer_id)
+        self.capabilities.gamer_deleted(gamer_id)
+        self._changed("gamers", gamer_id)
+
+    def count_gamers(self) -> int:
+        return len(self.gamers)
+
+    def iter_gamers(self) -> Iterator[dict]:
+        return iter(list(self.gamers.values()))
+
+    def list_gamers(self, offset: int = 0, limit: int = 50) -> List[dict]:
+        return [self.gamers[gid] for gid in self._ids[offset:offset + limit]]
+
+    def page_gamers(self, sort: str = "gamer_id", desc: bool = False, offset: int = 0, limit: int = 50) -> List[dict]:
+        if sort not in GAMER_SORTS:
+            raise ValueError(f"未知的排序欄位: {sort}")
+        if sort == "gamer_id":
+            ids = page_slice(self._ids, offset, limit, desc)
+        elif sort == "points":
+            # 排行榜本身是點數由高到低
+            ids = [gid for _, gid in page_slice(self.boards.board(None).ordered(), offset, limit, not desc)]
+        else:
+            carded = self.cards.ordered()
+            ids = [gid for _, gid in page_slice(carded, offset, limit, desc)]
+            if len(ids) < limit:
+                # 卡號排完後接著列出沒有卡號的玩家
+                rest = offset + len(ids) - len(carded)
+                cardless = [gid for gid in self._ids if self.cards.card_of(gid) is None]
+                if desc:
+                    cardless.reverse()
+                ids += cardless[max(rest, 0):max(rest, 0) + limit - len(ids)]
+        return [self.gamers[gid] for gid in ids]
+
+    def query_gamers(self, after: Optional[int] = None, blocked: Optional[bool] = None,
+                     event_code: Optional[str] = None, has_card: Optional[bool] = None) -> Iterator[dict]:
+        start = bisect.bisect_right(self._ids, after) if after is not None else 0
+        # 複製一份 id，產生過程中新增 / 刪除玩家不會影響迭代
+        for gid in self._ids[start:]:
+            gamer = self.gamers.get(gid)
+            if gamer is not None and gamer_matches(gamer, blocked, event_code, has_card):
+                yield gamer
+
+    def find_gamer_by_card(self, card_number: str) -> Optional[dict]:
+        gamer_id = self.cards.owner(card_number)
+        return self._own(self.gamers.get(gamer_id)) if gamer_id is not None else None
+
+    def gamers_with_event(self, event_code: str) -> List[int]:
+        return self.event_refs.gamers(event_code)
+
+    def leaderboard(self, event_code: Optional[str] = None, offset: int = 0, limit: int = 10) -> List[Tuple[int, int, int]]:
+        board = self.boards.board(event_code)
+        return board.top(offset, limit) if board else []
+
+    def gamer_rank(self, gamer_id: int, event_code: Optional[str] = None) -> Optional[Tuple[int, int, int]]:
+        board = self.boards.board(event_code)
+        found = board.rank(gamer_id) if board else None
+        if found is None:
+            return None
+        return found[0], found[1], len(board)
+
+    def search_gamers_by_card(self, keyword: str, prefix: bool = False, limit: Optional[int] = None) -> List[dict]:
+        if not keyword:
+            return self.list_gamers(0, len(self.gamers) if limit is None else limit)
+        ids = self.cards.prefix(keyword) if prefix else self.cards.search(keyword)
+        return [self.gamers[gid] for gid in ids[:limit]]
+
+    ###############################
+    # Event
+    ###############################
+    def get_event(self, event_code: str) -> Optional[dict]:
+        return self._own(self.events.get(event_code))
+
+    def has_event(self, event_code: str) -> bool:
+        return event_code in self.events
+
+    def save_event(self, event: dict):
+        code = event["event_code"]
+        self._remember("events", code)
+        self.events[code] = event if isinstance(event, Event) else Event(event)
+        self.capabilities.event_saved(event)
+        self._changed("events", code)
+
+    def delete_event(self, event_code: str):
+        self._remember("events", event_code)
+        self.events.pop(event_code, None)
+        self.capabilities.event_deleted(event_code)
+        self._changed("events", event_code)
+
+    def clear_events(self):
+        codes = list(self.events)
+        for code in codes:
+            self._remember("events", code)
+        self.events.clear()
+        for code in codes:
+            self.capabilities.event_deleted(code)
+            self._changed("events", code)
+
+    def iter_events(self) -> Iterator[dict]:
+        return iter(list(self.events.values()))
+
+    def events_dict(self) -> dict:
+        return self.events
+
+    ###############################
+    # 圖片
+    ###############################
+    def get_images(self, user_id: int) -> list:
+        return self._own(self.user_images.get(user_id, []))
+
+    def save_images(self, user_id: int, images: list):
+        self._remember("user_images", user_id)
+        self.user_images[user_id] = images
+        self.capabilities.images_saved(user_id, images)
+        self.pending_images.set_user(user_id, images)
+        self.image_hashes.set_user(user_id, images)
+        self.image_tasks.set_user(user_id, images)
+        self.image_phashes.set_user(user_id, images)
+        self._changed("user_images", user_id)
+
+    def get_image(self, user_id: int, seq: int) -> Optional[dict]:
+        images = self.user_images.get(user_id, [])
+        return self._own(images[seq]) if 0 <= seq < len(images) else None
+
+    def update_image(self, user_id: int, seq: int, image: dict):
+        self._remember("user_images", user_id)
+        # 換上新的清單，不在其他執行緒可能正在讀取的清單上修改
+        images = list(self.user_images[user_id])
+        images[seq] = image
+        self.user_images[user_id] = images
+        self.capabilities.image_saved(user_id, image)
+        self.pending_images.set_image(user_id, seq, image)
+        self.image_hashes.set_image(user_id, seq, image)
+        self.image_tasks.set_image(user_id, seq, image)
+        self.image_phashes.set_image(user_id, seq, image)
+        self._changed("user_images", user_id)
+
+    def iter_images(self) -> Iterator[Tuple[int, list]]:
+        return iter(list(self.user_images.items()))
+
+    def images_with_hash(self, content_hash: str) -> List[Tuple[int, dict]]:
+        return [(uid, self.user_images[uid][seq]) for uid, seq in self.image_hashes.get(content_hash)]
+
+    def task_images(self, event_code: str, task_id: int) -> List[Tuple[int, dict]]:
+        return [(uid, self.user_images[uid][seq]) for uid, seq in self.image_tasks.get((event_code, task_id))]
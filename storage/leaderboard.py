@@ -0,0 +1,107 @@
+import bisect
+from typing import Dict, List, Optional, Set, Tuple
+
+
+def total_points(gamer: dict) -> int:
+    """
+    玩家累計點數；舊資料沒有 total_points 時由 history_event_pts_list 算出。
+    只讀取不寫回：讀取端拿到的可能是 store 中的原物件 (寫入由 credit_points 負責)。
+    """
+    if "total_points" in gamer:
+        return gamer["total_points"]
+    return sum(gamer.get("history_event_pts_list", []))
+
+
+def credit_points(gamer: dict, points: int, event_code: Optional[str] = None):
+    """加點 (全域或活動)，同步更新 history_event_pts_list、total_points 與 events_points。"""
+    total = total_points(gamer)
+    gamer.setdefault("history_event_pts_list", []).append(points)
+    gamer["total_points"] = total + points
+    if event_code is not None:
+        events_points = gamer.setdefault("events_points", {})
+        events_points[event_code] = events_points.get(event_code, 0) + points
+
+
+class Leaderboard:
+    """
+    依 (點數由高到低, gamer_id) 排序的排行榜。
+    名次以 bisect 查詢 (O(log n))；同分同名次 (1, 2, 2, 4 ...)。
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []
+        self._points: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def set(self, gamer_id: int, points: int):
+        old = self._points.get(gamer_id)
+        if old == points:
+            return
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, (-old, gamer_id))]
+        bisect.insort(self._keys, (-points, gamer_id))
+        self._points[gamer_id] = points
+
+    def remove(self, gamer_id: int):
+        old = self._points.pop(gamer_id, None)
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, (-old, gamer_id))]
+
+    def _rank_of_points(self, points: int) -> int:
+        return bisect.bisect_left(self._keys, (-points,)) + 1
+
+    def rank(self, gamer_id: int) -> Optional[Tuple[int, int]]:
+        """回傳 (名次, 點數)，不在榜上則為 None。"""
+        points = self._points.get(gamer_id)
+        if points is None:
+            return None
+        return self._rank_of_points(points), points
+
+    def ordered(self) -> List[Tuple[int, int]]:
+        """依名次排序的 [(-點數, gamer_id), ...]，呼叫端不可修改。"""
+        return self._keys
+
+    def top(self, offset: int = 0, limit: int = 10) -> List[Tuple[int, int, int]]:
+        """回傳 [(名次, gamer_id, 點數), ...]。"""
+        return [(self._rank_of_points(-neg), gid, -neg) for neg, gid in self._keys[offset:offset + limit]]
+
+
+class LeaderboardIndex:
+    """
+    每個活動一個排行榜 (events_points)，另有一個全域排行榜 (total_points，key 為 None)。
+    save_gamer 時呼叫 update()，只調整該玩家有變動的排行榜。
+    """
+
+    def __init__(self):
+        self._boards: Dict[Optional[str], Leaderboard] = {None: Leaderboard()}
+        self._events_of: Dict[int, Set[str]] = {}
+
+    def board(self, event_code: Optional[str]) -> Optional[Leaderboard]:
+        return self._boards.get(event_code)
+
+    def update(self, gamer: dict):
+        gamer_id = gamer["gamer_id"]
+        self._boards[None].set(gamer_id, total_points(gamer))
+        events_points = gamer.get("events_points", {})
+        for code in self._events_of.get(gamer_id, set()) - set(events_points):
+            self._remove_from(code, gamer_id)
+        for code, pts in events_points.items():
+            self._boards.setdefault(code, Leaderboard()).set(gamer_id, pts)
+        if events_points:
+            self._events_of[gamer_id] = set(events_points)
+        else:
+            self._events_of.pop(gamer_id, None)
+
+    def remove(self, gamer_id: int):
+        self._boards[None].remove(gamer_id)
+        for code in self._events_of.pop(gamer_id, set()):
+            self._remove_from(code, gamer_id)
+
+    def _remove_from(self, event_code: str, gamer_id: int):
+        board = self._boards.get(event_code)
+        if board is not None:
+            board.remove(gamer_id)
+            if not board:
+                del self._boards[event_code]
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from storage.journal import Journal
+
+log = logging.getLogger(__name__)
+
+
+class PersistScheduler:
+    """
+    去抖動(debounce)的背景存檔排程。
+
+    mark_dirty() 只記下哪一筆資料變動，立即返回；
+    背景執行緒在第一筆變動後等待 window 秒，把這段期間內的所有變動
+    合併成一批 (同一筆只寫最後狀態)，序列化、寫入 journal 並 fsync。
+    """
+
+    MAX_SERIALIZE_RETRIES = 5
+
+    def __init__(self, journal: Journal, resolve, window: float = 0.5,
+                 observe: Optional[Callable[[float], None]] = None):
+        """
+        resolve(collection, key) 回傳該筆目前的值，不存在時回傳 DELETED。
+        observe(秒數) 於每批寫出後呼叫 (例如記入 metrics)。
+        """
+        self.journal = journal
+        self.resolve = resolve
+        self.window = window
+        self.observe = observe
+        self._dirty = set()
+        self._cond = threading.Condition()
+        # 同時只有一次 flush：否則較舊的一批可能較晚 append，重播時蓋過較新的紀錄
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self.flush_count = 0
+        self.last_flush_seconds = 0.0
+
+    def start(self):
+        with self._cond:
+            self._stopping = False
+            self._start_thread()
+
+    def _start_thread(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="persist-scheduler", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self, collection: str, key):
+        with self._cond:
+            if self._stopping:
+                # stop() 之後 journal 已關閉，不可再自動啟動背景執行緒寫入
+                raise RuntimeError(f"存檔排程已停止，無法記錄 {collection}/{key} 的變動")
+            self._dirty.add((collection, key))
+            self._cond.notify()
+            self._start_thread()
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._dirty)
+
+    def flush(self):
+        """立即寫出目前所有待存的變動 (同步)。"""
+        with self._flush_lock:
+            with self._cond:
+                batch = self._dirty
+                self._dirty = set()
+            self._write(batch)
+
+    def stop(self):
+        """停止背景執行緒並寫出剩餘變動，供關機時呼叫。"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    ###############################
+    # 背景執行緒
+    ###############################
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+            # 等待 window 秒，讓這段時間內的變動合併成同一批
+            time.sleep(self.window)
+            try:
+                self.flush()
+            except Exception:
+                log.exception("背景存檔失敗")
+
+    def _write(self, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            lines = [self._encode(collection, key) for collection, key in batch]
+            self.journal.append_lines(lines, fsync=True)
+        except Exception:
+            # 寫入失敗就放回去，下一輪再試，不可遺失已確認的變動
+            with self._cond:
+                self._dirty.update(batch)
+            raise
+        self.flush_count += 1
+        self.last_flush_seconds = time.perf_counter() - started
+        if self.observe is not None:
+            self.observe(self.last_flush_seconds)
+
+    def _encode(self, collection: str, key) -> str:
+        for _ in range(self.MAX_SERIALIZE_RETRIES):
+            try:
+                return self.journal.encode_record(collection, key, self.resolve(collection, key))
+            except RuntimeError:
+                # 序列化途中資料被其他執行緒修改 (dictionary changed size during iteration)
+                continue
+        raise RuntimeError(f"無法序列化 {collection}/{key}：資料持續被修改")
@@ -0,0 +1,770 @@
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from storage.base import Store, GAMER_SORTS
+from storage.capabilities import CapabilityIndex
+from storage.card_index import GRAM_MAX, card_grams, DuplicateCardError
+from storage.event_model import Event
+from storage.event_refs import event_refs
+from storage.image_index import PendingImageIndex, PerceptualHashIndex
+from storage.leaderboard import total_points
+from storage.timeline import TimelineIndex
+from storage.versions import EntityVersions
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS gamers (
+    gamer_id INTEGER PRIMARY KEY,
+    gamer_card_number TEXT,
+    gamer_is_blocked INTEGER NOT NULL DEFAULT 0,
+    gamer_bind_gamepass TEXT,
+    history_event_list TEXT NOT NULL DEFAULT '[]',
+    history_event_pts_list TEXT NOT NULL DEFAULT '[]',
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_gamers_card_nocase ON gamers(gamer_card_number COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_gamers_blocked ON gamers(gamer_is_blocked);
+
+-- 卡號 n-gram (長度 1~3，小寫)，供關鍵字子字串查詢
+CREATE TABLE IF NOT EXISTS card_grams (
+    gram TEXT NOT NULL,
+    gamer_id INTEGER NOT NULL,
+    PRIMARY KEY (gram, gamer_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_card_grams_gamer ON card_grams(gamer_id);
+
+-- 反向索引：哪些玩家仍有此活動的紀錄 (刪除活動時只處理這些玩家)
+CREATE TABLE IF NOT EXISTS gamer_event_refs (
+    event_code TEXT NOT NULL,
+    gamer_id INTEGER NOT NULL,
+    PRIMARY KEY (event_code, gamer_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_gamer_event_refs_gamer ON gamer_event_refs(gamer_id);
+
+-- 累計點數 (全域排行榜)
+CREATE TABLE IF NOT EXISTS gamer_totals (
+    gamer_id INTEGER PRIMARY KEY,
+    total_points INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_gamer_totals_rank ON gamer_totals(total_points);
+
+CREATE TABLE IF NOT EXISTS gamer_events (
+    gamer_id INTEGER NOT NULL,
+    event_code TEXT NOT NULL,
+    seq INTEGER,
+    joined_at TEXT,
+    PRIMARY KEY (gamer_id, event_code)
+);
+CREATE INDEX IF NOT EXISTS idx_gamer_events_event ON gamer_events(event_code);
+
+CREATE TABLE IF NOT EXISTS event_points (
+    gamer_id INTEGER NOT NULL,
+    event_code TEXT NOT NULL,
+    points INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (gamer_id, event_code)
+);
+CREATE INDEX IF NOT EXISTS idx_event_points_rank ON event_points(event_code, points);
+
+CREATE TABLE IF NOT EXISTS redeemed_prizes (
+    gamer_id INTEGER NOT NULL,
+    event_code TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    prize_id INTEGER,
+    PRIMARY KEY (gamer_id, event_code, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_redeemed_event ON redeemed_prizes(event_code);
+
+CREATE TABLE IF NOT EXISTS points_history (
+    gamer_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    type TEXT,
+    event_code TEXT,
+    points INTEGER,
+    prize_id INTEGER,
+    timestamp TEXT,
+    extra TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (gamer_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_points_history_event ON points_history(event_code);
+
+CREATE TABLE IF NOT EXISTS events (
+    event_code TEXT PRIMARY KEY,
+    event_name TEXT,
+    event_description TEXT,
+    event_start_date TEXT,
+    event_end_date TEXT,
+    max_points INTEGER NOT NULL DEFAULT 0,
+    gamer_list TEXT NOT NULL DEFAULT '[]',
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    event_code TEXT NOT NULL,
+    task_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    task_name TEXT,
+    task_description TEXT,
+    task_points INTEGER NOT NULL DEFAULT 0,
+    assigned_users TEXT NOT NULL DEFAULT '[]',
+    checked_users TEXT NOT NULL DEFAULT '[]',
+    extra TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (event_code, task_id)
+);
+
+CREATE TABLE IF NOT EXISTS prizes (
+    event_code TEXT NOT NULL,
+    prize_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    prize_name TEXT,
+    points_required INTEGER NOT NULL DEFAULT 0,
+    extra TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (event_code, prize_id)
+);
+
+CREATE TABLE IF NOT EXISTS images (
+    user_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    filename TEXT,
+    username TEXT,
+    status TEXT,
+    event_code TEXT,
+    task_id INTEGER,
+    upload_time TEXT,
+    approved_time TEXT,
+    rejected_time TEXT,
+    extra TEXT NOT NULL DEFAULT '{}',
+    content_hash TEXT,
+    phash TEXT,
+    PRIMARY KEY (user_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_images_status ON images(status);
+CREATE INDEX IF NOT EXISTS idx_images_event_task ON images(event_code, task_id);
+"""
+
+GAMER_COLUMNS = ("gamer_id", "gamer_card_number", "gamer_is_blocked", "gamer_bind_gamepass",
+                 "history_event_list", "history_event_pts_list")
+GAMER_CHILD_KEYS = ("joined_events", "joined_event_timestamps", "events_points", "redeemed_prizes", "points_history",
+                    "total_points")
+HISTORY_COLUMNS = ("type", "event_code", "points", "prize_id", "timestamp")
+EVENT_COLUMNS = ("event_code", "event_name", "event_description", "event_start_date", "event_end_date",
+                 "max_points", "gamer_list")
+TASK_COLUMNS = ("task_id", "task_name", "task_description", "task_points", "assigned_users", "checked_users")
+PRIZE_COLUMNS = ("prize_id", "prize_name", "points_required")
+IMAGE_COLUMNS = ("filename", "username", "status", "event_code", "task_id")
+IMAGE_OPTIONAL_COLUMNS = ("upload_time", "approved_time", "rejected_time")
+# 之後以 ALTER TABLE 加入的欄位，位於 extra 之後；同樣只在有值時出現
+IMAGE_ADDED_COLUMNS = ("content_hash", "phash")
+
+# 一次從資料庫組裝的玩家數，避免 IN (...) 過長
+BATCH_SIZE = 500
+
+
+def _extra(d: dict, known) -> str:
+    return json.dumps({k: v for k, v in d.items() if k not in known}, ensure_ascii=False)
+
+
+def _image_row(user_id: int, seq: int, img: dict) -> tuple:
+    known = IMAGE_COLUMNS + IMAGE_OPTIONAL_COLUMNS + IMAGE_ADDED_COLUMNS + ("user_id",)
+    return ((user_id, seq) + tuple(img.get(c) for c in IMAGE_COLUMNS + IMAGE_OPTIONAL_COLUMNS)
+            + (_extra(img, known),) + tuple(img.get(c) for c in IMAGE_ADDED_COLUMNS))
+
+
+def _placeholders(n: int) -> str:
+    return ",".join("?" * n)
+
+
+class SqliteStore(Store):
+    """
+    SQLite (WAL 模式) 儲存：每張表都有索引，單筆查詢與分頁不需把全部資料載入記憶體。
+    連線在多個執行緒 (FastAPI threadpool / Discord event loop) 共用，以 RLock 序列化。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = None
+        self.versions = EntityVersions()
+        self.timelines = TimelineIndex(self)
+        self.capabilities = CapabilityIndex(self)
+        self.pending_images = PendingImageIndex()
+        self.image_phashes = PerceptualHashIndex()
+        self._batch_depth = 0
+
+    ###############################
+    # 生命週期
+    ###############################
+    def load(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+                self._conn.row_factory = sqlite3.Row
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.executescript(SCHEMA)
+                self._migrate()
+                self._load_indexes()
+
+    def _load_indexes(self):
+        # 記憶體中的索引 (功能旗標 / 待審核圖片 / 感知 hash) 由資料庫重建
+        with self._lock:
+            self.capabilities.reset(
+                r[0] for r in self._conn.execute("SELECT DISTINCT event_code FROM prizes").fetchall())
+            pending = PendingImageIndex()
+            for row in self._conn.execute("SELECT * FROM images WHERE status='pending'").fetchall():
+                pending.set_image(row["user_id"], row["seq"], self._image_from_row(row))
+            self.pending_images = pending
+            phashes = PerceptualHashIndex()
+            for row in self._conn.execute("SELECT user_id, seq, phash FROM images WHERE phash IS NOT NULL"):
+                phashes.set_image(row["user_id"], row["seq"], {"phash": row["phash"]})
+            self.image_phashes = phashes
+
+    def _migrate(self):
+        conn = self._conn
+        # 舊資料庫補上新增的圖片欄位
+        image_columns = {r["name"] for r in conn.execute("PRAGMA table_info(images)")}
+        for c in IMAGE_ADDED_COLUMNS:
+            if c not in image_columns:
+                conn.execute(f"ALTER TABLE images ADD COLUMN {c} TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_images_hash ON images(content_hash)")
+        # 卡號唯一索引 (NULL 可重複)；舊資料若已有重複卡號則退回一般索引並警告
+        conn.execute("DROP INDEX IF EXISTS idx_gamers_card")
+        try:
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_gamers_card_unique ON gamers(gamer_card_number)")
+        except sqlite3.IntegrityError:
+            log.warning("gamers 中有重複卡號，無法建立唯一索引，請先手動修正")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_gamers_card ON gamers(gamer_card_number)")
+        # 補建 card_grams
+        has_grams = conn.execute("SELECT 1 FROM card_grams LIMIT 1").fetchone()
+        if not has_grams:
+            rows = conn.execute("SELECT gamer_id, gamer_card_number FROM gamers WHERE gamer_card_number IS NOT NULL")
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR IGNORE INTO card_grams VALUES (?,?)",
+                [(g, gid) for gid, card in rows.fetchall() for g in card_grams(card)]
+            )
+            conn.execute("COMMIT")
+        # 補建 gamer_event_refs
+        has_refs = conn.execute("SELECT 1 FROM gamer_event_refs LIMIT 1").fetchone()
+        if not has_refs:
+            with self._transaction() as cur:
+                for gamer in self.iter_gamers():
+                    cur.executemany("INSERT OR IGNORE INTO gamer_event_refs VALUES (?,?)",
+                                    [(code, gamer["gamer_id"]) for code in event_refs(gamer)])
+        # 補建 gamer_totals (舊資料由 history_event_pts_list 加總)
+        missing = conn.execute(
+            "SELECT gamer_id, history_event_pts_list FROM gamers "
+            "WHERE gamer_id NOT IN (SELECT gamer_id FROM gamer_totals)").fetchall()
+        if missing:
+            with self._transaction() as cur:
+                cur.executemany("INSERT INTO gamer_totals VALUES (?,?)",
+                                [(gid, sum(json.loads(pts))) for gid, pts in missing])
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._conn.close()
+                self._conn = None
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM gamers) + (SELECT COUNT(*) FROM events) + (SELECT COUNT(*) FROM images)"
+            ).fetchone()
+            return row[0] == 0
+
+    def _transaction(self):
+        return _Transaction(self)
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            if self._batch_depth:
+                self._batch_depth += 1
+                try:
+                    yield
+                finally:
+                    self._batch_depth -= 1
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._batch_depth = 1
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                # 已套用到記憶體索引的變動一併作廢
+                self._load_indexes()
+                raise
+            else:
+                self._conn.execute("COMMIT")
+            finally:
+                self._batch_depth = 0
+
+    ###############################
+    # Gamer
+    ###############################
+    def get_gamer(self, gamer_id: int) -> Optional[dict]:
+        gamers = self._load_gamers([gamer_id])
+        return gamers[0] if gamers else None
+
+    def has_gamer(self, gamer_id: int) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM gamers WHERE gamer_id=?", (gamer_id,)).fetchone() is not None
+
+    def save_gamer(self, gamer: dict):
+        gid = gamer["gamer_id"]
+        # 空字串視同沒有卡號 (存成 NULL)，否則會觸發唯一索引
+        card = gamer.get("gamer_card_number") or None
+        with self._transaction() as cur:
+            row = cur.execute("SELECT gamer_card_number FROM gamers WHERE gamer_id=?", (gid,)).fetchone()
+            old_card = row[0] if row else None
+            if card and card != old_card:
+                owner = cur.execute(
+                    "SELECT gamer_id FROM gamers WHERE gamer_card_number=? AND gamer_id<>?", (card, gid)).fetchone()
+                if owner:
+                    raise DuplicateCardError(card, owner[0])
+            # 不可用 INSERT OR REPLACE：卡號唯一索引衝突時會把另一位玩家整列刪掉
+            cur.execute(
+                "INSERT INTO gamers VALUES (?,?,?,?,?,?,?) "
+                "ON CONFLICT(gamer_id) DO UPDATE SET "
+                "gamer_card_number=excluded.gamer_card_number, gamer_is_blocked=excluded.gamer_is_blocked, "
+                "gamer_bind_gamepass=excluded.gamer_bind_gamepass, history_event_list=excluded.history_event_list, "
+                "history_event_pts_list=excluded.history_event_pts_list, extra=excluded.extra",
+                (
+                    gid,
+                    card,
+                    1 if gamer.get("gamer_is_blocked") else 0,
+                    gamer.get("gamer_bind_gamepass"),
+                    json.dumps(gamer.get("history_event_list", []), ensure_ascii=False),
+                    json.dumps(gamer.get("history_event_pts_list", []), ensure_ascii=False),
+                    _extra(gamer, GAMER_COLUMNS + GAMER_CHILD_KEYS)
+                )
+            )
+            if card != old_card:
+                cur.execute("DELETE FROM card_grams WHERE gamer_id=?", (gid,))
+                if card:
+                    cur.executemany("INSERT INTO card_grams VALUES (?,?)", [(g, gid) for g in card_grams(card)])
+            self._delete_gamer_children(cur, gid)
+            joined = gamer.get("joined_events", [])
+            stamps = gamer.get("joined_event_timestamps", {})
+            seq_of = {code: i for i, code in enumerate(joined)}
+            for code in list(joined) + [c for c in stamps if c not in seq_of]:
+                cur.execute("INSERT OR REPLACE INTO gamer_events VALUES (?,?,?,?)",
+                            (gid, code, seq_of.get(code), stamps.get(code)))
+            for code, pts in gamer.get("events_points", {}).items():
+                cur.execute("INSERT INTO event_points VALUES (?,?,?)", (gid, code, pts))
+            for code, prize_ids in gamer.get("redeemed_prizes", {}).items():
+                if not prize_ids:
+                    # 保留空清單 (seq=-1)，讀回時才會有這個 key
+                    cur.execute("INSERT INTO redeemed_prizes VALUES (?,?,?,?)", (gid, code, -1, None))
+                for i, pid in enumerate(prize_ids):
+                    cur.execute("INSERT INTO redeemed_prizes VALUES (?,?,?,?)", (gid, code, i, pid))
+            cur.executemany("INSERT INTO gamer_event_refs VALUES (?,?)",
+                            [(code, gid) for code in event_refs(gamer)])
+            cur.execute("INSERT INTO gamer_totals VALUES (?,?)", (gid, total_points(gamer)))
+            cur.executemany(
+                "INSERT INTO points_history VALUES (?,?,?,?,?,?,?,?)",
+                [
+                    (gid, i) + tuple(rec.get(c) for c in HISTORY_COLUMNS) + (_extra(rec, HISTORY_COLUMNS),)
+                    for i, rec in enumerate(gamer.get("points_history", []))
+                ]
+            )
+        self.capabilities.gamer_saved(gamer)
+        self.versions.bump("gamers", gid)
+
+    def delete_gamer(self, gamer_id: int):
+        with self._transaction() as cur:
+            cur.execute("DELETE FROM gamers WHERE gamer_id=?", (gamer_id,))
+            cur.execute("DELETE FROM card_grams WHERE gamer_id=?", (gamer_id,))
+            self._delete_gamer_children(cur, gamer_id)
+        self.capabilities.gamer_deleted(gamer_id)
+        self.versions.bump("gamers", gamer_id)
+
+    def _delete_gamer_children(self, cur, gamer_id: int):
+        for table in ("gamer_events", "event_points", "redeemed_prizes", "points_history", "gamer_event_refs",
+                      "gamer_totals"):
+            cur.execute(f"DELETE FROM {table} WHERE gamer_id=?", (gamer_id,))
+
+    def count_gamers(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM gamers").fetchone()[0]
+
+    def iter_gamers(self) -> Iterator[dict]:
+        return self.query_gamers()
+
+    def page_gamers(self, sort: str = "gamer_id", desc: bool = False, offset: int = 0, limit: int = 50) -> List[dict]:
+        if sort not in GAMER_SORTS:
+            raise ValueError(f"未知的排序欄位: {sort}")
+        d = "DESC" if desc else "ASC"
+        if sort == "gamer_id":
+            sql = f"SELECT gamer_id FROM gamers ORDER BY gamer_id {d}"
+        elif sort == "points":
+            # desc 與排行榜相同：點數高到低、同分依 gamer_id；否則整個反過來
+            tie = "ASC" if desc else "DESC"
+            sql = (f"SELECT g.gamer_id FROM gamers g LEFT JOIN gamer_totals t ON t.gamer_id = g.gamer_id "
+                   f"ORDER BY COALESCE(t.total_points, 0) {d}, g.gamer_id {tie}")
+        else:
+            sql = (f"SELECT gamer_id FROM gamers ORDER BY gamer_card_number IS NULL, "
+                   f"lower(gamer_card_number) {d}, gamer_id {d}")
+        with self._lock:
+            rows = self._conn.execute(sql + " LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return self._load_gamers([r[0] for r in rows])
+
+    def query_gamers(self, after: Optional[int] = None, blocked: Optional[bool] = None,
+                     event_code: Optional[str] = None, has_card: Optional[bool] = None) -> Iterator[dict]:
+        conds, params = [], []
+        if blocked is not None:
+            conds.append("gamer_is_blocked=?")
+            params.append(1 if blocked else 0)
+        if has_card is not None:
+            conds.append("(gamer_card_number IS NOT NULL AND gamer_card_number<>'')" if has_card
+                         else "(gamer_card_number IS NULL OR gamer_card_number='')")
+        if event_code is not None:
+            conds.append("gamer_id IN (SELECT gamer_id FROM gamer_events WHERE event_code=? AND seq IS NOT NULL)")
+            params.append(event_code)
+        last_id = after
+        while True:
+            where = conds + (["gamer_id > ?"] if last_id is not None else [])
+            args = params + ([last_id] if last_id is not None else [])
+            sql = "SELECT gamer_id FROM gamers"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            with self._lock:
+                rows = self._conn.execute(sql + " ORDER BY gamer_id LIMIT ?", args + [BATCH_SIZE]).fetchall()
+            if not rows:
+                return
+            ids = [r[0] for r in rows]
+            yield from self._load_gamers(ids)
+            last_id = ids[-1]
+
+    def list_gamers(self, offset: int = 0, limit: int = 50) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT gamer_id FROM gamers ORDER BY gamer_id LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return self._load_gamers([r[0] for r in rows])
+
+    def find_gamer_by_card(self, card_number: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT gamer_id FROM gamers WHERE gamer_card_number=? LIMIT 1", (card_number,)).fetchone()
+        return self.get_gamer(row[0]) if row else None
+
+    def gamers_with_event(self, event_code: str) -> List[int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT gamer_id FROM gamer_event_refs WHERE event_code=? ORDER BY gamer_id", (event_code,)).fetchall()
+        return [r[0] for r in rows]
+
+    def _board(self, event_code: Optional[str]) -> Tuple[str, str, str, tuple]:
+        """(資料表, 點數欄位, WHERE 條件, 參數)：event_code 為 None 時為全域排行榜。"""
+        if event_code is None:
+            return "gamer_totals", "total_points", "1=1", ()
+        return "event_points", "points", "event_code=?", (event_code,)
+
+    def leaderboard(self, event_code: Optional[str] = None, offset: int = 0, limit: int = 10) -> List[Tuple[int, int, int]]:
+        table, col, where, params = self._board(event_code)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT gamer_id, {col} FROM {table} WHERE {where} ORDER BY {col} DESC, gamer_id LIMIT ? OFFSET ?",
+                params + (limit, offset)).fetchall()
+            if not rows:
+                return []
+            ahead = self._conn.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE {where} AND {col} > ?", params + (rows[0][1],)).fetchone()[0]
+        result = []
+        rank = ahead + 1
+        for i, (gid, pts) in enumerate(rows):
+            if i and pts != rows[i - 1][1]:
+                rank = offset + i + 1
+            result.append((rank, gid, pts))
+        return result
+
+    def gamer_rank(self, gamer_id: int, event_code: Optional[str] = None) -> Optional[Tuple[int, int, int]]:
+        table, col, where, params = self._board(event_code)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {col} FROM {table} WHERE {where} AND gamer_id=?", params + (gamer_id,)).fetchone()
+            if row is None:
+                return None
+            points = row[0]
+            ahead = self._conn.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE {where} AND {col} > ?", params + (points,)).fetchone()[0]
+            size = self._conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0]
+        return ahead + 1, points, size
+
+    def search_gamers_by_card(self, keyword: str, prefix: bool = False, limit: Optional[int] = None) -> List[dict]:
+        kw = keyword.lower()
+        # SQLite 的 LIMIT -1 代表不限制
+        limit = -1 if limit is None else limit
+        with self._lock:
+            if not kw:
+                rows = self._conn.execute("SELECT gamer_id FROM gamers ORDER BY gamer_id LIMIT ?", (limit,)).fetchall()
+            elif prefix:
+                pattern = kw.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                rows = self._conn.execute(
+                    "SELECT gamer_id FROM gamers WHERE gamer_card_number LIKE ? ESCAPE '\\' "
+                    "ORDER BY gamer_card_number COLLATE NOCASE LIMIT ?", (pattern, limit)).fetchall()
+            else:
+                # 先以 n-gram 索引取候選，再比對完整子字串
+                rows = self._conn.execute(
+                    "SELECT g.gamer_id FROM card_grams c JOIN gamers g ON g.gamer_id = c.gamer_id "
+                    "WHERE c.gram = ? AND instr(lower(g.gamer_card_number), ?) > 0 "
+                    "ORDER BY g.gamer_card_number COLLATE NOCASE LIMIT ?", (kw[:GRAM_MAX], kw, limit)).fetchall()
+        return self._load_gamers([r[0] for r in rows])
+
+    def _load_gamers(self, ids: list) -> List[dict]:
+        """依 ids 順序組出完整的玩家 dict，每張子表只查一次。"""
+        if not ids:
+            return []
+        result = {}
+        ph = _placeholders(len(ids))
+        with self._lock:
+            conn = self._conn
+            for row in conn.execute(f"SELECT * FROM gamers WHERE gamer_id IN ({ph})", ids):
+                gamer = json.loads(row["extra"])
+                gamer.update({
+                    "gamer_id": row["gamer_id"],
+                    "gamer_card_number": row["gamer_card_number"],
+                    "gamer_is_blocked": bool(row["gamer_is_blocked"]),
+                    "gamer_bind_gamepass": row["gamer_bind_gamepass"],
+                    "joined_events": [],
+                    "history_event_list": json.loads(row["history_event_list"]),
+                    "history_event_pts_list": json.loads(row["history_event_pts_list"]),
+                    "events_points": {},
+                    "joined_event_timestamps": {},
+                    "redeemed_prizes": {},
+                    "points_history": []
+                })
+                result[row["gamer_id"]] = gamer
+            for row in conn.execute(
+                    f"SELECT * FROM gamer_events WHERE gamer_id IN ({ph}) ORDER BY gamer_id, seq", ids):
+                gamer = result[row["gamer_id"]]
+                if row["seq"] is not None:
+                    gamer["joined_events"].append(row["event_code"])
+                if row["joined_at"] is not None:
+                    gamer["joined_event_timestamps"][row["event_code"]] = row["joined_at"]
+            for row in conn.execute(f"SELECT * FROM event_points WHERE gamer_id IN ({ph})", ids):
+                result[row["gamer_id"]]["events_points"][row["event_code"]] = row["points"]
+            for row in conn.execute(f"SELECT * FROM gamer_totals WHERE gamer_id IN ({ph})", ids):
+                result[row["gamer_id"]]["total_points"] = row["total_points"]
+            for row in conn.execute(
+                    f"SELECT * FROM redeemed_prizes WHERE gamer_id IN ({ph}) ORDER BY gamer_id, event_code, seq", ids):
+                redeemed = result[row["gamer_id"]]["redeemed_prizes"].setdefault(row["event_code"], [])
+                if row["seq"] >= 0:
+                    redeemed.append(row["prize_id"])
+            for row in conn.execute(
+                    f"SELECT * FROM points_history WHERE gamer_id IN ({ph}) ORDER BY gamer_id, seq", ids):
+                rec = json.loads(row["extra"])
+                for c in HISTORY_COLUMNS:
+                    if row[c] is not None:
+                        rec[c] = row[c]
+                result[row["gamer_id"]]["points_history"].append(rec)
+        return [result[gid] for gid in ids if gid in result]
+
+    ###############################
+    # Event
+    ###############################
+    def get_event(self, event_code: str) -> Optional[dict]:
+        events = self._load_events(f"WHERE event_code=?", (event_code,))
+        return events[0] if events else None
+
+    def has_event(self, event_code: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM events WHERE event_code=?", (event_code,)).fetchone() is not None
+
+    def save_event(self, event: dict):
+        code = event["event_code"]
+        with self._transaction() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO events VALUES (?,?,?,?,?,?,?,?)",
+                (
+                    code,
+                    event.get("event_name"),
+                    event.get("event_description"),
+                    event.get("event_start_date"),
+                    event.get("event_end_date"),
+                    event.get("max_points", 0),
+                    json.dumps(event.get("gamer_list", [])),
+                    _extra(event, EVENT_COLUMNS + ("tasks", "prizes"))
+                )
+            )
+            cur.execute("DELETE FROM tasks WHERE event_code=?", (code,))
+            cur.execute("DELETE FROM prizes WHERE event_code=?", (code,))
+            for i, t in enumerate(event.get("tasks", [])):
+                cur.execute(
+                    "INSERT INTO tasks VALUES (?,?,?,?,?,?,?,?,?)",
+                    (
+                        code, t["task_id"], i, t.get("task_name"), t.get("task_description"),
+                        t.get("task_points", 0),
+                        json.dumps(t.get("assigned_users", [])),
+                        json.dumps(t.get("checked_users", [])),
+                        _extra(t, TASK_COLUMNS)
+                    )
+                )
+            for i, p in enumerate(event.get("prizes", [])):
+                cur.execute(
+                    "INSERT INTO prizes VALUES (?,?,?,?,?,?)",
+                    (code, p["prize_id"], i, p.get("prize_name"), p.get("points_required", 0), _extra(p, PRIZE_COLUMNS))
+                )
+        self.capabilities.event_saved(event)
+        self.versions.bump("events", code)
+
+    def delete_event(self, event_code: str):
+        with self._transaction() as cur:
+            for table in ("events", "tasks", "prizes"):
+                cur.execute(f"DELETE FROM {table} WHERE event_code=?", (event_code,))
+        self.capabilities.event_deleted(event_code)
+        self.versions.bump("events", event_code)
+
+    def clear_events(self):
+        with self._transaction() as cur:
+            codes = [r[0] for r in cur.execute("SELECT event_code FROM events")]
+            for table in ("events", "tasks", "prizes"):
+                cur.execute(f"DELETE FROM {table}")
+        for code in codes:
+            self.capabilities.event_deleted(code)
+            self.versions.bump("events", code)
+
+    def iter_events(self) -> Iterator[dict]:
+        return iter(self._load_events("ORDER BY rowid", ()))
+
+    def _load_events(self, where: str, params: tuple) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM events {where}", params).fetchall()
+            if not rows:
+                return []
+            events = {}
+            for row in rows:
+                ev = json.loads(row["extra"])
+                ev.update({
+                    "event_code": row["event_code"],
+                    "event_name": row["event_name"],
+                    "event_description": row["event_description"],
+                    "event_start_date": row["event_start_date"],
+                    "event_end_date": row["event_end_date"],
+                    "gamer_list": json.loads(row["gamer_list"]),
+                    "tasks": [],
+                    "max_points": row["max_points"],
+                    "prizes": []
+                })
+                events[row["event_code"]] = ev
+            codes = list(events)
+            ph = _placeholders(len(codes))
+            for row in self._conn.execute(
+                    f"SELECT * FROM tasks WHERE event_code IN ({ph}) ORDER BY event_code, seq", codes):
+                task = json.loads(row["extra"])
+                task.update({
+                    "task_id": row["task_id"],
+                    "task_name": row["task_name"],
+                    "task_description": row["task_description"],
+                    "task_points": row["task_points"],
+                    "assigned_users": json.loads(row["assigned_users"]),
+                    "checked_users": json.loads(row["checked_users"])
+                })
+                events[row["event_code"]]["tasks"].append(task)
+            for row in self._conn.execute(
+                    f"SELECT * FROM prizes WHERE event_code IN ({ph}) ORDER BY event_code, seq", codes):
+                prize = json.loads(row["extra"])
+                prize.update({
+                    "prize_id": row["prize_id"],
+                    "prize_name": row["prize_name"],
+                    "points_required": row["points_required"]
+                })
+                events[row["event_code"]]["prizes"].append(prize)
+        return [Event(ev) for ev in events.values()]
+
+    ###############################
+    # 圖片
+    ###############################
+    def get_images(self, user_id: int) -> list:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM images WHERE user_id=? ORDER BY seq", (user_id,)).fetchall()
+        return [self._image_from_row(r) for r in rows]
+
+    def save_images(self, user_id: int, images: list):
+        with self._transaction() as cur:
+            cur.execute("DELETE FROM images WHERE user_id=?", (user_id,))
+            cur.executemany(
+                "INSERT INTO images VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                [_image_row(user_id, i, img) for i, img in enumerate(images)]
+            )
+        self.capabilities.images_saved(user_id, images)
+        self.pending_images.set_user(user_id, images)
+        self.image_phashes.set_user(user_id, images)
+        self.versions.bump("user_images", user_id)
+
+    def get_image(self, user_id: int, seq: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM images WHERE user_id=? AND seq=?", (user_id, seq)).fetchone()
+        return self._image_from_row(row) if row else None
+
+    def update_image(self, user_id: int, seq: int, image: dict):
+        with self._transaction() as cur:
+            cur.execute("INSERT OR REPLACE INTO images VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)", _image_row(user_id, seq, image))
+        self.capabilities.image_saved(user_id, image)
+        self.pending_images.set_image(user_id, seq, image)
+        self.image_phashes.set_image(user_id, seq, image)
+        self.versions.bump("user_images", user_id)
+
+    def iter_images(self) -> Iterator[Tuple[int, list]]:
+        with self._lock:
+            user_ids = [r[0] for r in self._conn.execute("SELECT DISTINCT user_id FROM images ORDER BY user_id")]
+        for uid in user_ids:
+            yield uid, self.get_images(uid)
+
+    def images_with_hash(self, content_hash: str) -> List[Tuple[int, dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM images WHERE content_hash=? ORDER BY user_id, seq", (content_hash,)).fetchall()
+        return [(r["user_id"], self._image_from_row(r)) for r in rows]
+
+    def task_images(self, event_code: str, task_id: int) -> List[Tuple[int, dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM images WHERE event_code=? AND task_id=? ORDER BY user_id, seq",
+                (event_code, task_id)).fetchall()
+        return [(r["user_id"], self._image_from_row(r)) for r in rows]
+
+    def _image_from_row(self, row) -> dict:
+        img = json.loads(row["extra"])
+        img["user_id"] = row["user_id"]
+        for c in IMAGE_COLUMNS:
+            img[c] = row[c]
+        # 時間欄位只在有值時出現，與 data.json 的格式一致
+        for c in IMAGE_OPTIONAL_COLUMNS + IMAGE_ADDED_COLUMNS:
+            if row[c] is not None:
+                img[c] = row[c]
+        return img
+
+
+class _Transaction:
+    """with store._transaction() as cur: ... 一次 commit，失敗則 rollback。"""
+
+    def __init__(self, store: SqliteStore):
+        self.store = store
+
+    def __enter__(self):
+        self.store._lock.acquire()
+        self.cur = self.store._conn.cursor()
+        # 在 batch() 之內時改用 SAVEPOINT，由 batch() 一次 commit
+        self.nested = self.store._batch_depth > 0
+        self.cur.execute("SAVEPOINT tx" if self.nested else "BEGIN IMMEDIATE")
+        return self.cur
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.cur.execute("RELEASE tx" if self.nested else "COMMIT")
+            elif self.nested:
+                self.cur.execute("ROLLBACK TO tx")
+                self.cur.execute("RELEASE tx")
+            else:
+                self.cur.execute("ROLLBACK")
+        finally:
+            self.cur.close()
+            self.store._lock.release()
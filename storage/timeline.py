@@ -0,0 +1,215 @@
+import bisect
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+# 同一時間點的排序：點數紀錄 -> 加入活動 -> 圖片 (與舊版合併後穩定排序的結果相同)
+SOURCE_HISTORY = 0
+SOURCE_JOINED = 1
+SOURCE_IMAGES = 2
+
+TZ_TAIPEI = timezone(timedelta(hours=8))
+IMAGE_STAMPS = (("upload_time", "image_upload"), ("approved_time", "image_approved"), ("rejected_time", "image_rejected"))
+
+
+def _parse(stamp) -> Optional[datetime]:
+    if not stamp:
+        return None
+    try:
+        dt = datetime.fromisoformat(stamp)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(TZ_TAIPEI).replace(tzinfo=None)
+    return dt
+
+
+def _history_entry(rec: dict) -> dict:
+    entry = dict(rec)
+    entry["kind"] = "points"
+    return entry
+
+
+def _joined_entries(joined_map: dict) -> list:
+    return [
+        {"kind": "joined", "timestamp": stamp, "event_code": code}
+        for code, stamp in joined_map.items()
+    ]
+
+
+def _image_entries(images: list) -> list:
+    entries = []
+    for img in images:
+        for field, kind in IMAGE_STAMPS:
+            if field in img:
+                entries.append({
+                    "kind": kind,
+                    "timestamp": img[field],
+                    "filename": img.get("filename"),
+                    "event_code": img.get("event_code"),
+                    "task_id": img.get("task_id")
+                })
+    return entries
+
+
+class GamerTimeline:
+    """
+    單一玩家的活動時間軸，依時間排序 (key = (時間, 來源, 序號))。
+    新增的點數紀錄以 bisect 插入；加入活動 / 圖片變動時只替換該來源的項目。
+    """
+
+    def __init__(self):
+        self._keys: List[tuple] = []
+        self._entries = {}
+        self._history_len = 0
+        self._history_last = None
+        self._joined_sig = None
+        self._images_sig = None
+        self.versions = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _insert(self, source: int, seq: int, entry: dict):
+        dt = _parse(entry.get("timestamp"))
+        if dt is None:
+            return
+        key = (dt, source, seq)
+        bisect.insort(self._keys, key)
+        self._entries[key] = entry
+
+    def _drop_source(self, source: int):
+        kept = [k for k in self._keys if k[1] != source]
+        for k in self._keys:
+            if k[1] == source:
+                del self._entries[k]
+        self._keys = kept
+
+    def refresh(self, gamer: Optional[dict], images: list):
+        gamer = gamer or {}
+        history = gamer.get("points_history", [])
+        n = self._history_len
+        # 一般情況下 points_history 只會往後附加：只插入新的部分
+        if len(history) >= n and (n == 0 or history[n - 1] == self._history_last):
+            start = n
+        else:
+            self._drop_source(SOURCE_HISTORY)
+            start = 0
+        for i in range(start, len(history)):
+            self._insert(SOURCE_HISTORY, i, _history_entry(history[i]))
+        self._history_len = len(history)
+        self._history_last = dict(history[-1]) if history else None
+
+        joined = gamer.get("joined_event_timestamps", {})
+        joined_sig = tuple(joined.items())
+        if joined_sig != self._joined_sig:
+            self._drop_source(SOURCE_JOINED)
+            for i, entry in enumerate(_joined_entries(joined)):
+                self._insert(SOURCE_JOINED, i, entry)
+            self._joined_sig = joined_sig
+
+        image_entries = _image_entries(images)
+        images_sig = tuple((e["kind"], e["timestamp"], e["filename"], e["task_id"]) for e in image_entries)
+        if images_sig != self._images_sig:
+            self._drop_source(SOURCE_IMAGES)
+            for i, entry in enumerate(image_entries):
+                self._insert(SOURCE_IMAGES, i, entry)
+            self._images_sig = images_sig
+
+    def last(self, n: int) -> List[dict]:
+        """最近 n 筆，依時間由舊到新。"""
+        return [self._entries[k] for k in self._keys[-n:]] if n > 0 else []
+
+    def page(self, offset: int = 0, limit: int = 100) -> List[dict]:
+        """由最新往回數 offset 筆後的一頁，依時間由舊到新。"""
+        end = len(self._keys) - offset
+        if end <= 0:
+            return []
+        return [self._entries[k] for k in self._keys[max(end - limit, 0):end]]
+
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[dict]:
+        """start <= 時間 < end 的項目 (bisect 取範圍)。"""
+        lo = bisect.bisect_left(self._keys, (start,)) if start else 0
+        hi = bisect.bisect_left(self._keys, (end,)) if end else len(self._keys)
+        return [self._entries[k] for k in self._keys[lo:hi]]
+
+
+class TimelineIndex:
+    """
+    依需要建立並快取各玩家的 GamerTimeline。
+    以 store.versions 判斷玩家 / 圖片是否有變動，有變動才增量更新。
+    查詢都在鎖內進行，回傳的是清單副本。
+    """
+
+    def __init__(self, store, max_gamers: int = 10000):
+        self.store = store
+        self.max_gamers = max_gamers
+        self._lock = threading.Lock()
+        self._timelines = OrderedDict()
+
+    def _get(self, gamer_id: int) -> GamerTimeline:
+        # 呼叫端需持有 self._lock
+        versions = self.store.versions
+        current = (versions.get("gamers", gamer_id), versions.get("user_images", gamer_id))
+        timeline = self._timelines.get(gamer_id)
+        if timeline is None:
+            timeline = GamerTimeline()
+            self._timelines[gamer_id] = timeline
+            while len(self._timelines) > self.max_gamers:
+                self._timelines.popitem(last=False)
+        self._timelines.move_to_end(gamer_id)
+        if timeline.versions != current:
+            timeline.refresh(self.store.get_gamer(gamer_id), self.store.get_images(gamer_id))
+            timeline.versions = current
+        return timeline
+
+    def count(self, gamer_id: int) -> int:
+        with self._lock:
+            return len(self._get(gamer_id))
+
+    def last(self, gamer_id: int, n: int) -> List[dict]:
+        with self._lock:
+            return self._get(gamer_id).last(n)
+
+    def page(self, gamer_id: int, offset: int = 0, limit: int = 100) -> List[dict]:
+        with self._lock:
+            return self._get(gamer_id).page(offset, limit)
+
+    def between(self, gamer_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[dict]:
+        with self._lock:
+            return self._get(gamer_id).between(start, end)
+
+
+def describe(entry: dict, store) -> str:
+    """時間軸項目的說明文字 (網頁與 Discord 選單共用)。"""
+    kind = entry["kind"]
+    ev_code = entry.get("event_code") or ""
+    if kind == "joined":
+        return f"加入活動 {ev_code}"
+    if kind.startswith("image_"):
+        event_obj = store.get_event(ev_code)
+        task = event_obj.task(entry.get("task_id")) if event_obj else None
+        task_name = task.get("task_name", "未知任務") if task else "未知任務"
+        if kind == "image_upload":
+            return f"上傳圖片 `{entry['filename']}` (活動={ev_code}, 任務={task_name})"
+        action = "審核通過" if kind == "image_approved" else "審核拒絕"
+        return f"圖片 `{entry['filename']}` {action} (活動={ev_code}, 任務={task_name})"
+
+    rtype = entry.get("type", "?")
+    pts = entry.get("points", 0)
+    if rtype == "admin_redeem":
+        event_obj = store.get_event(ev_code)
+        prize = event_obj.prize(entry.get("prize_id")) if event_obj else None
+        prize_name = prize["prize_name"] if prize else "?"
+        return f"獎品兌換 (活動：{ev_code}, 獎品={prize_name})"
+    if rtype == "global":
+        return f"全域加點 +{pts}"
+    if rtype == "event":
+        return f"活動({ev_code})加點 +{pts}"
+    if rtype == "api":
+        return f"API加點 +{pts}"
+    if rtype == "redeem":
+        # 舊版紀錄，pts 為負值
+        return f"兌換獎品 `{entry.get('prize_name', '?')}` {pts} 點"
+    return f"其他加點/動作 {pts}"
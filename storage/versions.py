@@ -0,0 +1,25 @@
+import os
+import threading
+from typing import Hashable, Optional
+
+
+class EntityVersions:
+    """
+    每筆資料 (gamers / events / user_images + key) 的版本號，寫入時遞增。
+    key 為 None 代表整個集合：任何一筆變動都會一併遞增。
+    epoch 每次啟動不同，重啟後舊的 ETag 不會誤判為未變動。
+    """
+
+    def __init__(self):
+        self.epoch = os.urandom(4).hex()
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def bump(self, collection: str, key: Optional[Hashable] = None):
+        with self._lock:
+            self._versions[(collection, None)] = self._versions.get((collection, None), 0) + 1
+            if key is not None:
+                self._versions[(collection, key)] = self._versions.get((collection, key), 0) + 1
+
+    def get(self, collection: str, key: Optional[Hashable] = None) -> int:
+        return self._versions.get((collection, key), 0)
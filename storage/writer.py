@@ -0,0 +1,147 @@
+import asyncio
+import functools
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+
+class StateWriter:
+    """
+    單一寫入者：所有修改資料的動作 (讀取 -> 檢查 -> 修改 -> save_*) 都包成指令排入佇列，
+    由專用執行緒依序執行，FastAPI (threadpool) 與 Discord (event loop) 的修改不會交錯，
+    不會有同時讀到舊值再互相覆蓋的問題。
+
+    - call(fn, ...)：同步呼叫，等待指令執行完畢並回傳結果 (FastAPI 的同步 handler 使用)
+    - await run(fn, ...)：在 event loop 中等待，不會卡住 loop (cogs / async handler 使用)
+    - @writer.command：把同步函式整個包成一個指令
+    已在寫入者執行緒內 (指令中再呼叫) 時直接執行，不重複排隊。
+    指令中丟出的例外會原樣傳回呼叫端。
+    尚未 start() 時第一個指令會自動啟動執行緒；stop() 之後再排入指令則丟出 RuntimeError。
+
+    JsonStore 設定 writer 後，寫入者執行緒取得的資料為複本 (copy-on-write)，
+    其他執行緒讀到的永遠是某次 save_* 完成後的完整版本。
+
+    observe(指令名稱, 排隊秒數, 執行秒數) 於每個指令執行後呼叫 (例如記入 metrics)。
+    """
+
+    def __init__(self, name: str = "state-writer", max_samples: int = 1000,
+                 observe: Optional[Callable[[str, float, float], None]] = None):
+        self.name = name
+        self.observe = observe
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stopped = False
+        self._waits = deque(maxlen=max_samples)
+        self._runs = deque(maxlen=max_samples)
+        self.executed = 0
+        self.failed = 0
+
+    ###############################
+    # 啟動 / 停止
+    ###############################
+    def start(self):
+        with self._start_lock:
+            self._stopped = False
+            self._start_thread()
+
+    def _start_thread(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """執行完已排入的指令後停止；之後不再接受新指令。"""
+        with self._start_lock:
+            self._stopped = True
+            thread = self._thread
+            if thread and thread.is_alive():
+                self._queue.put(None)
+        # 不持有鎖等待：排空期間其他執行緒的 submit 會立即收到 RuntimeError
+        if thread:
+            thread.join()
+        self._thread = None
+
+    def in_writer(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    ###############################
+    # 排入指令
+    ###############################
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        future = Future()
+        if self.in_writer():
+            self._execute(future, fn, args, kwargs, time.perf_counter())
+            return future
+        with self._start_lock:
+            # 在鎖內檢查並排入：stop() 放入的結束標記之後不會再有指令 (否則永遠不會執行)
+            if self._stopped:
+                raise RuntimeError(f"{self.name} 已停止，無法再排入指令")
+            self._start_thread()
+            self._queue.put((future, fn, args, kwargs, time.perf_counter()))
+        return future
+
+    def call(self, fn: Callable, *args, **kwargs):
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def command(self, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.call(fn, *args, **kwargs)
+        return wrapper
+
+    ###############################
+    # 寫入者執行緒
+    ###############################
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs, queued_at = item
+            self._execute(future, fn, args, kwargs, queued_at)
+
+    def _execute(self, future: Future, fn, args, kwargs, queued_at: float):
+        if not future.set_running_or_notify_cancel():
+            return
+        started = time.perf_counter()
+        wait = started - queued_at
+        self._waits.append(wait)
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.failed += 1
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            self.executed += 1
+            elapsed = time.perf_counter() - started
+            self._runs.append(elapsed)
+            if self.observe is not None:
+                self.observe(getattr(fn, "__name__", "command"), wait, elapsed)
+
+    ###############################
+    # 統計
+    ###############################
+    def stats(self) -> dict:
+        def pct(samples, p):
+            samples = sorted(samples)
+            return round(samples[min(int(len(samples) * p), len(samples) - 1)] * 1000, 3) if samples else None
+
+        return {
+            "queued": self._queue.qsize(),
+            "executed": self.executed,
+            "failed": self.failed,
+            "wait_ms_p50": pct(self._waits, 0.5),
+            "wait_ms_p95": pct(self._waits, 0.95),
+            "run_ms_p50": pct(self._runs, 0.5),
+            "run_ms_p95": pct(self._runs, 0.95)
+        }
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+import discord
+
+# 重試也不會成功的錯誤 (Token 錯誤、未開啟特權 intents)，需人工處理
+FATAL_ERRORS = (discord.LoginFailure, discord.PrivilegedIntentsRequired)
+
+log = logging.getLogger(__name__)
+
+
+class BotSupervisor:
+    """
+    在背景執行 Discord bot，與 FastAPI 共用同一個 event loop：
+    - 連線失敗時以非同步的指數退避 + jitter 重試，不會卡住網頁後台
+    - 連線維持超過 stable_after 秒後重設退避次數
+    - Token 錯誤等無法重試的錯誤，以及 setup (載入 cogs) 失敗時停止並標記為 failed
+    - stop() 取消背景工作並關閉 bot 連線
+    狀態 (health()) 供 /healthz 查詢。
+    """
+
+    def __init__(self, bot: discord.Client, token: str, setup: Optional[Callable[[], Awaitable]] = None,
+                 base_delay: float = 5.0, max_delay: float = 300.0, stable_after: float = 60.0):
+        self.bot = bot
+        self.token = token
+        self.setup = setup
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stable_after = stable_after
+        self.state = "stopped"
+        self.attempts = 0
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        self.connected_since: Optional[float] = None
+        self.disconnected_since: Optional[float] = None
+        self.retry_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        bot.add_listener(self._on_connected, "on_ready")
+        bot.add_listener(self._on_connected, "on_resumed")
+        bot.add_listener(self._on_disconnect, "on_disconnect")
+
+    ###############################
+    # 連線狀態 (由 bot 事件更新)
+    ###############################
+    async def _on_connected(self):
+        self.state = "connected"
+        if self.connected_since is None:
+            self.connected_since = time.time()
+        self.disconnected_since = None
+
+    async def _on_disconnect(self):
+        # discord.py 會自行重新連線；斷線期間標記為 reconnecting
+        if self.state == "connected":
+            self.state = "reconnecting"
+        self.connected_since = None
+        if self.disconnected_since is None:
+            self.disconnected_since = time.time()
+
+    ###############################
+    # 啟動 / 停止
+    ###############################
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="discord-bot")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.state = "stopped"
+
+    async def _run(self):
+        try:
+            async with self.bot:
+                if self.setup is not None:
+                    self.state = "setup"
+                    try:
+                        await self.setup()
+                    except Exception as e:
+                        self._fail(e)
+                        return
+                await self._connect_loop()
+        finally:
+            # 離開 async with 時 bot 已關閉
+            self.connected_since = None
+
+    async def _connect_loop(self):
+        while True:
+            self.state = "connecting"
+            self.retry_at = None
+            started = time.monotonic()
+            try:
+                await self.bot.start(self.token)
+                # start() 正常返回代表 bot 被關閉 (例如管理員指令)，不再重連
+                self.state = "stopped"
+                return
+            except FATAL_ERRORS as e:
+                self._fail(e)
+                return
+            except Exception as e:
+                if time.monotonic() - started >= self.stable_after:
+                    self.attempts = 0
+                self.attempts += 1
+                self.restarts += 1
+                self.last_error = repr(e)
+                self.connected_since = None
+                if self.disconnected_since is None:
+                    self.disconnected_since = time.time()
+                delay = min(self.max_delay, self.base_delay * 2 ** (self.attempts - 1))
+                delay *= random.uniform(0.5, 1.5)
+                self.state = "backoff"
+                self.retry_at = time.time() + delay
+                log.warning("連接Discord失敗: %r, %.1f 秒後重試 (第 %d 次)", e, delay, self.attempts)
+                await asyncio.sleep(delay)
+
+    def _fail(self, error: Exception):
+        self.state = "failed"
+        self.last_error = repr(error)
+        log.error("Discord bot 無法啟動，停止重試: %r", error, exc_info=error)
+
+    ###############################
+    # 狀態
+    ###############################
+    @property
+    def connected(self) -> bool:
+        return self.state == "connected" and self.bot.is_ready() and not self.bot.is_closed()
+
+    def health(self) -> dict:
+        now = time.time()
+        latency = self.bot.latency if self.connected else None
+        return {
+            "state": self.state,
+            "connected": self.connected,
+            "latency_ms": round(latency * 1000, 1) if latency is not None and latency == latency else None,
+            "connected_for": round(now - self.connected_since, 1) if self.connected_since else None,
+            "disconnected_for": round(now - self.disconnected_since, 1) if self.disconnected_since else None,
+            "retry_in": round(max(self.retry_at - now, 0), 1) if self.state == "backoff" and self.retry_at else None,
+            "attempts": self.attempts,
+            "restarts": self.restarts,
+            "last_error": self.last_error
+        }
+
+
+class LoopLagMonitor:
+    """
+    定期量測 event loop 的延遲 (預定醒來時間與實際醒來時間的差)。
+    延遲高代表有同步的阻塞呼叫卡住 loop (網頁與 bot 都會受影響)。
+    """
+
+    def __init__(self, interval: float = 0.5, window: int = 120):
+        self.interval = interval
+        self.window = window
+        self.last = 0.0
+        self._samples = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="loop-lag")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.last = max(loop.time() - expected, 0.0)
+            self._samples.append(self.last)
+            if len(self._samples) > self.window:
+                del self._samples[0]
+
+    def stats(self) -> dict:
+        return {
+            "last_ms": round(self.last * 1000, 1),
+            "max_ms": round(max(self._samples, default=0.0) * 1000, 1)
+        }
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# 專案沒有打包設定：讓測試可以直接 import storage、notify 等模組
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import open_store  # noqa: E402
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    """兩種後端各跑一次；測試結束時關閉。"""
+    store = open_store(request.param, str(tmp_path / "data.json"), str(tmp_path / "data.db"))
+    yield store
+    store.close()
@@ -0,0 +1,93 @@
+import pytest
+
+from storage import JsonStore, StateWriter, credit_points, new_event, new_gamer
+
+
+@pytest.fixture
+def writer(store):
+    writer = StateWriter()
+    writer.start()
+    store.writer = writer
+    yield writer
+    writer.stop()
+
+
+def seed(store):
+    store.save_gamer(new_gamer(1, "RGPAA001"))
+    store.save_gamer(new_gamer(2, "RGPAA002"))
+    store.save_event(new_event("RAE001", "n", "d", "2026-01-01", "2026-12-31"))
+    store.save_images(1, [{"image_id": "img1", "status": "pending", "event_code": "RAE001", "task_id": 1}])
+
+
+def test_failed_batch_is_all_or_nothing(store, writer):
+    writer.call(seed, store)
+
+    def review():
+        with store.batch():
+            user_id, seq, img = store.find_image("img1")
+            img["status"] = "approved"
+            store.update_image(user_id, seq, img)
+            gamer = store.get_gamer(1)
+            credit_points(gamer, 5, "RAE001")
+            gamer["gamer_card_number"] = "RGPAA009"
+            store.save_gamer(gamer)
+            # 第二位玩家拿走第一位原本的卡號：回復時須依相反順序處理
+            gamer = store.get_gamer(2)
+            gamer["gamer_card_number"] = "RGPAA001"
+            store.save_gamer(gamer)
+            store.save_gamer(new_gamer(3))
+            store.delete_event("RAE001")
+            raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        writer.call(review)
+
+    assert store.find_image("img1")[2]["status"] == "pending"
+    assert store.get_gamer(1)["gamer_card_number"] == "RGPAA001"
+    assert store.get_gamer(2)["gamer_card_number"] == "RGPAA002"
+    assert store.find_gamer_by_card("RGPAA001")["gamer_id"] == 1
+    assert not store.has_gamer(3)
+    assert store.has_event("RAE001")
+    assert store.leaderboard("RAE001") == []
+    assert store.gamer_rank(1) == (1, 0, 2)
+
+
+def test_successful_batch_keeps_every_change(store, writer):
+    writer.call(seed, store)
+
+    def review():
+        with store.batch():
+            with store.batch():
+                gamer = store.get_gamer(1)
+                credit_points(gamer, 5)
+                store.save_gamer(gamer)
+            store.save_gamer(new_gamer(3))
+
+    writer.call(review)
+    assert store.get_gamer(1)["total_points"] == 5
+    assert store.has_gamer(3)
+
+
+def test_rolled_back_state_is_what_gets_persisted(tmp_path):
+    path = str(tmp_path / "data.json")
+    store = JsonStore(path)
+    store.load()
+    writer = StateWriter()
+    store.writer = writer
+    writer.call(seed, store)
+
+    def fail():
+        with store.batch():
+            store.save_gamer(new_gamer(3))
+            store.delete_gamer(2)
+            raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        writer.call(fail)
+    writer.stop()
+    store.close()
+
+    reloaded = JsonStore(path)
+    reloaded.load()
+    assert sorted(g["gamer_id"] for g in reloaded.iter_gamers()) == [1, 2]
+    reloaded.close()
@@ -0,0 +1,75 @@
+import copy
+import json
+
+import pytest
+
+from storage import CardIndex, DuplicateCardError, JsonStore, new_gamer
+
+
+def test_card_belongs_to_one_gamer():
+    cards = CardIndex()
+    cards.set(1, "RGPAB123")
+    with pytest.raises(DuplicateCardError) as e:
+        cards.set(2, "RGPAB123")
+    assert e.value.owner_id == 1
+    # 失敗的 set 不會留下任何變動
+    assert cards.owner("RGPAB123") == 1
+    assert cards.card_of(2) is None
+    # 同一位玩家重設相同卡號不算重複
+    cards.set(1, "RGPAB123")
+
+
+def test_rebinding_releases_the_old_card():
+    cards = CardIndex()
+    cards.set(1, "RGPAB123")
+    cards.set(1, "RGPCD456")
+    assert cards.owner("RGPAB123") is None
+    cards.set(2, "RGPAB123")
+    assert cards.owner("RGPAB123") == 2
+    assert cards.search("ab1") == [2]
+
+    cards.set(1, None)
+    assert cards.card_of(1) is None
+    assert cards.search("cd4") == []
+    cards.remove(2)
+    assert len(cards) == 0
+    assert cards.ordered() == []
+
+
+def test_prefix_and_substring_search_ignore_case():
+    cards = CardIndex()
+    for gid, card in [(1, "RGPAB123"), (2, "RGPAB999"), (3, "RGPZZ123"), (4, "XYZAB123")]:
+        cards.set(gid, card)
+    assert cards.prefix("rgpab") == [1, 2]
+    assert cards.prefix("RGPZ") == [3]
+    assert cards.prefix("nope") == []
+    # 短關鍵字查 n-gram，長關鍵字以 3-gram 交集後比對
+    assert cards.search("Z") == [3, 4]
+    assert cards.search("ab123") == [1, 4]
+    assert cards.search("b12") == [1, 4]
+    assert cards.search("ab1239") == []
+
+
+def test_duplicate_cards_in_legacy_data_are_cleared_on_load(tmp_path):
+    path = str(tmp_path / "data.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"user_images": {}, "events": {}, "gamers": {
+            "1": new_gamer(1, "RGPAB123"),
+            "2": new_gamer(2, "RGPAB123"),
+        }}, f)
+
+    store = JsonStore(path)
+    store.load()
+    assert store.find_gamer_by_card("RGPAB123")["gamer_id"] == 1
+    assert store.get_gamer(2)["gamer_card_number"] is None
+    # 清除後該玩家可以正常存檔
+    gamer = copy.deepcopy(store.get_gamer(2))
+    gamer["points"] = 1
+    store.save_gamer(gamer)
+    store.close()
+
+    reloaded = JsonStore(path)
+    reloaded.load()
+    assert reloaded.get_gamer(2)["gamer_card_number"] is None
+    assert reloaded.get_gamer(1)["gamer_card_number"] == "RGPAB123"
+    reloaded.close()
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from jobs import JobManager
+from storage import JsonStore, StateWriter, new_event, new_gamer
+from storage.event_refs import strip_event_refs
+
+
+def join(store, gamer_id: int, event_code: str):
+    gamer = store.get_gamer(gamer_id) or new_gamer(gamer_id)
+    gamer["joined_events"] = gamer.get("joined_events", []) + [event_code]
+    gamer["events_points"] = {**gamer.get("events_points", {}), event_code: 3}
+    gamer["points_history"] = gamer.get("points_history", []) + [
+        {"type": "event", "event_code": event_code, "points": 3}]
+    store.save_gamer(gamer)
+
+
+def test_reverse_index_lists_only_participants(store):
+    store.save_event(new_event("RAE001", "n", "d", "2026-01-01", "2026-12-31"))
+    join(store, 1, "RAE001")
+    join(store, 3, "RAE001")
+    store.save_gamer(new_gamer(2))
+    assert store.gamers_with_event("RAE001") == [1, 3]
+
+    gamer = store.get_gamer(1)
+    assert strip_event_refs(gamer, "RAE001")
+    assert not strip_event_refs(gamer, "RAE001")
+    store.save_gamer(gamer)
+    assert store.gamers_with_event("RAE001") == [3]
+
+
+def test_code_is_blocked_until_cleanup_finishes(store):
+    store.save_event(new_event("RAE001", "n", "d", "2026-01-01", "2026-12-31"))
+    join(store, 1, "RAE001")
+    join(store, 2, "RAE001")
+    assert not store.event_cleanup_pending("RAE001")
+
+    store.delete_event("RAE001")
+    for gid in store.gamers_with_event("RAE001"):
+        assert store.event_cleanup_pending("RAE001")
+        gamer = store.get_gamer(gid)
+        strip_event_refs(gamer, "RAE001")
+        store.save_gamer(gamer)
+    assert not store.event_cleanup_pending("RAE001")
+    assert not store.event_cleanup_pending("RAE404")
+
+
+def test_writer_refuses_commands_after_stop():
+    writer = StateWriter()
+    assert writer.call(lambda: 1) == 1
+    writer.stop()
+    with pytest.raises(RuntimeError):
+        writer.call(lambda: 2)
+    # 明確 start() 後可再次使用
+    writer.start()
+    assert writer.call(lambda: 3) == 3
+    writer.stop()
+
+
+def test_stop_drains_queued_commands():
+    writer = StateWriter()
+    writer.start()
+    log = []
+    futures = [writer.submit(log.append, i) for i in range(100)]
+    writer.stop()
+    assert log == list(range(100))
+    assert all(f.done() for f in futures)
+
+
+def test_persister_does_not_restart_after_close(tmp_path):
+    store = JsonStore(str(tmp_path / "data.json"))
+    store.load()
+    store.start()
+    store.save_gamer(new_gamer(1))
+    store.close()
+    with pytest.raises(RuntimeError):
+        store.save_gamer(new_gamer(2))
+    assert store.persister._thread is None
+
+    reloaded = JsonStore(str(tmp_path / "data.json"))
+    reloaded.load()
+    assert reloaded.has_gamer(1) and not reloaded.has_gamer(2)
+    reloaded.close()
+
+
+def test_job_manager_stop_cancels_running_jobs():
+    async def main():
+        jobs = JobManager(chunk_size=1)
+        steps = []
+
+        async def step(item):
+            steps.append(item)
+            await asyncio.sleep(0.01)
+            return True
+
+        job = jobs.start("delete_event", "RAE001", range(1000), step)
+        await asyncio.sleep(0.05)
+        await jobs.stop()
+        done = len(steps)
+        await asyncio.sleep(0.05)
+        return job, done, len(steps)
+
+    job, done, after = asyncio.run(main())
+    assert job.status == "cancelled"
+    assert 0 < done < 1000
+    # 停止後不再執行任何步驟
+    assert after == done
@@ -0,0 +1,61 @@
+import copy
+
+from storage import Event, new_event
+
+
+def make_event() -> Event:
+    return new_event("RAE001", "活動", "說明", "2026-01-01", "2026-12-31")
+
+
+def test_ids_are_never_reused_after_removal():
+    event = make_event()
+    assert [event.add_task(name)["task_id"] for name in "abc"] == [1, 2, 3]
+    event.remove_task(3)
+    assert event.add_task("d")["task_id"] == 4
+    assert event.task(3) is None
+
+    assert event.add_prize("p1")["prize_id"] == 1
+    event.remove_prize(1)
+    assert event.add_prize("p2")["prize_id"] == 2
+    assert event.prize(1) is None
+    assert [p["prize_name"] for p in event["prizes"]] == ["p2"]
+
+
+def test_legacy_data_continues_from_max_id():
+    event = Event({
+        "event_code": "RAE001",
+        "tasks": [{"task_id": 2, "task_name": "a"}, {"task_id": 7, "task_name": "b"}],
+        "prizes": [{"prize_id": 3, "prize_name": "p"}],
+    })
+    assert event.task(7)["task_name"] == "b"
+    assert event.add_task("c")["task_id"] == 8
+    assert event.add_prize("q")["prize_id"] == 4
+
+
+def test_remove_then_add_keeps_lookups_current():
+    # 長度不變的變動 (刪一筆再加一筆) 不可留下舊的對照
+    event = make_event()
+    event.add_task("a")
+    event.add_task("b")
+    event.remove_task(1)
+    event.add_task("c")
+    assert event.task(1) is None
+    assert event.task(3)["task_name"] == "c"
+    assert len(event["tasks"]) == 2
+
+
+def test_replacing_the_list_reindexes():
+    event = make_event()
+    event.add_task("a")
+    event["tasks"] = [{"task_id": 9, "task_name": "z"}]
+    assert event.task(1) is None
+    assert event.task(9)["task_name"] == "z"
+
+
+def test_copy_has_its_own_lookups():
+    event = make_event()
+    event.add_task("a")
+    clone = copy.deepcopy(event)
+    clone.task(1)["task_name"] = "changed"
+    assert clone["tasks"][0]["task_name"] == "changed"
+    assert event.task(1)["task_name"] == "a"
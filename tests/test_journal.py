@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+from storage.journal import Journal, DELETED
+
+
+def write_lines(path, records):
+    with open(path, "a", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+
+
+def test_load_creates_empty_snapshot(tmp_path):
+    journal = Journal(str(tmp_path / "data.json"))
+    assert journal.load() == {"user_images": {}, "events": {}, "gamers": {}}
+    assert os.path.exists(tmp_path / "data.json")
+
+
+def test_replay_applies_updates_and_deletes(tmp_path):
+    path = str(tmp_path / "data.json")
+    journal = Journal(path)
+    journal.load()
+    journal.append("gamers", 1, {"gamer_id": 1, "points": 1})
+    journal.append("gamers", 2, {"gamer_id": 2})
+    journal.append("gamers", 1, {"gamer_id": 1, "points": 5})
+    journal.append("gamers", 2, DELETED)
+    journal.append_many([("events", "RAE001", {"event_code": "RAE001"})], fsync=True)
+    journal.close()
+
+    reopened = Journal(path)
+    state = reopened.load()
+    assert state["gamers"] == {"1": {"gamer_id": 1, "points": 5}}
+    assert state["events"] == {"RAE001": {"event_code": "RAE001"}}
+    # 重播後寫成新快照並清空日誌
+    assert not os.path.exists(reopened.journal_path)
+    with open(path, "rb") as f:
+        assert json.load(f)["gamers"] == {"1": {"gamer_id": 1, "points": 5}}
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    path = str(tmp_path / "data.json")
+    journal = Journal(path)
+    journal.load()
+    journal.append("gamers", 1, {"gamer_id": 1})
+    journal.close()
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"c": "gamers", "k": "2", "v": {"gam')
+
+    state = Journal(path).load()
+    assert state["gamers"] == {"1": {"gamer_id": 1}}
+
+
+def test_unknown_collection_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        Journal.encode_record("nope", 1, {})
+
+
+def test_compaction_merges_into_snapshot(tmp_path):
+    path = str(tmp_path / "data.json")
+    journal = Journal(path, compact_threshold=3)
+    journal.load()
+    for i in range(3):
+        journal.append("gamers", i, {"gamer_id": i})
+    journal.close()
+
+    assert not os.path.exists(journal.journal_path)
+    assert not os.path.exists(journal.compacting_path)
+    with open(path, "rb") as f:
+        assert sorted(json.load(f)["gamers"]) == ["0", "1", "2"]
+
+
+def test_writes_during_compaction_go_to_new_journal(tmp_path):
+    path = str(tmp_path / "data.json")
+    journal = Journal(path)
+    journal.load()
+    journal.append("gamers", 1, {"gamer_id": 1, "v": "old"})
+    journal.compact()
+    journal.append("gamers", 1, {"gamer_id": 1, "v": "new"})
+    journal.close()
+
+    assert Journal(path).load()["gamers"]["1"]["v"] == "new"
+
+
+def test_leftover_compacting_is_extended_not_overwritten(tmp_path):
+    path = str(tmp_path / "data.json")
+    journal = Journal(path)
+    journal.load()
+    # 上一次合併失敗留下的 .compacting
+    write_lines(journal.compacting_path, [
+        {"c": "gamers", "k": "1", "v": {"gamer_id": 1, "v": "old"}},
+        {"c": "gamers", "k": "2", "v": {"gamer_id": 2}},
+    ])
+    journal.append("gamers", 1, {"gamer_id": 1, "v": "new"})
+    journal.compact(wait=True)
+    journal.close()
+
+    assert not os.path.exists(journal.compacting_path)
+    with open(path, "rb") as f:
+        gamers = json.load(f)["gamers"]
+    assert gamers["1"]["v"] == "new"
+    assert "2" in gamers
+
+
+def test_load_replays_compacting_before_journal(tmp_path):
+    path = str(tmp_path / "data.json")
+    journal = Journal(path)
+    journal.load()
+    write_lines(journal.compacting_path, [{"c": "gamers", "k": "1", "v": {"v": "old"}}])
+    write_lines(journal.journal_path, [{"c": "gamers", "k": "1", "v": {"v": "new"}}])
+
+    state = Journal(path).load()
+    assert state["gamers"]["1"] == {"v": "new"}
+    assert not os.path.exists(journal.compacting_path)
@@ -0,0 +1,49 @@
+from storage import Leaderboard, credit_points, new_gamer
+from storage.leaderboard import LeaderboardIndex
+
+
+def test_ties_share_a_rank():
+    board = Leaderboard()
+    for gid, points in [(1, 10), (2, 30), (3, 20), (4, 20), (5, 5)]:
+        board.set(gid, points)
+    # 同分同名次，下一名跳號；同分依 gamer_id 排列
+    assert board.top(0, 10) == [(1, 2, 30), (2, 3, 20), (2, 4, 20), (4, 1, 10), (5, 5, 5)]
+    assert board.rank(4) == (2, 20)
+    assert board.rank(1) == (4, 10)
+    assert board.rank(99) is None
+    assert board.top(2, 2) == [(2, 4, 20), (4, 1, 10)]
+
+
+def test_point_changes_move_the_gamer():
+    board = Leaderboard()
+    board.set(1, 10)
+    board.set(2, 20)
+    board.set(1, 25)
+    assert board.rank(1) == (1, 25)
+    assert board.rank(2) == (2, 20)
+    board.remove(1)
+    assert board.rank(2) == (1, 20)
+    assert len(board) == 1
+    board.remove(1)
+    assert len(board) == 1
+
+
+def test_index_tracks_global_and_event_boards():
+    index = LeaderboardIndex()
+    a, b = new_gamer(1), new_gamer(2)
+    credit_points(a, 5, "RAE001")
+    credit_points(a, 3)
+    credit_points(b, 7, "RAE002")
+    index.update(a)
+    index.update(b)
+    assert index.board(None).top() == [(1, 1, 8), (2, 2, 7)]
+    assert index.board("RAE001").top() == [(1, 1, 5)]
+
+    # 玩家不再有某活動的點數時，從該活動榜移除；空榜一併刪除
+    a["events_points"].pop("RAE001")
+    index.update(a)
+    assert index.board("RAE001") is None
+
+    index.remove(2)
+    assert index.board("RAE002") is None
+    assert index.board(None).top() == [(1, 1, 8)]
@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+
+from notify import MAX_MESSAGE_LENGTH, Outbox
+
+
+class SendError(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(status)
+        self.status = status
+        self.retry_after = retry_after
+
+
+async def drain(outbox: Outbox, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while outbox.stats()["depth"]:
+        assert time.monotonic() < deadline, outbox.stats()
+        await asyncio.sleep(0.01)
+
+
+def run(outbox: Outbox):
+    async def main():
+        outbox.start()
+        try:
+            await drain(outbox)
+        finally:
+            outbox.stop()
+    asyncio.run(main())
+
+
+def test_append_merges_pending_dms():
+    outbox = Outbox()
+    sent = []
+
+    async def handler(payload):
+        sent.append(payload["content"])
+
+    outbox.register("dm", handler)
+    outbox.put("dm", {"content": "a"}, "dm:1", merge="append")
+    outbox.put("dm", {"content": "b"}, "dm:1", merge="append")
+    outbox.put("dm", {"content": "c"}, "dm:2", merge="append")
+    # 合併後超過長度上限：另開一則
+    outbox.put("dm", {"content": "x" * MAX_MESSAGE_LENGTH}, "dm:1", merge="append")
+    assert outbox.merged == 1
+    run(outbox)
+    assert sorted(sent) == sorted(["a\n\nb", "c", "x" * MAX_MESSAGE_LENGTH])
+
+
+def test_dedupe_skips_identical_pending_items():
+    outbox = Outbox()
+    outbox.put("menu", {"user_id": 1}, "dm:1", merge="dedupe")
+    outbox.put("menu", {"user_id": 1}, "dm:1", merge="dedupe")
+    outbox.put("menu", {"user_id": 2}, "dm:1", merge="dedupe")
+    assert outbox.stats()["depth"] == 2
+    assert outbox.merged == 1
+
+
+def test_transient_errors_are_retried():
+    outbox = Outbox(base_delay=0.01, max_delay=0.05)
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise SendError(500)
+
+    outbox.register("dm", handler)
+    outbox.put("dm", {"content": "a"}, "dm:1")
+    run(outbox)
+    assert len(attempts) == 3
+    assert (outbox.sent, outbox.retried, outbox.dropped) == (1, 2, 0)
+
+
+def test_rate_limited_send_waits_for_retry_after():
+    outbox = Outbox()
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise SendError(429, retry_after=0.2)
+
+    outbox.register("dm", handler)
+    outbox.put("dm", {"content": "a"}, "dm:1")
+    run(outbox)
+    assert attempts[1] - attempts[0] >= 0.15
+    assert outbox.sent == 1
+
+
+def test_permanent_errors_and_max_attempts_drop():
+    outbox = Outbox(base_delay=0.01, max_delay=0.01, max_attempts=3)
+    calls = {"forbidden": 0, "flaky": 0}
+
+    async def forbidden(payload):
+        calls["forbidden"] += 1
+        raise SendError(403)
+
+    async def flaky(payload):
+        calls["flaky"] += 1
+        raise SendError(503)
+
+    outbox.register("forbidden", forbidden)
+    outbox.register("flaky", flaky)
+    outbox.put("forbidden", {}, "dm:1")
+    outbox.put("flaky", {}, "dm:2")
+    run(outbox)
+    assert calls == {"forbidden": 1, "flaky": 3}
+    assert outbox.dropped == 2
+    assert outbox.sent == 0
+
+
+def test_token_bucket_limits_send_rate():
+    outbox = Outbox(rate=20, burst=2, workers=10)
+    sent = []
+
+    async def handler(payload):
+        sent.append(time.monotonic())
+
+    outbox.register("dm", handler)
+    for i in range(10):
+        outbox.put("dm", {"content": str(i)}, f"dm:{i}")
+    run(outbox)
+    # 前 2 則用掉 burst，其餘每秒 20 則：至少 (10 - 2) / 20 秒
+    assert len(sent) == 10
+    assert sent[-1] - sent[0] >= 0.35
+
+
+def test_unsent_messages_survive_restart(tmp_path):
+    path = str(tmp_path / "outbox.json")
+    outbox = Outbox(path)
+    outbox.put("dm", {"content": "a"}, "dm:1")
+    outbox.put("dm", {"content": "b"}, "dm:2")
+    outbox.stop()
+
+    reloaded = Outbox(path)
+    sent = []
+
+    async def handler(payload):
+        sent.append(payload["content"])
+
+    reloaded.register("dm", handler)
+    # 新訊息的 ID 接在載入的訊息之後
+    reloaded.put("dm", {"content": "c"}, "dm:3")
+    assert sorted(reloaded._messages) == [1, 2, 3]
+    run(reloaded)
+    assert sorted(sent) == ["a", "b", "c"]
+
+
+def test_put_before_start_from_many_threads():
+    outbox = Outbox()
+
+    def producer(n):
+        for i in range(500):
+            outbox.put("dm", {"content": f"{n}-{i}"}, f"dm:{i % 7}")
+
+    threads = [threading.Thread(target=producer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = outbox.stats()
+    assert stats["depth"] == stats["ready"] == 2000
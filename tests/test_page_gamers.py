@@ -0,0 +1,61 @@
+import pytest
+
+from storage import credit_points, new_gamer
+
+# gamer_id -> (卡號, 點數)
+GAMERS = {
+    1: ("RGPC0001", 10),
+    2: (None, 30),
+    3: ("rgpa0003", 20),
+    4: (None, 20),
+    5: ("RGPB0005", 0),
+    6: (None, 5),
+}
+
+
+@pytest.fixture
+def filled(store):
+    for gid, (card, points) in GAMERS.items():
+        gamer = new_gamer(gid, card)
+        if points:
+            credit_points(gamer, points)
+        store.save_gamer(gamer)
+    return store
+
+
+def page(store, sort, desc=False, offset=0, limit=50) -> list:
+    return [g["gamer_id"] for g in store.page_gamers(sort, desc, offset, limit)]
+
+
+def test_sort_by_id(filled):
+    assert page(filled, "gamer_id") == [1, 2, 3, 4, 5, 6]
+    assert page(filled, "gamer_id", desc=True, offset=1, limit=2) == [5, 4]
+    assert page(filled, "gamer_id", offset=10) == []
+
+
+def test_sort_by_points_matches_leaderboard(filled):
+    # desc 與排行榜相同：點數高到低，同分依 gamer_id；asc 則整個反過來
+    assert page(filled, "points", desc=True) == [2, 3, 4, 1, 6, 5]
+    assert page(filled, "points") == [5, 6, 1, 4, 3, 2]
+    assert page(filled, "points", desc=True, offset=2, limit=2) == [4, 1]
+
+
+def test_sort_by_card_puts_cardless_last(filled):
+    # 卡號不分大小寫排序，沒有卡號的玩家接在後面
+    assert page(filled, "card") == [3, 5, 1, 2, 4, 6]
+    assert page(filled, "card", desc=True) == [1, 5, 3, 6, 4, 2]
+
+
+@pytest.mark.parametrize("desc", [False, True])
+def test_card_pages_cross_into_the_cardless_tail(filled, desc):
+    full = page(filled, "card", desc)
+    # 第 2 頁橫跨有卡號 / 沒有卡號的交界，第 3 頁整頁都在尾段
+    pages = [page(filled, "card", desc, offset, 2) for offset in range(0, 8, 2)]
+    assert sum(pages, []) == full
+    assert pages[3] == []
+    assert page(filled, "card", desc, offset=3, limit=2) == full[3:5]
+
+
+def test_unknown_sort_is_rejected(filled):
+    with pytest.raises(ValueError):
+        filled.page_gamers("nope")
@@ -0,0 +1,50 @@
+from storage.image_index import PendingImageIndex
+
+
+def image(status: str, image_id=None) -> dict:
+    img = {"status": status, "filename": "a.png"}
+    if image_id:
+        img["image_id"] = image_id
+    return img
+
+
+def test_set_user_indexes_only_pending_images():
+    index = PendingImageIndex()
+    index.set_user(7, [image("approved", "a"), image("pending", "b"), image("pending")])
+    assert index.get("b") == (7, 1)
+    # 舊資料沒有 image_id：以 "使用者-序號" 代替
+    assert index.get("7-2") == (7, 2)
+    assert index.get("a") is None
+    assert len(index) == 2
+
+
+def test_set_user_replaces_previous_entries():
+    index = PendingImageIndex()
+    index.set_user(7, [image("pending", "a"), image("pending", "b")])
+    index.set_user(8, [image("pending", "c")])
+    index.set_user(7, [image("rejected", "a"), image("pending", "b")])
+    assert sorted(image_id for image_id, _ in index.items()) == ["b", "c"]
+    index.set_user(7, [])
+    assert [image_id for image_id, _ in index.items()] == ["c"]
+
+
+def test_set_image_tracks_review():
+    index = PendingImageIndex()
+    index.set_user(7, [image("pending", "a")])
+    index.set_image(7, 1, image("pending", "b"))
+    assert index.get("b") == (7, 1)
+    index.set_image(7, 0, image("approved", "a"))
+    index.set_image(7, 1, image("rejected", "b"))
+    assert len(index) == 0
+    assert list(index.items()) == []
+
+
+def test_store_find_image_follows_review(store):
+    store.save_images(7, [image("pending", "a"), image("pending", "b")])
+    user_id, seq, img = store.find_image("b")
+    assert (user_id, seq, img["image_id"]) == (7, 1, "b")
+
+    img["status"] = "approved"
+    store.update_image(user_id, seq, img)
+    assert store.find_image("b") is None
+    assert [image_id for image_id, _, _ in store.iter_pending_images()] == ["a"]
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from storage.image_index import PerceptualHashIndex
+
+
+def phash(value: int) -> str:
+    return f"{value:016x}"
+
+
+def flip(value: int, bits) -> int:
+    for b in bits:
+        value ^= 1 << b
+    return value
+
+
+@pytest.fixture
+def hashes():
+    rng = random.Random(1234)
+    base = rng.getrandbits(64)
+    values = [rng.getrandbits(64) for _ in range(300)]
+    # 加入與 base 只差幾個位元的圖片，確保查詢有結果
+    values += [flip(base, rng.sample(range(64), k)) for k in range(0, 13) for _ in range(3)]
+    return base, values
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 7, 8, 12])
+def test_near_matches_brute_force(hashes, max_distance):
+    base, values = hashes
+    index = PerceptualHashIndex()
+    index.set_user(1, [{"phash": phash(v)} for v in values])
+
+    expected = sorted(
+        (bin(v ^ base).count("1"), 1, seq) for seq, v in enumerate(values)
+        if bin(v ^ base).count("1") <= max_distance
+    )
+    assert index.near(phash(base), max_distance) == expected
+
+
+def test_updates_and_removals():
+    index = PerceptualHashIndex()
+    index.set_user(1, [{"phash": phash(0)}, {"status": "pending"}, {"phash": phash(0b111)}])
+    index.set_user(2, [{"phash": phash(1)}])
+    assert len(index) == 3
+    assert index.near(phash(0), 3) == [(0, 1, 0), (1, 2, 0), (3, 1, 2)]
+
+    index.set_image(1, 0, {"phash": phash(0xFFFF)})
+    assert index.near(phash(0), 1) == [(1, 2, 0)]
+    index.set_user(2, [])
+    index.set_image(1, 2, {})
+    assert index.near(phash(0), 3) == []
+    assert len(index) == 1
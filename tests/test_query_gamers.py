@@ -0,0 +1,45 @@
+from storage import new_gamer
+
+
+def fill(store, count: int):
+    for gid in range(1, count + 1):
+        gamer = new_gamer(gid, f"RGPA{gid:04d}" if gid % 2 else None)
+        gamer["gamer_is_blocked"] = gid % 3 == 0
+        gamer["joined_events"] = ["RAE001"] if gid % 5 == 0 else []
+        store.save_gamer(gamer)
+
+
+def ids(gamers) -> list:
+    return [g["gamer_id"] for g in gamers]
+
+
+def test_cursor_pages_cover_every_gamer_once(store):
+    # 超過 SqliteStore 的分批大小 (500)，跨批次也不可重複或遺漏
+    fill(store, 1203)
+    seen, cursor = [], None
+    while True:
+        page = []
+        for gamer in store.query_gamers(after=cursor):
+            page.append(gamer["gamer_id"])
+            if len(page) == 100:
+                break
+        if not page:
+            break
+        seen += page
+        cursor = page[-1]
+    assert seen == list(range(1, 1204))
+
+
+def test_filters_combine(store):
+    fill(store, 30)
+    assert ids(store.query_gamers(blocked=True)) == list(range(3, 31, 3))
+    assert ids(store.query_gamers(has_card=False, blocked=False)) == [2, 4, 8, 10, 14, 16, 20, 22, 26, 28]
+    assert ids(store.query_gamers(event_code="RAE001", has_card=True)) == [5, 15, 25]
+    assert ids(store.query_gamers(after=20, event_code="RAE001")) == [25, 30]
+    assert ids(store.query_gamers(after=30)) == []
+
+
+def test_cursor_skips_deleted_gamers(store):
+    fill(store, 10)
+    store.delete_gamer(6)
+    assert ids(store.query_gamers(after=4)) == [5, 7, 8, 9, 10]
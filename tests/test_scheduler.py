@@ -0,0 +1,47 @@
+import threading
+import time
+
+from storage import JsonStore, new_gamer
+
+
+def test_changes_within_the_window_are_one_batch(tmp_path):
+    seen = []
+    store = JsonStore(str(tmp_path / "data.json"), debounce_seconds=0.2, observe_flush=seen.append)
+    store.load()
+    store.start()
+    for gid in range(20):
+        store.save_gamer(new_gamer(gid))
+    deadline = time.monotonic() + 5
+    while store.persist_stats()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert store.persist_stats()["flushes"] == 1
+    assert len(seen) == 1
+    store.close()
+
+
+def test_concurrent_flushes_keep_the_latest_value(tmp_path):
+    path = str(tmp_path / "data.json")
+    store = JsonStore(path, debounce_seconds=0.001)
+    store.load()
+    store.start()
+
+    def worker(n):
+        for i in range(200):
+            gamer = new_gamer(1)
+            gamer["total_points"] = n * 1000 + i
+            store.save_gamer(gamer)
+            store.flush()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    final = store.get_gamer(1)["total_points"]
+    store.close()
+
+    reloaded = JsonStore(path)
+    reloaded.load()
+    assert reloaded.get_gamer(1)["total_points"] == final
+    reloaded.close()
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+import pytest
+
+from storage import StateWriter, credit_points, new_gamer, total_points
+
+
+@pytest.fixture
+def writer():
+    writer = StateWriter()
+    writer.start()
+    yield writer
+    writer.stop()
+
+
+def test_commands_run_in_submission_order(writer):
+    log = []
+    futures = [writer.submit(log.append, i) for i in range(200)]
+    for f in futures:
+        f.result()
+    assert log == list(range(200))
+
+
+def test_each_thread_keeps_its_own_order(writer):
+    log = []
+
+    def producer(n):
+        for i in range(200):
+            writer.call(log.append, (n, i))
+
+    threads = [threading.Thread(target=producer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(log) == 800
+    for n in range(4):
+        assert [i for m, i in log if m == n] == list(range(200))
+
+
+def test_commands_never_interleave(writer):
+    counter = {"value": 0}
+
+    def increment():
+        # 讀取 -> 讓出 -> 寫回：若指令交錯執行就會遺失更新
+        value = counter["value"]
+        threading.Event().wait(0.0001)
+        counter["value"] = value + 1
+
+    threads = [threading.Thread(target=lambda: [writer.call(increment) for _ in range(50)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counter["value"] == 200
+
+
+def test_nested_calls_run_inline_and_errors_propagate(writer):
+    def outer():
+        assert writer.in_writer()
+        return writer.call(lambda: threading.current_thread().name)
+
+    assert writer.call(outer) == writer.name
+    assert not writer.in_writer()
+
+    with pytest.raises(KeyError):
+        writer.call(lambda: {}["missing"])
+    assert writer.stats()["failed"] == 1
+    # 失敗的指令不影響之後的指令
+    assert writer.call(lambda: 42) == 42
+
+
+def test_run_awaits_from_the_event_loop(writer):
+    async def main():
+        return await asyncio.gather(*(writer.run(lambda i=i: i * 2) for i in range(10)))
+
+    assert asyncio.run(main()) == [i * 2 for i in range(10)]
+
+
+def test_writer_mutates_copies_until_saved(store, writer):
+    """寫入者修改的是複本：其他執行緒先前取得的物件不會被改到一半。"""
+    store.writer = writer
+    writer.call(store.save_gamer, new_gamer(1))
+    published = store.get_gamer(1)
+
+    def update():
+        gamer = store.get_gamer(1)
+        credit_points(gamer, 5)
+        assert published.get("total_points", 0) == 0
+        store.save_gamer(gamer)
+
+    writer.call(update)
+    assert store.get_gamer(1)["total_points"] == 5
+    assert published.get("total_points", 0) == 0
+
+
+def test_total_points_does_not_write_back():
+    gamer = {"history_event_pts_list": [3, 4]}
+    assert total_points(gamer) == 7
+    assert "total_points" not in gamer
@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import Optional
+
+import aiohttp
+
+from image_archive import EXTENSIONS, ImageArchive, perceptual_hash
+
+# 依檔案開頭的 magic bytes 判斷格式，不看副檔名
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+SNIFF_BYTES = 16
+
+
+class UploadRejected(Exception):
+    """上傳的檔案不符合限制；訊息可直接回覆給使用者。"""
+
+
+def sniff(head: bytes) -> Optional[str]:
+    for magic, mime in SIGNATURES:
+        if head.startswith(magic):
+            return mime
+    return None
+
+
+class StoredImage:
+    def __init__(self, content_hash: str, content_type: str, size: int, path: str, phash: Optional[str] = None):
+        self.content_hash = content_hash
+        self.content_type = content_type
+        self.size = size
+        self.path = path
+        self.phash = phash
+
+    @property
+    def ext(self) -> str:
+        return EXTENSIONS[self.content_type]
+
+
+class UploadPipeline:
+    """
+    上傳圖片的下載流程：
+    - 同時最多 workers 個下載，其餘排隊等待 (避免大量上傳同時佔用記憶體 / 頻寬)
+    - 以 chunk_size 分段串流下載到記憶體，大小超過 max_bytes 立即中止
+      (同時佔用的記憶體最多 workers * max_bytes)
+    - 以開頭內容判斷格式 (PNG / JPEG / GIF)
+    - 下載完成後在執行緒中計算 sha256、一次寫入 spool 暫存檔並依內容 hash 存入 ImageArchive
+      (相同內容只存一份)，檔案 I/O 不佔用與 Discord bot 共用的 event loop
+    - 另在執行緒中計算感知 hash (perceptual_hash)，供相似圖片偵測
+    """
+
+    def __init__(self, spool_dir: str, archive: ImageArchive, max_bytes: int = 8 * 1024 * 1024,
+                 workers: int = 3, chunk_size: int = 64 * 1024, timeout: float = 60.0):
+        self.spool_dir = spool_dir
+        self.archive = archive
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(workers)
+        self._session: Optional[aiohttp.ClientSession] = None
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def check_size(self, size: Optional[int]):
+        if size and size > self.max_bytes:
+            raise UploadRejected(f"圖片過大 (上限 {self.max_bytes // (1024 * 1024)} MB)")
+
+    async def ingest(self, url: str, declared_size: Optional[int] = None) -> StoredImage:
+        self.check_size(declared_size)
+        async with self._slots:
+            stored = await self._download(url)
+            stored.phash = await asyncio.to_thread(perceptual_hash, stored.path)
+            return stored
+
+    async def _download(self, url: str) -> StoredImage:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        chunks = []
+        size = 0
+        try:
+            async with self._session.get(url) as resp:
+                if resp.status != 200:
+                    raise UploadRejected(f"無法下載圖片 (HTTP {resp.status})，請重新上傳")
+                self.check_size(resp.content_length)
+                try:
+                    head = await resp.content.readexactly(SNIFF_BYTES)
+                except asyncio.IncompleteReadError as e:
+                    head = e.partial
+                content_type = sniff(head)
+                if content_type is None:
+                    raise UploadRejected("僅接受 PNG / JPEG / GIF 圖片")
+                chunk = head
+                while chunk:
+                    size += len(chunk)
+                    self.check_size(size)
+                    chunks.append(chunk)
+                    chunk = await resp.content.read(self.chunk_size)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise UploadRejected("下載圖片失敗，請重新上傳") from e
+
+        content_hash, path = await asyncio.to_thread(self._store, chunks, content_type)
+        return StoredImage(content_hash, content_type, size, path)
+
+    def _store(self, chunks: list, content_type: str) -> tuple:
+        """(在執行緒中) 計算 sha256、寫入 spool 暫存檔後移入 archive，回傳 (hash, 保存路徑)。"""
+        digest = hashlib.sha256()
+        spool_path = os.path.join(self.spool_dir, uuid.uuid4().hex + ".part")
+        try:
+            with open(spool_path, "wb") as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            self._discard(spool_path)
+            raise
+        content_hash = digest.hexdigest()
+        return content_hash, self.archive.put(spool_path, content_hash, content_type)
+
+    @staticmethod
+    def _discard(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None